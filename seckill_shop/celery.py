@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from kombu import Exchange, Queue
 
 # 设置Django环境变量
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seckill_shop.settings')
@@ -13,6 +14,11 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # 自动发现并注册所有已安装应用中的任务
 app.autodiscover_tasks()
 
+# 注册协程Worker初始化、任务排队耗时、执行耗时指标和命令追踪的信号处理函数
+import utils.green
+import utils.metrics
+import utils.tracing
+
 # 配置定时任务调度器
 app.conf.beat_schedule = {
     # 检查并更新秒杀商品状态
@@ -25,7 +31,57 @@ app.conf.beat_schedule = {
         'task': 'shop.tasks.preheat_seckill_products',
         'schedule': 60.0,  # 每60秒执行一次
     },
+    # 库存一致性审计
+    'audit-stock-consistency-5-seconds': {
+        'task': 'shop.tasks.audit_stock_consistency',
+        'schedule': 5.0,  # 每5秒执行一次
+    },
+    # 已结算的旧订单移入归档表
+    'archive-settled-orders-10-minutes': {
+        'task': 'shop.tasks.archive_settled_orders',
+        'schedule': 600.0,  # 每10分钟执行一次
+    },
+    # 补发订单消息发件箱中发布失败的消息
+    'relay-order-outbox-5-seconds': {
+        'task': 'shop.tasks.relay_order_outbox',
+        'schedule': 5.0,  # 每5秒执行一次
+    },
 }
 
 # 设置时区
-app.conf.timezone = 'Asia/Shanghai'
\ No newline at end of file
+app.conf.timezone = 'Asia/Shanghai'
+
+# 任务队列：按任务类型拆分，各自由独立的Worker消费，超时检查积压时不会拖慢订单创建
+# - orders：订单创建，延迟敏感，支持优先级
+# - timeouts：订单超时检查（延迟5分钟的消息），数量大、不紧急
+# - maintenance：定时任务和缓存刷新
+app.conf.task_queues = (
+    Queue('orders', Exchange('orders'), routing_key='orders', queue_arguments={'x-max-priority': 10}),
+    Queue('timeouts', Exchange('timeouts'), routing_key='timeouts'),
+    Queue('maintenance', Exchange('maintenance'), routing_key='maintenance'),
+)
+app.conf.task_default_queue = 'maintenance'
+app.conf.task_default_exchange = 'maintenance'
+app.conf.task_default_routing_key = 'maintenance'
+app.conf.task_routes = {
+    'shop.tasks.create_seckill_order': {'queue': 'orders', 'routing_key': 'orders', 'priority': 9},
+    'shop.tasks.order_timeout_check': {'queue': 'timeouts', 'routing_key': 'timeouts'},
+    'shop.tasks.update_seckill_status': {'queue': 'maintenance', 'routing_key': 'maintenance'},
+    'shop.tasks.preheat_seckill_products': {'queue': 'maintenance', 'routing_key': 'maintenance'},
+    'shop.tasks.refresh_slot_cache': {'queue': 'maintenance', 'routing_key': 'maintenance'},
+    'shop.tasks.relay_order_outbox': {'queue': 'maintenance', 'routing_key': 'maintenance'},
+    'shop.tasks.audit_stock_consistency': {'queue': 'maintenance', 'routing_key': 'maintenance'},
+    'shop.tasks.archive_settled_orders': {'queue': 'maintenance', 'routing_key': 'maintenance'},
+}
+
+# Worker配置（每类队列单独启动Worker）：
+# 订单创建：每个进程只预取1条消息，空闲进程优先领取，避免消息堆在忙碌进程上
+#   celery -A seckill_shop worker -Q orders -n orders@%h -c 8 --prefetch-multiplier=1 -O fair
+# 订单创建（协程模式）：任务以等待MySQL、Redis、RabbitMQ的I/O为主，单进程数百协程可获得更高吞吐
+#   数据库并发由GREEN_DB_CONCURRENCY限制，Redis并发由连接池max_connections限制（超出时等待）
+#   celery -A seckill_shop worker -Q orders -n orders-green@%h -P eventlet -c 200 --prefetch-multiplier=1
+# 超时检查：批量预取，延迟消息在Worker内存中等待到期
+#   celery -A seckill_shop worker -Q timeouts -n timeouts@%h -c 2 --prefetch-multiplier=64
+# 定时任务：单进程即可
+#   celery -A seckill_shop worker -Q maintenance -n maintenance@%h -c 1 --prefetch-multiplier=1
+#   celery -A seckill_shop beat
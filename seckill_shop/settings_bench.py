@@ -0,0 +1,51 @@
+"""
+基准测试配置：在本地替身服务上运行完整的秒杀流程
+- MySQL → SQLite（BENCH_DB 指定文件路径）
+- Redis → fakeredis（设置 BENCH_REDIS_URL 时使用真实Redis）
+- RabbitMQ → Celery内存消息队列（设置 BENCH_BROKER_URL 时使用真实消息队列）
+
+使用方式：DJANGO_SETTINGS_MODULE=seckill_shop.settings_bench
+"""
+import os
+import tempfile
+
+from .settings import *
+
+BENCH_DB = os.environ.get('BENCH_DB', os.path.join(tempfile.gettempdir(), 'seckill_bench.sqlite3'))
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BENCH_DB,
+        'OPTIONS': {
+            'timeout': 30,  # 并发写入时等待锁的时间（秒）
+        },
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BENCH_DB,
+        'OPTIONS': {
+            'timeout': 30,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+if os.environ.get('BENCH_REDIS_URL'):
+    for cache in CACHES.values():
+        cache['LOCATION'] = os.environ['BENCH_REDIS_URL']
+else:
+    import fakeredis
+
+    # 同一进程内所有连接共享一个内存Redis实例（Lua脚本需要安装lupa）
+    FAKE_REDIS_SERVER = fakeredis.FakeServer()
+    for cache in CACHES.values():
+        cache['OPTIONS']['CONNECTION_POOL_KWARGS'].update({
+            'connection_class': fakeredis.FakeConnection,
+            'server': FAKE_REDIS_SERVER,
+        })
+
+CELERY_BROKER_URL = os.environ.get('BENCH_BROKER_URL', 'memory://')
+CELERY_RESULT_BACKEND = 'cache+memory://'
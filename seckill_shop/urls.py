@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
 
@@ -12,5 +14,13 @@ urlpatterns = [
     path('order/cancel/<int:order_id>/', views.cancel_order, name='cancel_order'),
     path('result/', views.pay_result, name='pay_result'),
     path('alipay/notify/', views.alipay_notify, name='alipay_notify'),
+    path('seckill/status/<int:product_id>/', views.seckill_status, name='seckill_status'),
+    path('seckill/session/', views.seckill_session, name='seckill_session'),
+    path('seckill/stock/', views.seckill_stock, name='seckill_stock'),
+    path('stats/near-cache/', views.near_cache_stats, name='near_cache_stats'),
+    path('metrics', views.metrics, name='metrics'),
 
 ]
+
+# 开发环境由Django返回场次静态页，生产环境由前端服务器直接返回 SLOT_PAGE_ROOT 下的文件
+urlpatterns += static(settings.SLOT_PAGE_URL, document_root=settings.SLOT_PAGE_ROOT)
@@ -1,14 +1,30 @@
 from django.contrib import admin
-from .models import SeckillProduct, SeckillOrder
+from utils.redis_client import get_redis_client
+from utils.stock_audit import adjust_redis_stock
+from .models import SeckillProduct, SeckillOrder, SeckillOrderArchive
 
 @admin.register(SeckillProduct)
 class SeckillProductAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'base_price', 'seckill_price', 'stock', 'status', 'seckill_start_time', 'seckill_end_time')
+    list_display = ('id', 'name', 'base_price', 'seckill_price', 'stock', 'total_stock', 'status', 'seckill_start_time', 'seckill_end_time')
     list_filter = ('status',)
     search_fields = ('name',)
 
+    def save_model(self, request, obj, form, change):
+        # 补货：已预热商品的Redis库存按同样的变化量调整（库存审计不再补齐偏低的Redis库存）
+        loaded_stock = getattr(obj, '_loaded_stock', None)
+        delta = obj.stock - loaded_stock if change and loaded_stock is not None else 0
+        super().save_model(request, obj, form, change)
+        if delta:
+            adjust_redis_stock(get_redis_client(), obj.id, delta)
+
 @admin.register(SeckillOrder)
 class SeckillOrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'user_id', 'goods_id', 'goods_name', 'seckill_price', 'quantity', 'total_amount', 'status', 'create_time')
     list_filter = ('status',)
     search_fields = ('user_id', 'goods_id', 'goods_name')
+
+@admin.register(SeckillOrderArchive)
+class SeckillOrderArchiveAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user_id', 'goods_id', 'goods_name', 'seckill_price', 'quantity', 'total_amount', 'status', 'create_time', 'archive_time')
+    list_filter = ('status',)
+    search_fields = ('user_id', 'goods_id', 'goods_name')
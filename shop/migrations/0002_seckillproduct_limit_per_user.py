@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seckillproduct',
+            name='limit_per_user',
+            field=models.SmallIntegerField(default=1, verbose_name='每人限购数量'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_sessions_for_products(apps, schema_editor):
+    """按已有商品的秒杀开始时间生成场次并关联商品"""
+    SeckillProduct = apps.get_model('shop', 'SeckillProduct')
+    SeckillSession = apps.get_model('shop', 'SeckillSession')
+    db_alias = schema_editor.connection.alias
+    for product in SeckillProduct.objects.using(db_alias).filter(session__isnull=True).iterator():
+        code = timezone.localtime(product.seckill_start_time).strftime('%Y%m%d%H')
+        session, created = SeckillSession.objects.using(db_alias).get_or_create(code=code, defaults={
+            'start_time': product.seckill_start_time,
+            'end_time': product.seckill_end_time,
+        })
+        if not created and session.end_time < product.seckill_end_time:
+            session.end_time = product.seckill_end_time
+            session.save(using=db_alias, update_fields=['end_time'])
+        SeckillProduct.objects.using(db_alias).filter(id=product.id).update(session=session)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_seckillproduct_limit_per_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeckillSession',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='场次唯一标识')),
+                ('code', models.CharField(max_length=10, unique=True, verbose_name='场次编码(yyyymmddhh)')),
+                ('name', models.CharField(blank=True, default='', max_length=64, verbose_name='场次名称')),
+                ('start_time', models.DateTimeField(verbose_name='场次开始时间')),
+                ('end_time', models.DateTimeField(verbose_name='场次结束时间')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'db_table': 'seckill_sessions',
+                'indexes': [models.Index(fields=['start_time', 'end_time'], name='idx_session_time'), models.Index(fields=['end_time'], name='idx_session_end_time')],
+            },
+        ),
+        migrations.AddField(
+            model_name='seckillproduct',
+            name='session',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='products', to='shop.seckillsession', verbose_name='所属场次'),
+        ),
+        migrations.RunPython(create_sessions_for_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_total_stock(apps, schema_editor):
+    """已有商品的初始库存 = 当前库存 + 有效订单（待支付、已支付、已完成）的购买数量"""
+    SeckillProduct = apps.get_model('shop', 'SeckillProduct')
+    SeckillOrder = apps.get_model('shop', 'SeckillOrder')
+    # 读写都使用执行迁移的数据库连接（读写分离路由器会把查询路由到从库）
+    db_alias = schema_editor.connection.alias
+    sold = SeckillOrder.objects.using(db_alias).filter(goods_id=OuterRef('id'), status__in=(0, 1, 3)).values('goods_id').annotate(
+        total=Sum('quantity')).values('total')
+    for product in SeckillProduct.objects.using(db_alias).annotate(sold=Coalesce(Subquery(sold), 0)):
+        SeckillProduct.objects.using(db_alias).filter(id=product.id).update(total_stock=product.stock + product.sold)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_seckillsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seckillproduct',
+            name='total_stock',
+            field=models.IntegerField(default=0, verbose_name='初始库存'),
+        ),
+        migrations.RunPython(fill_total_stock, migrations.RunPython.noop),
+    ]
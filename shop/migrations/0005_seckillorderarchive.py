@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_seckillproduct_total_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeckillOrderArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='订单唯一标识')),
+                ('user_id', models.CharField(max_length=64, verbose_name='用户ID')),
+                ('goods_id', models.BigIntegerField(verbose_name='商品ID')),
+                ('goods_name', models.CharField(max_length=64, verbose_name='商品名称')),
+                ('seckill_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='秒杀单价')),
+                ('quantity', models.SmallIntegerField(verbose_name='购买数量')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='订单总金额')),
+                ('status', models.SmallIntegerField(choices=[(0, '待支付'), (1, '已支付'), (2, '已取消'), (3, '已完成')], verbose_name='订单状态')),
+                ('create_time', models.DateTimeField(verbose_name='创建时间')),
+                ('pay_time', models.DateTimeField(blank=True, null=True, verbose_name='支付时间')),
+                ('cancel_time', models.DateTimeField(blank=True, null=True, verbose_name='取消时间')),
+                ('archive_time', models.DateTimeField(auto_now_add=True, verbose_name='归档时间')),
+            ],
+            options={
+                'db_table': 'seckill_orders_archive',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='seckillorder',
+            name='idx_create_time',
+        ),
+        migrations.AddIndex(
+            model_name='seckillorderarchive',
+            index=models.Index(fields=['user_id', 'create_time'], name='idx_archive_user_create_time'),
+        ),
+    ]
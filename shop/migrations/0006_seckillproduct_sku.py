@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_seckillorderarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seckillproduct',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='商家商品编码'),
+        ),
+    ]
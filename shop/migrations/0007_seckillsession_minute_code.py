@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_seckillproduct_sku'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='seckillsession',
+            name='code',
+            field=models.CharField(max_length=12, unique=True, verbose_name='场次编码(yyyymmddhhmm)'),
+        ),
+    ]
@@ -1,18 +1,39 @@
-from django.db import models
-from django.db.models import Index
+from django.db import models, router, transaction
+from django.db.models import F, Index
 from utils.snow_flake import Snowflake
 
 
+# 秒杀场次模型
+class SeckillSession(models.Model):
+    id = models.BigAutoField(primary_key=True, verbose_name="场次唯一标识")
+    code = models.CharField(max_length=12, unique=True, verbose_name="场次编码(yyyymmddhhmm)")
+    name = models.CharField(max_length=64, blank=True, default='', verbose_name="场次名称")
+    start_time = models.DateTimeField(verbose_name="场次开始时间")
+    end_time = models.DateTimeField(verbose_name="场次结束时间")
+    create_time = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        db_table = "seckill_sessions"
+        indexes = [
+            Index(fields=['start_time', 'end_time'], name='idx_session_time'),
+            Index(fields=['end_time'], name='idx_session_end_time')
+        ]
+
 # 秒杀商品模型
 class SeckillProduct(models.Model):
     id = models.BigAutoField(primary_key=True, verbose_name="商品唯一标识")
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="商家商品编码")
     name = models.CharField(max_length=64, verbose_name="商品名称")
     image = models.CharField(max_length=128, default='/product_img/扫地机器人.webp', verbose_name="商品图片路径")
     base_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="原价")
     seckill_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="秒杀价")
     stock = models.IntegerField(verbose_name="秒杀库存")
+    total_stock = models.IntegerField(default=0, verbose_name="初始库存")
+    limit_per_user = models.SmallIntegerField(default=1, verbose_name="每人限购数量")
     seckill_start_time = models.DateTimeField(verbose_name="秒杀开始时间")
     seckill_end_time = models.DateTimeField(verbose_name="秒杀结束时间")
+    session = models.ForeignKey(SeckillSession, null=True, blank=True, on_delete=models.SET_NULL, db_constraint=False,
+                                related_name='products', verbose_name="所属场次")
     status = models.SmallIntegerField(choices=(
         (0, '未开始'),
         (1, '进行中'),
@@ -28,8 +49,46 @@ class SeckillProduct(models.Model):
             Index(fields=['stock'], name='idx_stock')
         ]
 
-# 秒杀订单模型
-class SeckillOrder(models.Model):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录读取时的库存，保存时按变化量调整初始库存
+        instance._loaded_stock = instance.__dict__.get('stock')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # 新建商品时初始库存等于秒杀库存（库存审计按 初始库存 - 有效订单数量 计算应有库存）
+        if self._state.adding:
+            if not self.total_stock:
+                self.total_stock = self.stock
+            super().save(*args, **kwargs)
+            return
+
+        update_fields = kwargs.get('update_fields')
+        loaded_stock = getattr(self, '_loaded_stock', None)
+        delta = 0
+        if loaded_stock is not None and (update_fields is None or 'stock' in update_fields):
+            delta = self.stock - loaded_stock
+        if not delta:
+            super().save(*args, **kwargs)
+            return
+
+        # 修改已有商品的库存（如后台补货）：库存和初始库存按同一变化量原子调整，
+        # 不覆盖期间已被订单扣减的库存，库存审计的应有库存随之变化，不会被当作偏差修复回去
+        if update_fields is None:
+            update_fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+        kwargs['update_fields'] = [name for name in update_fields if name not in ('stock', 'total_stock')]
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            if kwargs['update_fields']:
+                super().save(*args, **kwargs)
+            SeckillProduct.objects.using(using).filter(pk=self.pk).update(
+                stock=F('stock') + delta, total_stock=F('total_stock') + delta)
+        self.refresh_from_db(using=using, fields=['stock', 'total_stock'])
+        self._loaded_stock = self.stock
+
+# 秒杀订单字段（热表和归档表相同）
+class BaseSeckillOrder(models.Model):
     id = models.BigIntegerField(primary_key=True, default=Snowflake.generate_id_static, verbose_name="订单唯一标识")
     user_id = models.CharField(max_length=64, verbose_name="用户ID")
     goods_id = models.BigIntegerField(verbose_name="商品ID")
@@ -47,12 +106,29 @@ class SeckillOrder(models.Model):
     pay_time = models.DateTimeField(null=True, blank=True, verbose_name="支付时间")
     cancel_time = models.DateTimeField(null=True, blank=True, verbose_name="取消时间")
 
+    class Meta:
+        abstract = True
+
+# 秒杀订单模型（热表：待支付和近期订单，写入和状态变更都在热表）
+class SeckillOrder(BaseSeckillOrder):
+
     class Meta:
         db_table = "seckill_orders"
+        # 订单ID为雪花算法生成、按时间递增，归档按主键范围扫描，不再需要创建时间索引
         indexes = [
             Index(fields=['user_id', 'create_time'], name='idx_user_create_time'),
-            Index(fields=['goods_id', 'status'], name='idx_goods_status'),
-            Index(fields=['create_time'], name='idx_create_time')
+            Index(fields=['goods_id', 'status'], name='idx_goods_status')
         ]
 
+# 秒杀订单归档模型（冷表：已结算且超过 SECKILL_ORDER_ARCHIVE_DAYS 天的订单，只读）
+class SeckillOrderArchive(BaseSeckillOrder):
+    # 归档时原样复制订单ID和创建时间
+    id = models.BigIntegerField(primary_key=True, verbose_name="订单唯一标识")
+    create_time = models.DateTimeField(verbose_name="创建时间")
+    archive_time = models.DateTimeField(auto_now_add=True, verbose_name="归档时间")
 
+    class Meta:
+        db_table = "seckill_orders_archive"
+        indexes = [
+            Index(fields=['user_id', 'create_time'], name='idx_archive_user_create_time')
+        ]
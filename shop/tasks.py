@@ -1,13 +1,127 @@
-import json
-import django_redis
+from utils.redis_client import get_redis_client, product_cache
 from celery import shared_task
 from datetime import datetime, timedelta
+from decimal import Decimal
 from .models import SeckillProduct, SeckillOrder
 from django.utils import timezone
+from django.db import IntegrityError, transaction
 from django.db.models import F
+from utils.db_router import use_primary, pin_user_to_primary
+from utils.lua import PRODUCT_CACHE_SCRIPT, RESTORE_STOCK_SCRIPT
+from utils.current_slot import SlotIndex, get_slot_code
+from utils.green import DatabaseTask
+from utils.codec import encode_product, to_epoch, user_field
+from utils.order_store import archive_batch, archive_cutoff_id, ORDER_ARCHIVE_BATCH_SIZE
+from utils.outbox import relay
+from utils.seckill_token import issue_token, verify_token
+from utils.slot_page import load_schedule, render_slot_page
+from utils.stock_audit import audit_stock
+from utils import keys
+
+# 场次商品缓存过期时间（秒）
+SLOT_CACHE_EXPIRE = 9000
+# 场次商品缓存新鲜期（秒），超过新鲜期仍返回旧数据，同时由一个进程在后台刷新
+SLOT_CACHE_FRESH_SECONDS = 60
+# 发件箱中继检查的商品范围：进行中的商品和最近该时间（秒）内结束的商品
+OUTBOX_RELAY_LOOKBACK = 3600
+# 每次归档任务最多执行的批数，剩余订单留待下次
+ORDER_ARCHIVE_MAX_BATCHES = 50
+
+
+def cache_seckill_product(redis_client, product, expire_seconds):
+    """
+    回填单个商品的缓存（商品哈希和库存键）
+    库存只在库存键不存在时初始化，不会覆盖秒杀中的实时库存
+    :param redis_client: Redis客户端或管道
+    """
+    # 紧凑编码：价格为整数分、时间为Unix秒，字段和值都很短，商品哈希保持listpack编码
+    product_data = encode_product(product)
+    fields = [item for pair in product_data.items() for item in pair]
+    redis_client.eval(
+        PRODUCT_CACHE_SCRIPT,
+        2,
+        keys.product_key(product.id), keys.stock_key(product.id),
+        product.stock, expire_seconds, *fields
+    )
+    # 通知各进程剔除近端缓存中的旧数据
+    product_cache.publish_invalidation(keys.product_key(product.id), client=redis_client)
+
+
+def warm_products(redis_client, products, now_ts):
+    """
+    预热商品缓存：商品哈希和库存键写入Redis并加入场次商品集合（一个管道）
+    过期时间为场次结束后半小时（至少缓存1分钟）
+    :param products: 商品列表（需预先select_related('session')）
+    :return: 预热的场次编码集合
+    """
+    slots = set()
+    with redis_client.pipeline(transaction=False) as pipe:
+        for product in products:
+            # 获取商品所属场次的编码（未关联场次时按开始时间生成）
+            slot = product.session.code if product.session else get_slot_code(product.seckill_start_time)
+            slot_products_key = keys.slot_products_key(slot)
+
+            expire_seconds = max(to_epoch(product.seckill_end_time) - now_ts + 1800, 60)
+            cache_seckill_product(pipe, product, expire_seconds)
+
+            # 将商品ID添加到场次集合中
+            pipe.sadd(slot_products_key, product.id)
+            pipe.expire(slot_products_key, expire_seconds)
+            slots.add(slot)
+        pipe.execute()
+    return slots
+
+
+def record_order_outcome(redis_client, product_id, outcome):
+    """
+    记录订单处理结果：每个商品一个哈希，字段为结果类型（created/failed/timeout_cancelled），值为次数
+    任务默认不写结果后端（CELERY_TASK_IGNORE_RESULT），订单结果只在这里按商品汇总，Key数量与商品数相同
+    """
+    redis_client.hincrby(keys.order_stats_key(product_id), outcome, 1)
+
+
+def rebuild_slot_cache(slot):
+    """
+    从数据库重建场次商品缓存，调用方需持有场次重建锁保证同一时间只有一个进程回源
+    :param slot: 场次编码(yyyymmddhhmm)
+    :return: 场次内的商品ID列表
+    """
+    redis_client = get_redis_client()
+    slot_products_key = keys.slot_products_key(slot)
+    fresh_key = keys.slot_fresh_key(slot)
+
+    products = list(SeckillProduct.objects.filter(session__code=slot))
+
+    with redis_client.pipeline(transaction=False) as pipe:
+        for product in products:
+            cache_seckill_product(pipe, product, SLOT_CACHE_EXPIRE)
+        if products:
+            pipe.sadd(slot_products_key, *[product.id for product in products])
+            pipe.expire(slot_products_key, SLOT_CACHE_EXPIRE)
+        # 标记缓存新鲜（场次没有商品时同样标记，避免空场次反复回源）
+        pipe.setex(fresh_key, SLOT_CACHE_FRESH_SECONDS, 1)
+        pipe.execute()
 
+    return [product.id for product in products]
 
-@shared_task
+
+def render_slot_pages(slots):
+    """
+    重新渲染场次静态页（商品缓存写入或状态变化后调用），页面中的商品为场次商品集合中的全部商品
+    渲染失败只打印日志，不影响缓存预热和状态更新
+    """
+    redis_client = get_redis_client()
+    slot_index = SlotIndex(load_schedule())
+    for slot in slots:
+        try:
+            product_ids = [int(product_id) for product_id in redis_client.smembers(keys.slot_products_key(slot))]
+            path = render_slot_page(slot, product_ids, slot_index)
+            print(f"已生成场次静态页: {path}, 商品数: {len(product_ids)}")
+        except Exception as e:
+            print(f"生成场次静态页失败: 场次={slot}, {e}")
+
+
+@shared_task(base=DatabaseTask)
 def update_seckill_status():
     """
     定时更新秒杀商品状态
@@ -18,23 +132,25 @@ def update_seckill_status():
     now = timezone.now()
     
     # 获取Redis客户端
-    redis_client = django_redis.get_redis_connection("default")
+    redis_client = get_redis_client()
 
     # 更新状态：秒杀开始（未开始 -> 进行中）
     started_products = SeckillProduct.objects.filter(
         status=0,  # 未开始
         seckill_start_time__lte=now  # 开始时间已到
     )
-    # 在update前先获取需要更新的商品ID列表
-    product_ids = list(started_products.values_list('id', flat=True))
+    # 在update前先获取需要更新的商品ID列表（与随后的更新保持一致，走主库）
+    with use_primary():
+        product_ids = list(started_products.values_list('id', flat=True))
     # 执行数据库更新
     started_count = started_products.update(status=1)
     
     # 更新Redis中的状态
     for product_id in product_ids:
-        product_key = f"seckill:product:{product_id}"
+        product_key = keys.product_key(product_id)
         if redis_client.exists(product_key):
             redis_client.hset(product_key, "status", 1)
+            product_cache.publish_invalidation(product_key)
 
     # 更新状态：秒杀结束（进行中 -> 已结束）
     ended_products = SeckillProduct.objects.filter(
@@ -42,15 +158,17 @@ def update_seckill_status():
         seckill_end_time__lt=now  # 结束时间已过
     )
     # 在update前先获取需要更新的商品ID列表
-    ended_product_ids = list(ended_products.values_list('id', flat=True))
+    with use_primary():
+        ended_product_ids = list(ended_products.values_list('id', flat=True))
     # 执行数据库更新
     ended_count = ended_products.update(status=2)
     
     # 更新Redis中的状态
     for product_id in ended_product_ids:
-        product_key = f"seckill:product:{product_id}"
+        product_key = keys.product_key(product_id)
         if redis_client.exists(product_key):
             redis_client.hset(product_key, "status", 2)
+            product_cache.publish_invalidation(product_key)
 
     # 更新状态：过期未开始（未开始 -> 已结束）
     expired_products = SeckillProduct.objects.filter(
@@ -58,15 +176,25 @@ def update_seckill_status():
         seckill_end_time__lt=now  # 结束时间已过
     )
     # 在update前先获取需要更新的商品ID列表
-    expired_product_ids = list(expired_products.values_list('id', flat=True))
+    with use_primary():
+        expired_product_ids = list(expired_products.values_list('id', flat=True))
     # 执行数据库更新
     expired_count = expired_products.update(status=2)
     
     # 更新Redis中的状态
     for product_id in expired_product_ids:
-        product_key = f"seckill:product:{product_id}"
+        product_key = keys.product_key(product_id)
         if redis_client.exists(product_key):
             redis_client.hset(product_key, "status", 2)
+            product_cache.publish_invalidation(product_key)
+
+    # 状态变化的商品所在场次重新渲染静态页（抢购按钮随状态变化）
+    changed_ids = product_ids + ended_product_ids + expired_product_ids
+    if changed_ids:
+        with use_primary():
+            slots = set(SeckillProduct.objects.filter(
+                id__in=changed_ids, session__isnull=False).values_list('session__code', flat=True))
+        render_slot_pages(sorted(slots))
 
     return {
         "message": "秒杀状态更新完成",
@@ -76,7 +204,17 @@ def update_seckill_status():
     }
 
 
-@shared_task
+@shared_task(base=DatabaseTask)
+def refresh_slot_cache(slot):
+    """
+    后台刷新场次商品缓存
+    缓存过了新鲜期时由获得重建锁的请求触发，刷新期间其他请求继续使用旧缓存
+    """
+    product_ids = rebuild_slot_cache(slot)
+    return f"场次{slot}缓存刷新完成，商品数: {len(product_ids)}"
+
+
+@shared_task(base=DatabaseTask)
 def preheat_seckill_products():
     """
     秒杀商品预热任务
@@ -84,49 +222,29 @@ def preheat_seckill_products():
     """
     try:
         # 获取Redis客户端
-        redis_client = django_redis.get_redis_connection("default")
+        redis_client = get_redis_client()
         now = timezone.now()
+        now_ts = int(now.timestamp())
 
         # 计算5分钟后的时间
         future_time = now + timedelta(minutes=5)
 
         # 获取所有未开始但将在5分钟内开始的秒杀商品
-        preheat_products = SeckillProduct.objects.filter(
+        preheat_products = list(SeckillProduct.objects.filter(
             status=0,  # 未开始
             seckill_start_time__lte=future_time,  # 5分钟内开始
-        )
+        ).select_related('session'))
 
-        # 预热商品信息到Redis
+        # 预热商品信息到Redis（缓存商品基本信息和库存，加入场次商品集合）
+        preheated_slots = warm_products(redis_client, preheat_products, now_ts)
+        for slot in preheated_slots:
+            redis_client.setex(keys.slot_fresh_key(slot), SLOT_CACHE_FRESH_SECONDS, 1)
         for product in preheat_products:
-            # 获取商品开始时间的小时数作为场次
-            slot_hour = product.seckill_start_time.hour
-            # 生成该场次的商品集合键
-            slot_products_key = f"seckill:slot:{slot_hour}:products"
-
-            # 缓存商品基本信息
-            product_key = f"seckill:product:{product.id}"
-            product_data = {
-                "id": product.id,
-                "name": product.name,
-                "seckill_price": str(product.seckill_price),
-                "base_price": str(product.base_price),
-                "stock": product.stock,
-                "status": product.status,
-                "seckill_start_time": product.seckill_start_time.isoformat() if product.seckill_start_time else "",
-                "seckill_end_time": product.seckill_end_time.isoformat() if product.seckill_end_time else ""
-            }
-            redis_client.hset(product_key, mapping=product_data)
-
-            # 设置过期时间为该场次结束后半小时
-            expire_seconds = int((product.seckill_end_time - now).total_seconds() + 1800)
-            redis_client.expire(product_key, max(expire_seconds, 60))  # 至少缓存1分钟
-
-            # 将商品ID添加到场次集合中
-            redis_client.sadd(slot_products_key, product.id)
-            redis_client.expire(slot_products_key, expire_seconds)
-
             print(f"已预热商品: {product.name}, ID: {product.id}, 开始时间: {product.seckill_start_time}")
 
+        # 场次页渲染为静态HTML，商品列表由前端服务器直接返回
+        render_slot_pages(sorted(preheated_slots))
+
         return f"成功预热{len(preheat_products)}个商品"
 
     except Exception as e:
@@ -134,126 +252,144 @@ def preheat_seckill_products():
         return f"预热失败: {str(e)}"
 
 
-@shared_task(bind=True, max_retries=3)
+@shared_task(bind=True, max_retries=3, base=DatabaseTask, acks_late=True, reject_on_worker_lost=True)
 def create_seckill_order(self, message):
     """
     从RabbitMQ拉取消息，异步创建秒杀订单
     包含秒杀令牌验证和乐观锁防超卖
+    任务执行完成后才确认消息（acks_late），Worker中途退出时消息重新投递；
+    同一消息重复投递或由发件箱中继补发时按订单主键幂等
     """
     try:
         # 解包消息内容
         order_id = message['order_id']
         user_id = message['user_id']
         product_id = message['product_id']
+        quantity = message.get('quantity', 1)
         seckill_token = message['seckill_token']
         product_info = message['product_info']
 
-        # 1. 验证秒杀令牌
-        redis_client = django_redis.get_redis_connection("default")
-        token_key = f"seckill:token:{seckill_token}"
-        token_data = redis_client.get(token_key)
+        # 1. 验证秒杀令牌（验签并检查有效期，不访问Redis；令牌绑定订单ID，重复使用由订单主键拦截）
+        verify_token(seckill_token, order_id, user_id, product_id, quantity)
+        redis_client = get_redis_client()
 
-        if not token_data:
-            raise ValueError(f"无效或过期的秒杀令牌: {seckill_token}")
+        # 2. 使用乐观锁更新数据库库存并创建订单
+        # 商品名称和秒杀价取自订单消息中的商品快照，不再查询商品表；库存由条件更新检查
+        seckill_price = Decimal(str(product_info["seckill_price"]))
+        try:
+            # 扣减库存和创建订单在同一个事务中：同一消息重复消费时订单主键冲突，库存扣减一并回滚（不再预先查询订单是否存在）
+            with transaction.atomic():
+                # 使用F表达式和update_fields实现乐观锁
+                # 只有当stock不小于购买数量且在update期间未被其他进程修改时才会成功
+                updated_count = SeckillProduct.objects.filter(
+                    id=product_id,
+                    stock__gte=quantity  # 确保库存足够
+                ).update(
+                    stock=F('stock') - quantity,
+                    update_time=timezone.now()
+                )
+                if updated_count:
+                    # 3. 创建订单（create强制INSERT，主键已存在时抛出IntegrityError）
+                    SeckillOrder.objects.create(
+                        id=order_id,
+                        user_id=user_id,
+                        goods_id=product_id,
+                        goods_name=product_info["name"],
+                        seckill_price=seckill_price,
+                        quantity=quantity,
+                        total_amount=seckill_price * quantity,
+                        status=0  # 待支付
+                    )
+        except IntegrityError:
+            # 订单已由之前的消息创建，不重试也不回滚Redis库存
+            print(f"订单已存在，忽略重复消息: {order_id}")
+            return f"订单已存在: {order_id}"
+
+        # 检查更新是否成功
+        if updated_count == 0:
+            # 订单已创建、库存已卖完后重复投递的消息也会走到这里，此时才查询订单是否已存在（走主库）
+            with use_primary():
+                if SeckillOrder.objects.filter(id=order_id).exists():
+                    print(f"订单已存在，忽略重复消息: {order_id}")
+                    return f"订单已存在: {order_id}"
+            # 库存不足或商品不存在（Redis库存只在最终失败时回滚一次，重试不重复回滚）
+            raise ValueError(f"库存不足，无法创建订单: {product_id}")
 
-        token_info = json.loads(token_data)
-        # 验证令牌中的用户ID和商品ID是否匹配
-        if token_info['user_id'] != user_id or token_info['product_id'] != product_id:
-            raise ValueError(f"秒杀令牌验证失败: 用户ID或商品ID不匹配")
+        # 用户短时间内读主库，保证订单列表能立即看到新订单
+        pin_user_to_primary(user_id)
 
-        # 验证通过后删除令牌，防止重复使用
-        redis_client.delete(token_key)
+        record_order_outcome(redis_client, product_id, "created")
+        print(f"订单创建成功: {order_id}, 商品: {product_info['name']}")
 
-        # 2. 使用乐观锁更新数据库库存并创建订单
-        # 获取商品信息并检查库存
-        product = SeckillProduct.objects.get(id=product_id)
-
-        # 乐观锁实现：检查库存是否足够，足够则更新
-        if product.stock > 0:
-            # 使用F表达式和update_fields实现乐观锁
-            # 只有当stock大于0且在update期间未被其他进程修改时才会成功
-            updated_count = SeckillProduct.objects.filter(
-                id=product_id,
-                stock__gt=0  # 确保库存大于0
-            ).update(
-                stock=F('stock') - 1,
-                update_time=timezone.now()
-            )
-
-            # 检查更新是否成功
-            if updated_count == 0:
-                # 乐观锁失败，说明库存已被其他请求消耗
-                # 回滚Redis中的库存
-                redis_client.incr(f"seckill:stock:{product_id}")
-                raise ValueError(f"乐观锁失败，库存已不足: {product_id}")
-
-            # 3. 创建订单
-            order = SeckillOrder(
-                id=order_id,
-                user_id=user_id,
-                goods_id=product_id,
-                goods_name=product_info["name"],
-                seckill_price=product_info["seckill_price"],
-                quantity=1,
-                total_amount=product_info["seckill_price"],
-                status=0  # 待支付
-            )
-            order.save()
-
-            print(f"订单创建成功: {order_id}, 商品: {product_info['name']}")
-            
-            # 发送延迟消息到RabbitMQ，5分钟后检查订单状态
-            order_timeout_check.apply_async(
-                args=[order_id, product_id, user_id],
-                countdown=300  # 5分钟后执行
-            )
-            
-            return f"订单创建成功: {order_id}"
-        else:
-            # 库存不足，回滚Redis中的库存
-            redis_client.incr(f"seckill:stock:{product_id}")
-            raise ValueError(f"库存不足，无法创建订单: {product_id}")
+        # 发送延迟消息到RabbitMQ，5分钟后检查订单状态
+        order_timeout_check.apply_async(
+            args=[order_id, product_id, user_id, quantity],
+            countdown=300  # 5分钟后执行
+        )
+
+        return f"订单创建成功: {order_id}"
 
-    except SeckillProduct.DoesNotExist:
-        raise ValueError(f"商品不存在: {product_id}")
     except Exception as e:
         # 失败重试（最多3次）
         if self.request.retries < self.max_retries:
             print(f"订单创建失败，将重试: {order_id}, 错误: {str(e)}")
             return self.retry(exc=e, countdown=2)
-        # 重试失败后回滚库存
+        # 重试失败后回滚库存并解除限购（只在这里回滚一次）
         try:
-            redis_client = django_redis.get_redis_connection("default")
-            redis_client.incr(f"seckill:stock:{product_id}")
+            restore_stock_and_remove_limit(product_id, user_id, message.get('quantity', 1))
+            record_order_outcome(get_redis_client(), product_id, "failed")
             print(f"重试失败，已回滚库存: {product_id}")
         except Exception as rollback_error:
             print(f"回滚库存失败: {rollback_error}")
         raise e
 
 
-def restore_stock_and_remove_limit(product_id, user_id):
+def republish_order_message(message):
+    """补发发件箱中的订单消息（消息代理故障期间令牌可能已过期，发件箱只有服务端可写，补发时重新签发令牌）"""
+    message["seckill_token"] = issue_token(message["order_id"], message["user_id"], message["product_id"],
+                                           message["quantity"])
+    create_seckill_order.delay(message=message)
+
+
+@shared_task(base=DatabaseTask)
+def relay_order_outbox():
     """
-    恢复商品库存并解除用户限购限制
+    订单消息发件箱中继
+    抢购接口发布订单消息失败时（消息代理不可用）消息留在发件箱中，定时补发到消息代理
     """
-    try:
-        redis_client = django_redis.get_redis_connection("default")
-        
-        # 1. 恢复Redis中的库存
-        redis_client.incr(f"seckill:stock:{product_id}")
-        current_stock = int(redis_client.get(f"seckill:stock:{product_id}"))
-        product_key = f"seckill:product:{product_id}"
-        redis_client.hset(product_key, "stock", current_stock)
+    redis_client = get_redis_client()
+    since = timezone.now() - timedelta(seconds=OUTBOX_RELAY_LOOKBACK)
+    product_ids = SeckillProduct.objects.filter(
+        status__in=(1, 2),  # 进行中和已结束
+        seckill_end_time__gte=since
+    ).values_list('id', flat=True)
+
+    relayed = 0
+    for product_id in product_ids:
+        try:
+            relayed += relay(redis_client, keys.outbox_key(product_id), republish_order_message)
+        except Exception as e:
+            # 消息代理仍不可用，剩余消息留待下次中继
+            print(f"发件箱中继失败，已补发{relayed}条消息: {e}")
+            return f"发件箱中继失败: {str(e)}"
 
-        # 2. 恢复数据库中的库存
-        SeckillProduct.objects.filter(id=product_id).update(
-            stock=F('stock') + 1,
-            update_time=timezone.now()
+    if relayed:
+        print(f"发件箱中继完成，补发{relayed}条订单消息")
+    return f"发件箱中继完成，补发{relayed}条订单消息"
+
+
+def restore_stock_and_remove_limit(product_id, user_id, quantity=1):
+    """
+    归还Redis库存并解除用户限购限制（一次Lua脚本，库存键、商品哈希的库存字段、限购计数原子更新）
+    :param quantity: 订单购买数量，按该数量归还库存和用户已购数量
+    """
+    try:
+        get_redis_client().eval(
+            RESTORE_STOCK_SCRIPT,
+            3,
+            keys.stock_key(product_id), keys.product_key(product_id), keys.user_limit_key(product_id),
+            user_field(user_id), quantity
         )
-        
-        # 3. 解除用户限购限制（从用户集合中移除）
-        user_limit_key = f"seckill:user_limit:{product_id}"
-        redis_client.srem(user_limit_key, user_id)
-        
         print(f"已恢复商品库存并解除限购: 商品ID={product_id}, 用户ID={user_id}")
         return True
     except Exception as e:
@@ -261,25 +397,78 @@ def restore_stock_and_remove_limit(product_id, user_id):
         return False
 
 
-@shared_task(bind=True, max_retries=3)
-def order_timeout_check(self, order_id, product_id, user_id):
+def cancel_pending_order(order_id, product_id, user_id, quantity=1):
+    """
+    取消待支付订单并归还库存
+    订单状态按比较并设置更新（只有仍为待支付时才取消），用户取消与超时检查同时执行时库存只归还一次；
+    取消订单和归还数据库库存在同一个事务中
+    :return: 是否取消成功（订单已支付或已取消时返回False）
+    """
+    with transaction.atomic():
+        cancelled = SeckillOrder.objects.filter(id=order_id, status=0).update(
+            status=2,  # 已取消
+            cancel_time=timezone.now()
+        )
+        if not cancelled:
+            return False
+        SeckillProduct.objects.filter(id=product_id).update(
+            stock=F('stock') + quantity,
+            update_time=timezone.now()
+        )
+    restore_stock_and_remove_limit(product_id, user_id, quantity)
+    return True
+
+
+@shared_task(base=DatabaseTask)
+def audit_stock_consistency():
+    """
+    库存一致性审计
+    比较进行中商品的Redis库存、数据库库存与订单表，修复偏差或告警（见utils/stock_audit.py）
+    """
+    # 与订单写入比较，读主库
+    with use_primary():
+        drifts = audit_stock(get_redis_client())
+    for product_id, source, current, expected, action in drifts:
+        print(f"库存偏差: 商品ID={product_id}, 位置={source}, 当前={current}, 应有={expected}, 处理={action}")
+    return f"库存审计完成，发现{len(drifts)}处偏差"
+
+
+@shared_task(base=DatabaseTask)
+def archive_settled_orders(max_batches=ORDER_ARCHIVE_MAX_BATCHES):
+    """
+    订单归档：把已结算且超过 SECKILL_ORDER_ARCHIVE_DAYS 天的订单从热表分批移入归档表（见utils/order_store.py）
+    每批一个短事务，不会长时间锁住热表
+    """
+    cutoff_id = archive_cutoff_id()
+    archived = 0
+    # 先读后写，走主库
+    with use_primary():
+        for _ in range(max_batches):
+            count = archive_batch(cutoff_id)
+            archived += count
+            if count < ORDER_ARCHIVE_BATCH_SIZE:
+                break
+
+    if archived:
+        print(f"订单归档完成，归档{archived}个订单")
+    return f"订单归档完成，归档{archived}个订单"
+
+
+@shared_task(bind=True, max_retries=3, base=DatabaseTask)
+def order_timeout_check(self, order_id, product_id, user_id, quantity=1):
     """
     检查订单是否超时未支付，如超时则取消订单并恢复库存
     """
     try:
-        # 查询订单
-        order = SeckillOrder.objects.get(id=order_id)
+        # 查询订单（先读后写，走主库）
+        with use_primary():
+            order = SeckillOrder.objects.get(id=order_id)
         
-        # 检查订单状态，如果仍为待支付状态，则取消订单
-        if order.status == 0:  # 0表示待支付
-            # 更新订单状态为已取消
-            order.status = 2  # 2表示已取消
-            order.cancel_time = timezone.now()
-            order.save()
-            
-            # 恢复库存并解除限购
-            restore_stock_and_remove_limit(product_id, user_id)
-            
+        # 检查订单状态，如果仍为待支付状态，则取消订单并恢复库存、解除限购
+        # （按订单状态比较并设置，与用户取消同时执行时只有一方成功）
+        if order.status == 0 and cancel_pending_order(order_id, product_id, user_id, quantity):
+            record_order_outcome(get_redis_client(), product_id, "timeout_cancelled")
+
             print(f"订单超时未支付，已自动取消: {order_id}")
             return f"订单超时自动取消成功: {order_id}"
         else:
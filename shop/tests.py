@@ -1,4 +1,61 @@
-from django.test import TestCase
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.test import SimpleTestCase
 
+from utils.current_slot import SlotIndex
+
+
+def scan_current_slot(sessions, now):
+    """默认场次的线性扫描实现（SlotIndex之前的逐个场次比较），作为索引结果的参照"""
+    current = None
+    for session in sessions:
+        if session.start_time <= now < session.end_time:
+            current = session
+        elif session.start_time > now:
+            return (current or session).code
+    if current:
+        return current.code
+    return sessions[-1].code if sessions else None
+
+
+class SlotIndexTests(SimpleTestCase):
+    """SlotIndex.current 与线性扫描在随机场次表上的结果一致"""
+
+    now = datetime(2025, 11, 3, 9, 17, 23, tzinfo=dt_timezone.utc)
+
+    def random_sessions(self, rng):
+        """今天及未来两天内随机开始的场次（可重叠、可同一时刻开始），按开始时间升序"""
+        day_start = self.now.replace(hour=0, minute=0, second=0)
+        sessions = []
+        for i in range(rng.randint(0, 12)):
+            start_time = day_start + timedelta(minutes=rng.randrange(0, 3 * 24 * 60, rng.choice((1, 30, 60))))
+            end_time = start_time + timedelta(minutes=rng.randint(1, 6 * 60))
+            sessions.append(SimpleNamespace(code=f"s{i}", start_time=start_time, end_time=end_time))
+        sessions.sort(key=lambda session: session.start_time)
+        return sessions
+
+    def query_times(self, rng, sessions):
+        """场次起止时间前后1秒、每个整点，以及索引覆盖范围之外的随机时间"""
+        day_start = self.now.replace(hour=0, minute=0, second=0)
+        times = [day_start + timedelta(hours=hour) for hour in range(-2, 74)]
+        for session in sessions:
+            for moment in (session.start_time, session.end_time):
+                times += [moment - timedelta(seconds=1), moment, moment + timedelta(seconds=1)]
+        times += [day_start + timedelta(seconds=rng.randint(-86400, 4 * 86400)) for _ in range(50)]
+        return times
+
+    def test_current_matches_linear_scan(self):
+        rng = random.Random(20251103)
+        for _ in range(300):
+            sessions = self.random_sessions(rng)
+            index = SlotIndex(sessions, now=self.now)
+            for moment in self.query_times(rng, sessions):
+                self.assertEqual(index.current(int(moment.timestamp())), scan_current_slot(sessions, moment),
+                                 msg=f"{moment.isoformat()} {[(s.code, s.start_time, s.end_time) for s in sessions]}")
+
+    def test_empty_schedule(self):
+        index = SlotIndex([], now=self.now)
+        self.assertIsNone(index.current(int(self.now.timestamp())))
+        self.assertEqual(index.time_slots, [])
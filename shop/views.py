@@ -1,33 +1,62 @@
-import hashlib
-import json
 import logging
 import time
-import django_redis
+from utils.redis_client import get_redis_client, product_cache
 from alipay.aop.api.util.SignatureUtils import verify_with_rsa
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
-from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 from seckill_shop import settings
 from shop.models import SeckillProduct, SeckillOrder
+from utils.admission import QUEUE_FULL, SOLD_OUT, admit, issue_ticket, queue_position, queue_status, read_ticket
 from utils.bloom import BloomFilter
-from utils.current_slot import get_current_slot
-from datetime import datetime, timedelta
+from utils.buy_guard import check_request, issue_challenge, release_request, verify_challenge
+from utils.codec import to_epoch, user_field
+from utils.current_slot import SlotIndex
+from utils.db_router import use_primary, read_your_writes
+from utils.identity import get_user_id, requires_challenge, skip_identity
+from utils import keys
 from django.utils import timezone
 from utils.lua import STOCK_DECR_SCRIPT
+from utils.metrics import buy_metrics, mark_stage, mark_outcome, export_metrics
+from utils.order_store import get_order, list_user_orders
+from utils.outbox import encode_message
+from utils.product_snapshot import ProductSnapshots
 from utils.rate_limit import sliding_window_limit
+from utils.redis_lock import RedisLock
+from utils.seckill_token import issue_token
+from utils.slot_page import build_slot_products, load_schedule
 from utils.snow_flake import Snowflake
 from utils.alipay import create_alipay_client, create_url, get_dic_sorted_params
-from .tasks import create_seckill_order, restore_stock_and_remove_limit
+from .tasks import create_seckill_order, cancel_pending_order, rebuild_slot_cache, refresh_slot_cache
 
 
 # 获取Redis客户端实例
-redis_client = django_redis.get_redis_connection("default")
+redis_client = get_redis_client()
 # 初始化布隆过滤器（用于商品ID验证）
-product_bloom = BloomFilter(key="seckill:bloom:product")
+product_bloom = BloomFilter(key=keys.BLOOM_PRODUCT_KEY)
 # 初始化雪花算法（用于订单ID生成）
 snowflake = Snowflake(data_center_id=1, worker_id=1)
+# 商品快照缓存（抢购时按快照版本复用商品名称和秒杀价）
+product_snapshots = ProductSnapshots(redis_client)
 # 初始化支付宝客户端
 alipay_client = create_alipay_client()
+# 商品缓存中未配置限购数量时的默认值
+DEFAULT_LIMIT_PER_USER = 1
+# 场次缓存重建锁的过期时间（毫秒），同时也是后台刷新的最小间隔
+SLOT_REBUILD_LOCK_MS = 5000
+# 等待其他请求重建场次缓存的轮询次数和间隔（秒）
+SLOT_REBUILD_WAIT_TIMES = 10
+SLOT_REBUILD_WAIT_INTERVAL = 0.05
+# 秒杀结果哈希在最后一次写入后的过期时间（秒）
+SECKILL_RESULT_EXPIRE = 600
+# 场次时间索引在进程内的缓存时间（秒），超过后重新加载场次表，跨天时立即重建
+SCHEDULE_CACHE_SECONDS = 30
+# 待支付订单的支付期限（秒），与订单超时检查任务的延迟一致
+ORDER_PAY_SECONDS = 300
+# 库存轮询接口单次最多查询的商品数，以及允许前端服务器缓存的秒数
+STOCK_POLL_MAX_PRODUCTS = 100
+STOCK_POLL_CACHE_SECONDS = 1
+_schedule_cache = {"expire_at": 0, "index": None}
 
 
 def init_bloom_filter():
@@ -35,106 +64,108 @@ def init_bloom_filter():
     product_ids = SeckillProduct.objects.values_list('id', flat=True)
     product_bloom.batch_add(product_ids)
 
+
+def get_slot_index():
+    """
+    获取今天及未来24小时内场次的时间索引（SlotIndex）
+    通过场次表的时间索引按时间范围查询，不扫描商品表，构建的索引在进程内缓存一小段时间
+    """
+    now = time.time()
+    slot_index = _schedule_cache["index"]
+    if slot_index is not None and _schedule_cache["expire_at"] > now and not slot_index.is_stale(int(now)):
+        return slot_index
+
+    slot_index = SlotIndex(load_schedule())
+
+    _schedule_cache["index"] = slot_index
+    _schedule_cache["expire_at"] = now + SCHEDULE_CACHE_SECONDS
+    return slot_index
+
+
+def get_slot_product_ids(slot):
+    """
+    获取场次商品ID集合（单飞回源 + 过期旧数据继续服务）
+    - 缓存新鲜：直接返回
+    - 缓存过了新鲜期：返回旧数据，只有获得重建锁的请求触发后台刷新
+    - 缓存不存在：只有获得重建锁的请求回源数据库重建，其他请求等待重建完成
+    :return: 商品ID列表，重建超时仍未完成时返回None
+    """
+    slot_products_key = keys.slot_products_key(slot)
+    fresh_key = keys.slot_fresh_key(slot)
+    lock_key = keys.slot_rebuild_lock_key(slot)
+
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.smembers(slot_products_key)
+        pipe.exists(fresh_key)
+        product_ids, fresh = pipe.execute()
+
+    if fresh:
+        return [int(product_id) for product_id in product_ids]
+
+    if product_ids:
+        # 旧数据继续服务，后台刷新
+        if RedisLock(lock_key, timeout_ms=SLOT_REBUILD_LOCK_MS).acquire():
+            refresh_slot_cache.delay(slot)
+        return [int(product_id) for product_id in product_ids]
+
+    # 缓存不存在，单飞回源
+    lock = RedisLock(lock_key, timeout_ms=SLOT_REBUILD_LOCK_MS)
+    if lock.acquire():
+        try:
+            return rebuild_slot_cache(slot)
+        finally:
+            lock.release()
+
+    # 其他请求正在重建，等待重建完成
+    for _ in range(SLOT_REBUILD_WAIT_TIMES):
+        time.sleep(SLOT_REBUILD_WAIT_INTERVAL)
+        if redis_client.exists(fresh_key):
+            return [int(product_id) for product_id in redis_client.smembers(slot_products_key)]
+    return None
+
+
 @sliding_window_limit(threshold=5)
 def index(request):
-    time_slots = [8, 10, 12, 14, 16, 18, 20, 22]
-
-    current_slot = get_current_slot(datetime.now().hour)
-    # 判断用户点击场次
+    slot_index = get_slot_index()
+    current_slot = slot_index.current(int(time.time()))
+    # 判断用户点击场次（场次编码yyyymmddhhmm，兼容按小时编码的旧场次yyyymmddhh）
     slot_param = request.GET.get('slot')
-    if slot_param:
-        selected_slot = int(slot_param)
+    if slot_param and slot_param.isdigit() and len(slot_param) in (10, 12):
+        selected_slot = slot_param
     else:
         selected_slot = current_slot
 
-    # 场次商品集合键
-    slot_products_key = f"seckill:slot:{selected_slot}:products"
-    # 从Redis中获取当前场次的商品ID集合
-    product_ids = redis_client.smembers(slot_products_key)
-
-    seckill_products = []
+    # 获取当前场次的商品ID集合（缓存不存在时单飞回源重建）
+    product_ids = get_slot_product_ids(selected_slot) if selected_slot else []
 
-    # 如果redis中存在商品
-    if product_ids:
-
-        # 从redis中获取商品详情
-        for product_id in product_ids:
-            # 商品键
-            product_key = f"seckill:product:{product_id.decode()}"
-            product_data = redis_client.hgetall(product_key)
-            if product_data:
-                # 将字节数据转换为Python对象
-                stock = int(product_data[b'stock'].decode())
-                # 获取总库存（初始库存）
-                total_stock = int(product_data.get(b'total_stock', product_data[b'stock']).decode())
-                # 计算已售百分比
-                sold_percentage = 0
-                if total_stock > 0:
-                    sold_percentage = min(100, round((total_stock - stock) / total_stock * 100))
-                
-                product_info = {
-                    'id': int(product_data[b'id'].decode()),
-                    'name': product_data[b'name'].decode(),
-                    'seckill_price': float(product_data[b'seckill_price'].decode()),
-                    'base_price': float(product_data[b'base_price'].decode()),
-                    'stock': stock,
-                    'total_stock': total_stock,
-                    'sold_percentage': sold_percentage,
-                    'status': int(product_data[b'status'].decode()),
-                    'image': '/product_img/扫地机器人.webp',  # 默认图片
-                    'seckill_start_time': datetime.fromisoformat(product_data[b'seckill_start_time'].decode()),
-                    'seckill_end_time': datetime.fromisoformat(product_data[b'seckill_end_time'].decode())
-                }
-                seckill_products.append(product_info)
+    # 如果redis中存在商品，从redis中获取商品详情
+    if product_ids is not None:
+        seckill_products = build_slot_products(product_ids)
     else:
-        # Redis中没有缓存，从数据库获取并缓存
-        now = datetime.now()
-        start_time = timezone.make_aware(datetime(now.year, now.month, now.day, selected_slot, 0, 0))
-        db_products = SeckillProduct.objects.filter(seckill_start_time=start_time)
+        # 等待重建超时，直接从数据库读取展示（不写缓存）
+        seckill_products = []
+        db_products = SeckillProduct.objects.filter(session__code=selected_slot)
 
-        # 将数据库商品添加到列表并缓存到Redis
         for product in db_products:
             # 为每个商品添加销售进度信息
             product.total_stock = product.stock  # 初始库存等于当前库存
             product.sold_percentage = 0  # 初始已售百分比为0
+            product.start_ts = to_epoch(product.seckill_start_time)
+            product.end_ts = to_epoch(product.seckill_end_time)
             seckill_products.append(product)
-            # 缓存商品信息到Redis
-            product_key = f"seckill:product:{product.id}"
-            product_data = {
-                "id": product.id,
-                "name": product.name,
-                "seckill_price": str(product.seckill_price),
-                "base_price": str(product.base_price),
-                "stock": product.stock,
-                "total_stock": product.stock,  # 保存初始库存用于计算销售进度
-                "status": product.status,
-                "seckill_start_time": product.seckill_start_time.isoformat() if product.seckill_start_time else "",
-                "seckill_end_time": product.seckill_end_time.isoformat() if product.seckill_end_time else ""
-            }
-            redis_client.hset(product_key, mapping=product_data)
-            # 为商品键设置2.5小时过期时间
-            redis_client.expire(product_key, 9000)
-
-            # 缓存库存键
-            stock_key = f"seckill:stock:{product.id}"
-            redis_client.set(stock_key, product.stock)
-            redis_client.expire(stock_key, 9000)
-
-            # 将商品ID添加到场次集合中
-            redis_client.sadd(slot_products_key, product.id)
-
-        # 设置场次商品集合的过期时间为2.5小时
-        redis_client.expire(slot_products_key, 9000)
 
     return render(request, "index.html", {
         "seckill_products": seckill_products,
-        "time_slots": time_slots,
+        "time_slots": slot_index.time_slots,
         "selected_slot": selected_slot
     })
 
-@sliding_window_limit(threshold=5)
+@buy_metrics
+@sliding_window_limit(threshold=5, ip_threshold=settings.SECKILL_IP_RATE_LIMIT)
 def buy(request, product_id):
+    mark_stage("rate_limit")
     if request.method != "POST":
+        mark_outcome("bad_request")
         return render(request, "result.html", {"code": 405, "msg": "方法不允许"})
 
     # 初始化布隆过滤器
@@ -142,111 +173,183 @@ def buy(request, product_id):
 
     # 验证商品ID是否存在
     if not product_bloom.contains(product_id):
+        mark_outcome("not_found")
         return render(request, "result.html", {"code": 404, "msg": "商品不存在"})
+    mark_stage("bloom")
 
-    # 获取用户ip标识用于购物限量
-    user_id = request.META.get('HTTP_X_FORWARDED_FOR', '127.0.0.1')
+    # 获取签名的用户身份用于购物限量（POST请求不签发身份，没有身份的请求直接拒绝）
+    user_id = get_user_id(request)
     if not user_id:
-        return render(request, "result.html", {"code": 400, "msg": "用户标识获取失败"})
+        mark_outcome("bad_request")
+        return render(request, "result.html", {"code": 400, "msg": "用户标识获取失败，请刷新页面后重试"})
 
-    product_key = f"seckill:product:{product_id}"   # 商品键
-    stock_key = f"seckill:stock:{product_id}"    # 库存键
-    user_limit_key = f"seckill:user_limit:{product_id}"  # 记录已购买用户
-    result_key = f"seckill:result:{user_id}:{product_id}"  # 秒杀结果缓存
-
-    # 检查商品状态
+    # 获取购买数量（默认购买1件）
     try:
-        # 从Redis获取状态
-        status = redis_client.hget(product_key, "status")
-        if status is None:
-            # 如果Redis中没有找到状态，可能是商品不存在或者缓存过期
-            return render(request, "result.html", {"code": 404, "msg": "商品不存在或已下架"})
-
-        if int(status) != 1:
-            return render(request, "result.html", {"code": 400, "msg": "秒杀未开始或已结束"})
-    except SeckillProduct.DoesNotExist:
-        return render(request, "result.html", {"code": 404, "msg": "商品不存在"})
+        quantity = int(request.POST.get('quantity', 1))
+    except (TypeError, ValueError):
+        quantity = 0
+    if quantity < 1:
+        mark_outcome("bad_request")
+        return render(request, "result.html", {"code": 400, "msg": "购买数量错误"})
+
+    # 同一商品的键使用相同的哈希标签，集群模式下Lua脚本访问的键在同一个槽
+    product_key = keys.product_key(product_id)   # 商品键
+    stock_key = keys.stock_key(product_id)    # 库存键
+    user_limit_key = keys.user_limit_key(product_id)  # 记录用户已购数量
+    results_key = keys.results_key(product_id)  # 秒杀结果哈希
+
+    # 前置过滤：去重窗口吸收重复点击，请求压力过大时要求完成工作量证明挑战
+    # （等候室放行后携带排队凭证的重新提交已经通过过滤，不再重复检查）
+    signed_ticket = request.POST.get('ticket')
+    if not signed_ticket:
+        try:
+            duplicate, challenge_required = check_request(product_id, user_id)
+            if duplicate:
+                mark_outcome("duplicate")
+                return render(request, "result.html", {"code": 429, "msg": "请求处理中，请勿重复提交"})
+            # 身份带挑战标记（同一IP签发的身份过多）时总是需要完成挑战
+            if challenge_required or requires_challenge(request):
+                verify_challenge(request.POST.get('challenge', ''), request.POST.get('solution', ''),
+                                 product_id, user_id)
+        except ValueError:
+            # 未完成挑战：结束去重窗口，页面完成挑战后重新提交
+            release_request(product_id, user_id)
+            challenge, difficulty = issue_challenge(product_id, user_id)
+            mark_outcome("challenged")
+            return render(request, "challenge.html", {
+                "product_id": product_id,
+                "quantity": quantity,
+                "challenge": challenge,
+                "difficulty": difficulty,
+            })
+        except Exception as e:
+            mark_outcome("error")
+            return render(request, "result.html", {"code": 500, "msg": f"系统错误：{str(e)}"})
+    mark_stage("guard")
+
+    # 检查商品状态：只读取商品状态和快照版本（热点商品从进程内近端缓存读取）
+    status, version = product_cache.hmget(product_key, "status", "version")
+    if status is None:
+        # 如果Redis中没有找到状态，可能是商品不存在或者缓存过期
+        mark_outcome("not_found")
+        return render(request, "result.html", {"code": 404, "msg": "商品不存在或已下架"})
+
+    if int(status) != 1:
+        mark_outcome("not_started")
+        return render(request, "result.html", {"code": 400, "msg": "秒杀未开始或已结束"})
+
+    # 商品名称和秒杀价取自快照，版本未变化时不再读取完整的商品哈希
+    product_info = product_snapshots.get(product_id, version)
+    if product_info is None:
+        mark_outcome("not_found")
+        return render(request, "result.html", {"code": 404, "msg": "商品不存在或已下架"})
+    mark_stage("status")
+
+    # 排队准入：首次进入发放排队号，未放行的进入等候室，等候室放行后携带排队凭证重新提交
+    try:
+        if signed_ticket:
+            ticket = read_ticket(signed_ticket, product_id, user_id)
+            serving, _ = queue_status(product_id)
+        else:
+            code, ticket, serving = admit(product_id, user_id)
+            if code == SOLD_OUT:
+                mark_outcome("sold_out")
+                return render(request, "result.html", {"code": 400, "msg": "商品已抢完"})
+            if code == QUEUE_FULL:
+                mark_outcome("rejected")
+                return render(request, "result.html", {"code": 400, "msg": "排队人数过多，请稍后再试"})
+            signed_ticket = issue_ticket(product_id, user_id, ticket)
+    except ValueError as e:
+        mark_outcome("bad_request")
+        return render(request, "result.html", {"code": 400, "msg": str(e)})
+    except Exception as e:
+        mark_outcome("error")
+        return render(request, "result.html", {"code": 500, "msg": f"系统错误：{str(e)}"})
+    if ticket > serving:
+        position, wait_seconds = queue_position(ticket, serving)
+        mark_outcome("queued")
+        return render(request, "waiting_room.html", {
+            "product_id": product_id,
+            "product_name": product_info["name"],
+            "ticket": ticket,
+            "signed_ticket": signed_ticket,
+            "quantity": quantity,
+            "position": position,
+            "wait_seconds": wait_seconds,
+        })
+    mark_stage("admission")
+
+    # 预先生成订单ID和订单消息，扣减成功时由Lua脚本一并写入结果哈希和发件箱
+    order_id = snowflake.generate_id()
+    outbox_key = keys.outbox_key(product_id)  # 订单消息发件箱
+
+    # 签发无状态秒杀令牌（HMAC签名，订单创建时验签，不写Redis）
+    seckill_token = issue_token(order_id, user_id, product_id, quantity)
+    mark_stage("token")
+
+    # 创建消息内容，包含用户ID、商品ID、秒杀令牌和商品快照（订单创建时不再查询商品表）
+    message = {
+        "order_id": order_id,
+        "user_id": user_id,
+        "product_id": product_id,
+        "quantity": quantity,
+        "seckill_token": seckill_token,
+        "product_info": product_info
+    }
 
     # 执行Lua脚本，检查并扣减库存
     try:
         # 执行Lua脚本
         result = redis_client.eval(
             STOCK_DECR_SCRIPT,
-            3,  # 键的数量
-            stock_key, product_key, user_limit_key,  # 三个KEYS参数
-            user_id  # ARGV参数
+            5,  # 键的数量
+            stock_key, product_key, user_limit_key, results_key, outbox_key,  # 五个KEYS参数
+            # ARGV参数：用户哈希、购买数量、默认限购数量、订单ID、结果哈希的过期时间、订单消息
+            user_field(user_id), quantity, DEFAULT_LIMIT_PER_USER, order_id, SECKILL_RESULT_EXPIRE,
+            encode_message(message)
         )
+        mark_stage("lua")
 
-        # 秒杀成功
-        if result == 1:
-            # 生成秒杀令牌
-            timestamp = int(time.time() * 1000)
-            token_data = f"{user_id}:{product_id}:{timestamp}:{settings.SECRET_KEY}"
-            seckill_token = hashlib.md5(token_data.encode()).hexdigest()
-
-            # 缓存秒杀令牌，用于订单创建时验证
-            token_key = f"seckill:token:{seckill_token}"
-            token_value = json.dumps({
-                "user_id": user_id,
-                "product_id": product_id,
-                "timestamp": timestamp
-            })
-            redis_client.setex(token_key, 300, token_value)  # 令牌5分钟内有效
-
-            # 生成唯一订单ID
-            order_id = snowflake.generate_id()
-
-            # 获取商品信息
-            product_data = redis_client.hgetall(product_key)
-            product_info = {
-                "id": product_id,
-                "name": product_data[b"name"].decode(),
-                "seckill_price": float(product_data[b"seckill_price"].decode())
-            }
-
-            # 创建消息内容，包含用户ID、商品ID、秒杀令牌
-            message = {
-                "order_id": order_id,
-                "user_id": user_id,
-                "product_id": product_id,
-                "seckill_token": seckill_token,
-                "product_info": product_info
-            }
-
-            # 调用Celery异步任务，通过RabbitMQ发送消息
-            create_seckill_order.delay(message=message)
-
-            # 记录秒杀结果（供前端轮询）
-            redis_client.setex(result_key, 300, json.dumps({
-                "success": True,
-                "order_id": order_id
-            }))
-
-            return render(request, "result.html", {
-                "code": 200,
-                "msg": "抢购成功，正在生成订单...",
-                "order_id": order_id
-            })
-        # 库存不足
-        elif result == 0:
-            redis_client.setex(result_key, 60, json.dumps({"success": False, "msg": "商品已抢完"}))
+        # 库存不足（库存键为0即可判断，不再为每个请求写入失败结果）
+        if result == 0:
+            mark_outcome("sold_out")
             return render(request, "result.html", {"code": 400, "msg": "商品已抢完"})
 
-        # 用户已购买
+        # 超出限购数量
         elif result == 2:
-            return render(request, "result.html", {"code": 400, "msg": "您已购买过该商品"})
+            mark_outcome("over_limit")
+            return render(request, "result.html", {"code": 400, "msg": "超出该商品限购数量"})
+
+        # 秒杀成功，result为发件箱中的消息ID
+        # 调用Celery异步任务，通过RabbitMQ发送消息，发布成功后删除发件箱中的消息
+        # 消息代理不可用时消息留在发件箱中，由中继任务补发，用户仍然抢购成功
+        try:
+            create_seckill_order.delay(message=message)
+            redis_client.xdel(outbox_key, result)
+        except Exception as e:
+            logging.warning(f"订单消息发布失败，已保留在发件箱等待中继补发: {order_id}, {e}")
+        mark_stage("publish")
+        mark_outcome("success")
+
+        return render(request, "result.html", {
+            "code": 200,
+            "msg": "抢购成功，正在生成订单...",
+            "order_id": order_id
+        })
 
     except Exception as e:
+        mark_outcome("error")
         return render(request, "result.html", {"code": 500, "msg": f"系统错误：{str(e)}"})
 
 @sliding_window_limit(threshold=5)
 def order_list(request):
     """订单列表页面"""
-    # 获取用户标识
-    user_id = request.META.get('HTTP_X_FORWARDED_FOR', '127.0.0.1')
+    # 获取用户标识（签名的用户身份）
+    user_id = get_user_id(request)
     
-    # 查询该用户的所有订单，按创建时间倒序排列
-    orders = SeckillOrder.objects.filter(user_id=user_id).order_by('-create_time')
+    # 查询该用户的所有订单（热表和归档表），按创建时间倒序排列（刚下单的用户从主库读取）
+    with read_your_writes(user_id):
+        orders = list_user_orders(user_id)
     
     # 准备订单状态映射
     order_status_map = {
@@ -256,8 +359,8 @@ def order_list(request):
         3: '已完成'
     }
     
-    # 计算待支付订单的剩余支付时间（5分钟支付期限）
-    current_time = timezone.now()
+    # 计算待支付订单的剩余支付时间（5分钟支付期限），按Unix秒计算
+    now_ts = int(time.time())
     orders_with_time_info = []
     for order in orders:
         order_info = {
@@ -267,11 +370,9 @@ def order_list(request):
         
         # 对于待支付订单，计算剩余支付时间
         if order.status == 0:
-            # 订单超时时间为创建时间后5分钟
-            timeout_time = order.create_time + timedelta(minutes=5)
-            # 计算剩余时间（秒），如果还未超时
-            if current_time < timeout_time:
-                remaining_seconds = int((timeout_time - current_time).total_seconds())
+            # 订单超时时间为创建时间后5分钟，计算剩余时间（秒），如果还未超时
+            remaining_seconds = int(order.create_time.timestamp()) + ORDER_PAY_SECONDS - now_ts
+            if remaining_seconds > 0:
                 order_info['remaining_time'] = remaining_seconds
         
         orders_with_time_info.append(order_info)
@@ -286,11 +387,12 @@ def order_list(request):
 def pay_order(request, order_id):
     """订单支付处理"""
     if request.method == "POST":
-        # 获取用户标识
-        user_id = request.META.get('HTTP_X_FORWARDED_FOR', '127.0.0.1')
+        # 获取用户标识（签名的用户身份）
+        user_id = get_user_id(request)
 
-        # 查询订单
-        order = SeckillOrder.objects.get(id=order_id, user_id=user_id)
+        # 查询订单（支付前需读取最新状态，走主库）
+        with use_primary():
+            order = SeckillOrder.objects.get(id=order_id, user_id=user_id)
 
         # 检查订单状态是否为待支付
         if order.status != 0:
@@ -398,10 +500,12 @@ def alipay_notify(request):
         # 7. 数据更新逻辑
         try:
             out_trade_no = params.get('out_trade_no')
-            order = SeckillOrder.objects.get(id=out_trade_no)
+            with use_primary():
+                # 重复的通知可能在订单归档之后到达，按订单ID路由到热表或归档表
+                order = get_order(out_trade_no)
 
             # 幂等性处理：如果已经支付成功，直接返回
-            if order.status == "已支付":
+            if order.status == 1:
                 return HttpResponse("success")
 
             # 更新订单状态
@@ -424,11 +528,12 @@ def cancel_order(request, order_id):
     """取消订单"""
     if request.method == "POST":
         try:
-            # 获取用户标识
-            user_id = request.META.get('HTTP_X_FORWARDED_FOR', '127.0.0.1')
+            # 获取用户标识（签名的用户身份）
+            user_id = get_user_id(request)
             
-            # 查询订单
-            order = SeckillOrder.objects.get(id=order_id, user_id=user_id)
+            # 查询订单（先读后写，走主库）
+            with use_primary():
+                order = SeckillOrder.objects.get(id=order_id, user_id=user_id)
             
             # 检查订单状态是否为待支付
             if order.status != 0:
@@ -437,14 +542,13 @@ def cancel_order(request, order_id):
                     "msg": "订单状态错误，无法取消"
                 })
             
-            # 更新订单状态为已取消
-            order.status = 2
-            order.cancel_time = datetime.now()
-            order.save()
-            
-            # 调用任务中的函数恢复库存并解除限购
-            restore_stock_and_remove_limit(order.goods_id, user_id)
-            
+            # 取消订单并恢复库存、解除限购（按订单状态比较并设置，与超时检查同时执行时只有一方成功）
+            if not cancel_pending_order(order.id, order.goods_id, user_id, order.quantity):
+                return render(request, "result.html", {
+                    "code": 400,
+                    "msg": "订单状态错误，无法取消"
+                })
+
             return render(request, "result.html", {
                 "code": 200,
                 "msg": "订单已取消，库存已恢复",
@@ -464,4 +568,74 @@ def cancel_order(request, order_id):
     return render(request, "result.html", {
         "code": 405,
         "msg": "方法不允许"
-    })
\ No newline at end of file
+    })
+
+
+def seckill_status(request, product_id):
+    """等候室轮询的排队进度：是否已放行、前面还有多少人、预计等待秒数、是否已售罄"""
+    user_id = get_user_id(request)
+    try:
+        ticket = read_ticket(request.GET.get('ticket', ''), product_id, user_id)
+    except ValueError as e:
+        return JsonResponse({"code": 400, "msg": str(e)}, status=400, json_dumps_params={"ensure_ascii": False})
+    serving, stock = queue_status(product_id)
+    position, wait_seconds = queue_position(ticket, serving)
+    return JsonResponse({
+        "code": 200,
+        "ready": ticket <= serving,
+        "position": position,
+        "wait_seconds": wait_seconds,
+        "sold_out": stock <= 0,
+    })
+
+
+@ensure_csrf_cookie
+def seckill_session(request):
+    """
+    静态场次页打开时请求一次：下发csrftoken Cookie供抢购表单使用，没有身份时由身份中间件签发身份Cookie
+    响应带有用户各自的Cookie，禁止任何缓存
+    """
+    response = JsonResponse({})
+    response["Cache-Control"] = "private, no-store"
+    return response
+
+
+@skip_identity
+def seckill_stock(request):
+    """
+    场次页轮询的实时库存：?ids=1,2,3，返回各商品的剩余库存和已售百分比
+    响应与用户无关，不下发任何Cookie（CSRF令牌和身份由 seckill_session 下发），可以被共享缓存
+    """
+    product_ids = [int(product_id) for product_id in request.GET.get('ids', '').split(',')
+                   if product_id.isdigit()][:STOCK_POLL_MAX_PRODUCTS]
+    with redis_client.pipeline(transaction=False) as pipe:
+        for product_id in product_ids:
+            pipe.hmget(keys.product_key(product_id), "stock", "total_stock")
+        rows = pipe.execute()
+
+    stocks = {}
+    for product_id, (stock, total_stock) in zip(product_ids, rows):
+        if stock is None:
+            continue
+        stock, total_stock = int(stock), int(total_stock or stock)
+        stocks[product_id] = {
+            "stock": stock,
+            "sold_percentage": min(100, round((total_stock - stock) / total_stock * 100)) if total_stock > 0 else 0,
+        }
+    response = JsonResponse(stocks)
+    # 允许前端服务器短暂缓存，同一秒内的轮询不再进入Django
+    response["Cache-Control"] = f"public, max-age={STOCK_POLL_CACHE_SECONDS}"
+    return response
+
+
+@skip_identity
+def near_cache_stats(request):
+    """近端缓存统计：各商品Key的命中次数、未命中次数、命中率及是否为热点Key"""
+    return JsonResponse(product_cache.stats(), json_dumps_params={"ensure_ascii": False})
+
+
+@skip_identity
+def metrics(request):
+    """Prometheus指标"""
+    content, content_type = export_metrics()
+    return HttpResponse(content, content_type=content_type)
@@ -0,0 +1,90 @@
+"""
+抢购排队准入
+秒杀开场时抢购请求远超库存，准入层在扣库存之前按商品发放排队号：
+- 库存售罄、或排队人数超过剩余库存的 SECKILL_ADMISSION_FACTOR 倍时直接拒绝，只执行一次Lua脚本
+- 放行进度按令牌桶推进（每秒 SECKILL_ADMISSION_RATE 个排队号），排队号已放行的请求直接抢购，
+  未放行的进入等候室，等候室轮询 /seckill/status/<商品ID>/ 查询排队进度，放行后携带排队凭证重新提交抢购
+- 排队凭证是签名的[商品ID, 用户ID, 排队号]（django.core.signing），不在Redis中存储
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core import signing
+
+from utils import keys
+from utils.codec import user_field
+from utils.lua import ADMISSION_SCRIPT
+from utils.redis_client import get_redis_client
+
+# 准入结果（与ADMISSION_SCRIPT的返回值一致）
+SOLD_OUT = 0
+ADMITTED = 1
+QUEUE_FULL = 2
+
+# 排队号哈希和准入状态在最后一次写入后的过期时间（秒）
+ADMISSION_EXPIRE = 1800
+# 排队凭证的签名盐值
+TICKET_SALT = "seckill.ticket"
+
+redis_client = get_redis_client()
+
+
+def admit(product_id, user_id):
+    """
+    为用户发放排队号（同一用户重复进入时返回原排队号）
+    :return: (准入结果, 排队号, 放行进度)，排队号不大于放行进度时可以直接抢购
+    """
+    code, ticket, serving = redis_client.eval(
+        ADMISSION_SCRIPT,
+        3,
+        keys.admission_key(product_id), keys.tickets_key(product_id), keys.stock_key(product_id),
+        user_field(user_id), int(time.time() * 1000), settings.SECKILL_ADMISSION_RATE,
+        settings.SECKILL_ADMISSION_BURST, settings.SECKILL_ADMISSION_FACTOR, ADMISSION_EXPIRE
+    )
+    return code, ticket, float(serving)
+
+
+def queue_status(product_id):
+    """
+    读取当前放行进度和剩余库存（只读，推进规则与ADMISSION_SCRIPT相同）
+    :return: (放行进度, 剩余库存)
+    """
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hmget(keys.admission_key(product_id), "issued", "serving", "updated_at")
+        pipe.get(keys.stock_key(product_id))
+        (issued, serving, updated_at), stock = pipe.execute()
+
+    now_ms = int(time.time() * 1000)
+    burst = settings.SECKILL_ADMISSION_BURST
+    issued = int(issued or 0)
+    serving = float(serving) if serving is not None else burst
+    updated_at = int(updated_at) if updated_at is not None else now_ms
+    serving = min(serving + max(now_ms - updated_at, 0) * settings.SECKILL_ADMISSION_RATE / 1000, issued + burst)
+    return serving, int(stock or 0)
+
+
+def queue_position(ticket, serving):
+    """排队号前面还有多少人，以及预计等待秒数"""
+    position = max(0, math.ceil(ticket - serving))
+    return position, math.ceil(position / settings.SECKILL_ADMISSION_RATE)
+
+
+def issue_ticket(product_id, user_id, ticket):
+    """签发排队凭证"""
+    return signing.dumps([product_id, user_id, ticket], salt=TICKET_SALT)
+
+
+def read_ticket(signed_ticket, product_id, user_id):
+    """
+    校验排队凭证，返回排队号
+    凭证无效、过期或不属于该用户和商品时抛出ValueError
+    """
+    try:
+        claimed_product, claimed_user, ticket = signing.loads(signed_ticket, salt=TICKET_SALT,
+                                                              max_age=settings.SECKILL_TICKET_MAX_AGE)
+    except (signing.BadSignature, ValueError):
+        raise ValueError("排队凭证无效或已过期")
+    if claimed_product != product_id or claimed_user != user_id:
+        raise ValueError("排队凭证与用户或商品不匹配")
+    return ticket
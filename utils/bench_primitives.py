@@ -0,0 +1,301 @@
+"""
+请求路径基础组件的微基准测试
+覆盖 utils.bloom、utils.snow_flake、utils.rate_limit、utils.lua、utils.seckill_token、utils.alipay.get_dic_sorted_params：
+- 吞吐：每个用例在 --duration 秒内循环调用，取 --rounds 轮的中位数（ops/sec）
+- 内存：tracemalloc 统计每次调用的峰值内存和残留内存（字节/op）
+- 锁竞争：雪花算法按1/2/4/8线程并发生成ID，对比多线程与单线程吞吐
+- 回归检测：--save-baseline 保存基线，--baseline 对比基线，超出 --threshold 时以非零状态退出
+
+默认使用 fakeredis（见 seckill_shop/settings_bench.py，设置 BENCH_REDIS_URL 时使用本地Redis）：
+    python utils/bench_primitives.py --save-baseline bench_baseline.json
+    python utils/bench_primitives.py --baseline bench_baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+# 设置项目根目录到系统路径（替换脚本所在的utils目录，避免utils/alipay.py遮蔽支付宝SDK）
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[0] = BASE_DIR
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seckill_shop.settings_bench')
+
+import django
+django.setup()
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from utils import keys
+from utils.alipay import get_dic_sorted_params
+from utils.bloom import BloomFilter
+from utils.codec import user_field
+from utils.lua import STOCK_DECR_SCRIPT
+from utils.outbox import encode_message
+from utils.rate_limit import sliding_window_limit
+from utils.redis_client import get_redis_client
+from utils.seckill_token import issue_token, verify_token
+from utils.snow_flake import Snowflake
+
+BLOOM_KEY = "bench:bloom:product"
+BLOOM_ITEMS = 10000  # 与线上商品规模相当的布隆过滤器元素数
+BATCH_SIZE = 1000  # batch_add 每批元素数
+RATE_LIMIT_USERS = 1000  # 限流用例轮换的IP数量
+SNOWFLAKE_THREADS = (1, 2, 4, 8)
+
+# 支付宝异步通知的典型参数
+ALIPAY_NOTIFY_PARAMS = {
+    "gmt_create": "2025-10-20 10:00:01", "charset": "utf-8", "seller_email": "seller@example.com",
+    "subject": "秒杀商品", "buyer_id": "2088102177846880", "invoice_amount": "99.00",
+    "notify_id": "2025102000222100001058030519000000", "fund_bill_list": '[{"amount":"99.00","fundChannel":"ALIPAYACCOUNT"}]',
+    "notify_type": "trade_status_sync", "trade_status": "TRADE_SUCCESS", "receipt_amount": "99.00",
+    "app_id": "9021000122345678", "buyer_pay_amount": "99.00", "seller_id": "2088102177296610",
+    "gmt_payment": "2025-10-20 10:00:02", "notify_time": "2025-10-20 10:00:03", "version": "1.0",
+    "out_trade_no": "1980000000000000000", "total_amount": "99.00", "trade_no": "2025102022001446880500000000",
+    "auth_app_id": "9021000122345678", "buyer_logon_id": "abc***@example.com", "point_amount": "0.00",
+    "sign": "x" * 344, "sign_type": "RSA2",
+}
+
+
+class Case:
+    """一个基准用例：func每调用一次完成ops次操作"""
+
+    def __init__(self, name, func, ops=1, setup=None):
+        self.name = name
+        self.func = func
+        self.ops = ops
+        self.setup = setup
+
+
+def build_cases():
+    redis_client = get_redis_client()
+
+    bloom = BloomFilter(key=BLOOM_KEY)
+    counter = {"bloom": 0, "rate": 0, "batch": 0}
+
+    redis_client.delete(BLOOM_KEY)
+
+    def bloom_setup():
+        # 布隆过滤器只初始化一次，各用例共享
+        if not redis_client.exists(BLOOM_KEY):
+            bloom.batch_add(range(BLOOM_ITEMS))
+
+    def bloom_add():
+        counter["bloom"] += 1
+        bloom.add(BLOOM_ITEMS + counter["bloom"])
+
+    def bloom_contains_hit():
+        counter["bloom"] += 1
+        bloom.contains(counter["bloom"] % BLOOM_ITEMS)
+
+    def bloom_contains_miss():
+        counter["bloom"] += 1
+        bloom.contains(-counter["bloom"])
+
+    def bloom_batch_add():
+        counter["batch"] += 1
+        start = counter["batch"] * BATCH_SIZE
+        bloom.batch_add(range(start, start + BATCH_SIZE))
+
+    snowflake = Snowflake()
+
+    factory = RequestFactory()
+    requests = [factory.get("/buy/1/", REMOTE_ADDR=f"10.0.{i // 256}.{i % 256}") for i in range(RATE_LIMIT_USERS)]
+    limited_view = sliding_window_limit(threshold=10 ** 9)(lambda request: HttpResponse())
+
+    def rate_limit():
+        counter["rate"] += 1
+        limited_view(requests[counter["rate"] % RATE_LIMIT_USERS])
+
+    stock_script = redis_client.register_script(STOCK_DECR_SCRIPT)
+    lua_keys = [keys.stock_key("bench"), keys.product_key("bench"), keys.user_limit_key("bench"),
+                keys.results_key("bench"), keys.outbox_key("bench")]
+
+    def lua_setup():
+        redis_client.delete(*lua_keys)
+        redis_client.set(lua_keys[0], 10 ** 12)
+        redis_client.hset(lua_keys[1], mapping={"limit_per_user": 10 ** 12, "stock": 10 ** 12})
+
+    def lua_stock_decr():
+        counter["rate"] += 1
+        stock_script(keys=lua_keys, args=[user_field(counter["rate"] % RATE_LIMIT_USERS), 1, 1, counter["rate"], 600,
+                                          encode_message({"order_id": counter["rate"]})])
+
+    token = issue_token(1980000000000000000, "10.0.0.1", 1, 1)
+
+    def token_issue():
+        counter["rate"] += 1
+        issue_token(counter["rate"], "10.0.0.1", 1, 1)
+
+    def token_verify():
+        verify_token(token, 1980000000000000000, "10.0.0.1", 1, 1)
+
+    def alipay_sorted_params():
+        get_dic_sorted_params(dict(ALIPAY_NOTIFY_PARAMS))
+
+    return [
+        Case("bloom.add", bloom_add, setup=bloom_setup),
+        Case("bloom.contains_hit", bloom_contains_hit, setup=bloom_setup),
+        Case("bloom.contains_miss", bloom_contains_miss, setup=bloom_setup),
+        Case(f"bloom.batch_add[{BATCH_SIZE}]", bloom_batch_add, ops=BATCH_SIZE, setup=bloom_setup),
+        Case("snowflake.generate_id", snowflake.generate_id),
+        Case("rate_limit.sliding_window", rate_limit),
+        Case("lua.stock_decr", lua_stock_decr, setup=lua_setup),
+        Case("seckill_token.issue", token_issue),
+        Case("seckill_token.verify", token_verify),
+        Case("alipay.get_dic_sorted_params", alipay_sorted_params),
+    ]
+
+
+def measure_throughput(case, duration, rounds):
+    """多轮计时，返回每轮的ops/sec"""
+    if case.setup:
+        case.setup()
+    results = []
+    for _ in range(rounds):
+        case.func()  # 预热
+        calls = 0
+        started = time.perf_counter()
+        deadline = started + duration
+        while True:
+            case.func()
+            calls += 1
+            if calls % 16 == 0 and time.perf_counter() >= deadline:
+                break
+        results.append(calls * case.ops / (time.perf_counter() - started))
+    return results
+
+
+def measure_memory(case, calls):
+    """tracemalloc统计：调用期间的峰值内存和调用后残留的内存（字节/op）"""
+    calls = max(calls // case.ops, 1)
+    case.func()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(calls):
+            case.func()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    ops = calls * case.ops
+    return {
+        "peak_bytes_per_op": round((peak - before) / ops, 1),
+        "retained_bytes_per_op": round(max(after - before, 0) / ops, 1),
+    }
+
+
+def measure_snowflake_contention(duration):
+    """多线程并发生成雪花ID，统计总吞吐并校验ID唯一"""
+    snowflake = Snowflake()
+    results = {}
+    single = None
+    for threads in SNOWFLAKE_THREADS:
+        ids = [[] for _ in range(threads)]
+        barrier = threading.Barrier(threads + 1)
+        stop = threading.Event()
+
+        def worker(bucket):
+            barrier.wait()
+            append = bucket.append
+            while not stop.is_set():
+                for _ in range(64):
+                    append(snowflake.generate_id())
+
+        workers = [threading.Thread(target=worker, args=(ids[i],)) for i in range(threads)]
+        for t in workers:
+            t.start()
+        barrier.wait()
+        started = time.perf_counter()
+        time.sleep(duration)
+        stop.set()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        total = sum(len(bucket) for bucket in ids)
+        unique = len(set().union(*ids))
+        ops = total / elapsed
+        single = single or ops
+        results[f"snowflake.threads[{threads}]"] = {
+            "ops_per_sec": round(ops, 1),
+            "scaling": round(ops / single, 3),  # 相对单线程的吞吐比，远小于1说明锁竞争严重
+            "duplicates": total - unique,
+        }
+    return results
+
+
+def run(args):
+    report = {}
+    for case in build_cases():
+        throughput = measure_throughput(case, args.duration, args.rounds)
+        report[case.name] = {
+            "ops_per_sec": round(statistics.median(throughput), 1),
+            "stdev": round(statistics.pstdev(throughput), 1),
+            **measure_memory(case, args.memory_calls),
+        }
+        print(f"{case.name:<36} {report[case.name]['ops_per_sec']:>12,.0f} ops/s  "
+              f"峰值 {report[case.name]['peak_bytes_per_op']:>8} B/op  残留 {report[case.name]['retained_bytes_per_op']:>8} B/op")
+
+    for name, result in measure_snowflake_contention(args.duration).items():
+        report[name] = result
+        print(f"{name:<36} {result['ops_per_sec']:>12,.0f} ops/s  扩展比 {result['scaling']}  重复ID {result['duplicates']}")
+    return report
+
+
+def compare(report, baseline, threshold):
+    """与基线对比，返回回归列表"""
+    regressions = []
+    for name, result in report.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: 吞吐 {result['ops_per_sec']:.0f} < 基线 {base['ops_per_sec']:.0f}")
+        for metric in ("peak_bytes_per_op", "retained_bytes_per_op"):
+            # 内存指标给64字节的余量，避免小数值的抖动误报
+            if metric in base and result[metric] > base[metric] * (1 + threshold) + 64:
+                regressions.append(f"{name}: {metric} {result[metric]} > 基线 {base[metric]}")
+        if result.get("duplicates"):
+            regressions.append(f"{name}: 生成了{result['duplicates']}个重复ID")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="请求路径基础组件的微基准测试")
+    parser.add_argument("--duration", type=float, default=1.0, help="每轮计时时长（秒）")
+    parser.add_argument("--rounds", type=int, default=5, help="计时轮数，取中位数")
+    parser.add_argument("--memory-calls", type=int, default=200, help="内存统计的调用次数")
+    parser.add_argument("--baseline", help="对比的基线JSON文件")
+    parser.add_argument("--save-baseline", help="将本次结果保存为基线JSON文件")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的回归比例（默认20%%）")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已写入: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"性能回归（阈值{args.threshold:.0%}）:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"未发现超过{args.threshold:.0%}的性能回归")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 import math
-import django_redis
+from utils.redis_client import get_redis_client
 import mmh3
 
 
@@ -10,7 +10,7 @@ class BloomFilter:
         self.key = key
         self.capacity = capacity  # 预计元素数量
         self.error_rate = error_rate  # 可接受的误判率
-        self.redis_client = django_redis.get_redis_connection("default")
+        self.redis_client = get_redis_client()
 
         # 计算所需的位数和哈希函数数量
         self.bit_size = int(-(self.capacity * math.log(self.error_rate)) / (math.log(2) ** 2)) + 1
@@ -0,0 +1,80 @@
+"""
+抢购请求的前置过滤（在排队准入和扣库存之前，一次Lua脚本）
+- 去重窗口：同一用户对同一商品在 SECKILL_DEDUP_WINDOW_MS 内只放行一个请求，连续点击直接返回
+- 压力检测：按商品统计每秒请求数，超过剩余库存的 SECKILL_CHALLENGE_RATIO 倍时开启工作量证明挑战，
+  用户需要在浏览器中计算 sha256(挑战:答案) 前 SECKILL_CHALLENGE_DIFFICULTY 位为0的答案后才能继续抢购；
+  挑战内容为签名的[商品ID, 用户ID, 难度, 随机数]，服务端只验签和计算一次哈希，不存储挑战
+"""
+import hashlib
+import itertools
+import secrets
+
+from django.conf import settings
+from django.core import signing
+
+from utils import keys
+from utils.codec import user_field
+from utils.lua import GUARD_SCRIPT
+from utils.redis_client import get_redis_client
+
+# 挑战的签名盐值
+CHALLENGE_SALT = "seckill.challenge"
+
+redis_client = get_redis_client()
+
+
+def check_request(product_id, user_id):
+    """
+    去重并统计请求压力
+    :return: (是否为重复请求, 是否需要挑战)
+    """
+    field = user_field(user_id).hex()
+    accepted, count, stock = redis_client.eval(
+        GUARD_SCRIPT,
+        3,
+        keys.dedup_key(product_id, field), keys.pressure_key(product_id), keys.stock_key(product_id),
+        settings.SECKILL_DEDUP_WINDOW_MS
+    )
+    if not accepted:
+        return True, False
+    return False, 0 < stock and stock * settings.SECKILL_CHALLENGE_RATIO < count
+
+
+def release_request(product_id, user_id):
+    """提前结束去重窗口（请求被要求完成挑战后重新提交）"""
+    redis_client.delete(keys.dedup_key(product_id, user_field(user_id).hex()))
+
+
+def issue_challenge(product_id, user_id):
+    """签发工作量证明挑战，返回(挑战, 难度)"""
+    difficulty = settings.SECKILL_CHALLENGE_DIFFICULTY
+    return signing.dumps([product_id, user_id, difficulty, secrets.token_hex(8)], salt=CHALLENGE_SALT), difficulty
+
+
+def _leading_zero_bits(challenge, solution):
+    digest = hashlib.sha256(f"{challenge}:{solution}".encode()).digest()
+    value = int.from_bytes(digest, "big")
+    return len(digest) * 8 - value.bit_length()
+
+
+def verify_challenge(challenge, solution, product_id, user_id):
+    """
+    校验挑战答案：签名有效、未过期、属于该用户和商品，且哈希满足难度
+    校验失败时抛出ValueError
+    """
+    try:
+        claimed_product, claimed_user, difficulty, _ = signing.loads(
+            challenge, salt=CHALLENGE_SALT, max_age=settings.SECKILL_CHALLENGE_MAX_AGE)
+    except (signing.BadSignature, ValueError):
+        raise ValueError("挑战无效或已过期")
+    if claimed_product != product_id or claimed_user != user_id:
+        raise ValueError("挑战与用户或商品不匹配")
+    if _leading_zero_bits(challenge, solution) < difficulty:
+        raise ValueError("挑战答案错误")
+
+
+def solve_challenge(challenge, difficulty):
+    """计算挑战答案（与页面中的脚本相同，压测工具使用）"""
+    for solution in itertools.count():
+        if _leading_zero_bits(challenge, solution) >= difficulty:
+            return solution
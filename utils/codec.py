@@ -0,0 +1,83 @@
+"""
+Redis中商品和用户数据的紧凑编码
+- 价格存整数分、时间存Unix秒：整数字符串在listpack中按整数存储，比小数字符串和ISO时间更短
+- 用户ID哈希为8字节定长字段：IP和各种长度的用户ID都只占8字节，64位哈希在千万级用户下碰撞概率可以忽略
+
+商品哈希字段：name, price_cents, base_price_cents, stock, total_stock, status, limit_per_user, start_ts, end_ts, version
+（商品ID已在键名中，不再单独存储；version为商品快照的版本，见 snapshot_version）
+"""
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+import mmh3
+
+# 用户哈希字段的字节数
+USER_FIELD_BYTES = 8
+# 商品快照包含的字段（秒杀期间不变，库存和状态不在其中）
+SNAPSHOT_FIELDS = ("name", "price_cents", "base_price_cents", "limit_per_user", "start_ts", "end_ts")
+
+
+def to_cents(amount):
+    """金额（Decimal/字符串/数字）转换为整数分"""
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+def from_cents(cents):
+    """整数分转换为保留两位小数的Decimal"""
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def to_epoch(value):
+    """datetime转换为Unix秒，空值为0"""
+    return int(value.timestamp()) if value else 0
+
+
+def from_epoch(seconds):
+    """Unix秒转换为UTC时间，0为空值"""
+    seconds = int(seconds)
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc) if seconds else None
+
+
+def user_field(user_id):
+    """用户ID哈希为8字节定长字段（限购计数、秒杀结果哈希的字段）"""
+    return mmh3.hash_bytes(str(user_id))[:USER_FIELD_BYTES]
+
+
+def snapshot_version(fields):
+    """商品快照的版本：快照字段的32位哈希，商品名称、价格等变化时版本随之变化，库存和状态变化时不变"""
+    return mmh3.hash("\x1f".join(str(fields[name]) for name in SNAPSHOT_FIELDS), signed=False)
+
+
+def encode_product(product):
+    """商品模型转换为商品哈希的字段（不含实时库存，实时库存由缓存回填脚本写入）"""
+    fields = {
+        "name": product.name,
+        "total_stock": product.total_stock,
+        "price_cents": to_cents(product.seckill_price),
+        "base_price_cents": to_cents(product.base_price),
+        "status": product.status,
+        "limit_per_user": product.limit_per_user,
+        "start_ts": to_epoch(product.seckill_start_time),
+        "end_ts": to_epoch(product.seckill_end_time),
+    }
+    fields["version"] = snapshot_version(fields)
+    return fields
+
+
+def decode_product(product_id, data, default_limit=1):
+    """商品哈希（HGETALL的结果）转换为页面展示用的字典（起止时间保持Unix秒，页面直接输出，不再逐个构造datetime）"""
+    stock = int(data[b"stock"])
+    total_stock = int(data.get(b"total_stock", data[b"stock"]))
+    return {
+        "id": int(product_id),
+        "name": data[b"name"].decode(),
+        "seckill_price": from_cents(data[b"price_cents"]),
+        "base_price": from_cents(data[b"base_price_cents"]),
+        "stock": stock,
+        "total_stock": total_stock,
+        "sold_percentage": min(100, round((total_stock - stock) / total_stock * 100)) if total_stock > 0 else 0,
+        "status": int(data[b"status"]),
+        "limit_per_user": int(data.get(b"limit_per_user", default_limit)),
+        "start_ts": int(data[b"start_ts"]),
+        "end_ts": int(data[b"end_ts"]),
+    }
@@ -0,0 +1,314 @@
+"""
+秒杀正确性压测：并发下验证不超卖、不丢单
+
+流程：
+1. 重建基准测试数据库，通过 utils/create_db.py 创建商品，预热Redis并开放所有商品
+2. 第一轮：大量用户并发抢购
+3. 第二轮：新用户继续抢购，同时并发取消和超时取消第一轮的订单
+4. 等待Celery队列消费完成
+5. 校验不变量：
+   - Redis库存 = 数据库库存 = 初始库存 - 未取消订单的购买数量
+   - 每个抢购成功的请求都生成了订单（不丢单）
+   - 每个用户的未取消购买数量不超过限购数量，且与Redis中的限购计数一致
+   - 库存审计（utils/stock_audit.py）没有发现偏差
+6. 吞吐和延迟结果写入JSON报告，便于跨版本对比
+
+默认在本地替身服务上运行（SQLite、fakeredis、内存消息队列，见 seckill_shop/settings_bench.py）：
+    python utils/consistency_bench.py --users 300 --requests 2000 --output consistency_report.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+# 设置项目根目录到系统路径（替换脚本所在的utils目录，避免utils/alipay.py遮蔽支付宝SDK）
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[0] = BASE_DIR
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seckill_shop.settings_bench')
+
+import django
+django.setup()
+
+from celery.contrib.testing.worker import start_worker
+from django.core.management import call_command
+from django.db import connections
+from django.db.models import Sum
+from django.test import Client
+from django.utils import timezone
+
+from seckill_shop.celery import app
+from shop.models import SeckillProduct, SeckillOrder, SeckillSession
+from shop.tasks import rebuild_slot_cache, order_timeout_check
+from utils.create_db import create_products
+from utils import keys
+from utils.buy_guard import solve_challenge
+from utils.codec import user_field
+from utils.db_router import use_primary
+from utils.identity import IDENTITY_COOKIE, sign_identity
+from utils.histogram import HdrHistogram
+from utils.redis_client import get_redis_client
+from utils.stock_audit import audit_stock
+
+ORDER_ID_PATTERN = re.compile(r'订单编号: <span class="font-medium">(\d+)</span>')
+MSG_PATTERN = re.compile(r'<h2[^>]*>\s*(.*?)\s*</h2>', re.S)
+TICKET_PATTERN = re.compile(r'<input type="hidden" name="ticket" value="([^"]+)">')
+WAIT_PATTERN = re.compile(r'<span id="queue-wait"[^>]*>(\d+)</span>')
+CHALLENGE_PATTERN = re.compile(r'<input type="hidden" name="challenge" value="([^"]+)">')
+DIFFICULTY_PATTERN = re.compile(r'const difficulty = (\d+);')
+
+
+def setup_data(args):
+    """重建数据库和Redis，创建商品并开放抢购"""
+    redis_client = get_redis_client()
+    redis_client.flushdb()
+    call_command('flush', interactive=False, verbosity=0)
+    call_command('migrate', verbosity=0)
+
+    create_products()
+
+    now = timezone.now()
+    products = list(SeckillProduct.objects.all())
+    for product in products:
+        product.stock = args.stock
+        product.total_stock = args.stock  # 库存审计的应有库存以初始库存为准
+        product.limit_per_user = random.randint(1, args.max_limit)
+        product.status = 1
+    SeckillProduct.objects.bulk_update(products, ['stock', 'total_stock', 'limit_per_user', 'status'])
+    # 场次和商品统一改为进行中，保证任意时间运行结果一致
+    SeckillSession.objects.update(start_time=now, end_time=now + timedelta(hours=2))
+    SeckillProduct.objects.update(seckill_start_time=now, seckill_end_time=now + timedelta(hours=2))
+
+    for code in SeckillSession.objects.values_list('code', flat=True):
+        rebuild_slot_cache(code)
+    return {product.id: product for product in products}
+
+
+def user_client(user_id):
+    """模拟持有签名身份Cookie的用户"""
+    client = Client()
+    client.cookies[IDENTITY_COOKIE] = sign_identity(user_id)
+    return client
+
+
+class Purchaser:
+    """并发发起抢购、取消请求，记录结果和延迟"""
+
+    def __init__(self, products):
+        self.products = products
+        self.product_ids = list(products)
+        self.histograms = {"buy": HdrHistogram(), "cancel": HdrHistogram(), "timeout": HdrHistogram()}
+        self.outcomes = {}
+        self.success_orders = {}  # 订单ID -> (用户, 商品ID, 数量)
+        self.lock = threading.Lock()
+
+    def _record(self, endpoint, outcome, started):
+        elapsed_us = (time.perf_counter() - started) * 1_000_000
+        key = f"{endpoint}:{outcome}"
+        with self.lock:
+            self.histograms[endpoint].record(elapsed_us)
+            self.outcomes[key] = self.outcomes.get(key, 0) + 1
+
+    def buy(self, user_id):
+        client = user_client(user_id)
+        product_id = random.choice(self.product_ids)
+        quantity = random.randint(1, self.products[product_id].limit_per_user)
+        started = time.perf_counter()
+        response = client.post(f"/buy/{product_id}/", {"quantity": quantity}, REMOTE_ADDR=user_id)
+        html = response.content.decode()
+        # 同浏览器中挑战页、等候室页面的自动提交：完成挑战后携带答案重新提交，
+        # 进入等候室时按预计等待时间等待后携带排队凭证重新提交
+        while True:
+            challenge_match = CHALLENGE_PATTERN.search(html)
+            ticket_match = TICKET_PATTERN.search(html)
+            if challenge_match:
+                challenge = challenge_match.group(1)
+                solution = solve_challenge(challenge, int(DIFFICULTY_PATTERN.search(html).group(1)))
+                data = {"quantity": quantity, "challenge": challenge, "solution": solution}
+            elif ticket_match:
+                wait_match = WAIT_PATTERN.search(html)
+                time.sleep(max(int(wait_match.group(1)) if wait_match else 1, 1))
+                data = {"quantity": quantity, "ticket": ticket_match.group(1)}
+            else:
+                break
+            response = client.post(f"/buy/{product_id}/", data, REMOTE_ADDR=user_id)
+            html = response.content.decode()
+        order_match = ORDER_ID_PATTERN.search(html)
+        if order_match:
+            self.success_orders[int(order_match.group(1))] = (user_id, product_id, quantity)
+            self._record("buy", "success", started)
+        else:
+            msg = MSG_PATTERN.search(html)
+            self._record("buy", msg.group(1) if msg else response.status_code, started)
+        connections.close_all()
+
+    def cancel(self, order_id):
+        user_id = self.success_orders[order_id][0]
+        started = time.perf_counter()
+        response = user_client(user_id).post(f"/order/cancel/{order_id}/")
+        msg = MSG_PATTERN.search(response.content.decode())
+        self._record("cancel", msg.group(1) if msg else response.status_code, started)
+        connections.close_all()
+
+    def timeout(self, order_id):
+        user_id, product_id, quantity = self.success_orders[order_id]
+        started = time.perf_counter()
+        order_timeout_check.apply(args=[order_id, product_id, user_id, quantity])
+        self._record("timeout", "done", started)
+        connections.close_all()
+
+
+def wait_for_orders(order_ids, timeout):
+    """等待Celery消费完所有下单消息"""
+    deadline = time.time() + timeout
+    missing = set(order_ids)
+    while missing and time.time() < deadline:
+        found = set(SeckillOrder.objects.filter(id__in=list(missing)).values_list('id', flat=True))
+        missing -= found
+        if missing:
+            time.sleep(0.2)
+    return missing
+
+
+def check_invariants(products, purchaser, missing_orders):
+    """校验库存、订单和限购不变量"""
+    redis_client = get_redis_client()
+    violations = []
+
+    sold = dict(SeckillOrder.objects.using('default').exclude(status=2).values('goods_id')
+                .annotate(total=Sum('quantity')).values_list('goods_id', 'total'))
+    db_stock = dict(SeckillProduct.objects.using('default').values_list('id', 'stock'))
+    for product_id, product in products.items():
+        expected = product.stock - sold.get(product_id, 0)
+        redis_stock = int(redis_client.get(keys.stock_key(product_id)) or 0)
+        if expected < 0:
+            violations.append(f"商品{product_id}超卖: 初始库存{product.stock}, 已售{sold.get(product_id, 0)}")
+        if redis_stock != expected:
+            violations.append(f"商品{product_id} Redis库存{redis_stock} != 期望库存{expected}")
+        if db_stock[product_id] != expected:
+            violations.append(f"商品{product_id} 数据库库存{db_stock[product_id]} != 期望库存{expected}")
+
+    with use_primary():
+        drifts = audit_stock(redis_client, list(products))
+    for product_id, source, current, expected, action in drifts:
+        violations.append(f"商品{product_id}库存审计偏差({source}): {current} != {expected}, {action}")
+
+    if missing_orders:
+        violations.append(f"丢单: {len(missing_orders)}个抢购成功的请求没有生成订单")
+
+    bought = SeckillOrder.objects.using('default').exclude(status=2).values('user_id', 'goods_id') \
+        .annotate(total=Sum('quantity'))
+    bought_map = {(row['user_id'], row['goods_id']): row['total'] for row in bought}
+    for (user_id, product_id), total in bought_map.items():
+        if total > products[product_id].limit_per_user:
+            violations.append(f"用户{user_id}购买商品{product_id}数量{total}超过限购{products[product_id].limit_per_user}")
+    # 限购计数的字段是用户哈希
+    bought_by_field = {(user_field(user_id), product_id): total for (user_id, product_id), total in bought_map.items()}
+    for product_id in products:
+        for field, count in redis_client.hgetall(keys.user_limit_key(product_id)).items():
+            expected = bought_by_field.get((field, product_id), 0)
+            if int(count) != expected:
+                violations.append(f"用户{field.hex()}商品{product_id}限购计数{int(count)} != 未取消购买数量{expected}")
+    return violations
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="秒杀正确性压测")
+    parser.add_argument("--users", type=int, default=300, help="抢购用户数")
+    parser.add_argument("--requests", type=int, default=2000, help="每轮抢购请求数")
+    parser.add_argument("--threads", type=int, default=32, help="并发线程数")
+    parser.add_argument("--stock", type=int, default=20, help="每个商品的初始库存")
+    parser.add_argument("--max-limit", type=int, default=3, help="商品限购数量的上限（随机1~N）")
+    parser.add_argument("--cancel-ratio", type=float, default=0.2, help="第二轮取消第一轮订单的比例")
+    parser.add_argument("--timeout-ratio", type=float, default=0.2, help="第二轮超时取消第一轮订单的比例")
+    parser.add_argument("--worker-concurrency", type=int, default=8, help="Celery Worker线程数")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="等待队列消费完成的最长时间（秒）")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子，便于复现")
+    parser.add_argument("--output", default="consistency_report.json", help="JSON报告输出路径")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    products = setup_data(args)
+    purchaser = Purchaser(products)
+    users = [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(args.users)]
+
+    started = time.perf_counter()
+    with start_worker(app, pool='threads', concurrency=args.worker_concurrency, perform_ping_check=False,
+                      shutdown_timeout=30):
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            # 第一轮：并发抢购
+            list(executor.map(purchaser.buy, (random.choice(users) for _ in range(args.requests))))
+            first_round = list(purchaser.success_orders)
+            missing = wait_for_orders(first_round, args.drain_timeout)
+
+            # 第二轮：继续抢购的同时取消和超时取消第一轮订单
+            created = [order_id for order_id in first_round if order_id not in missing]
+            random.shuffle(created)
+            cancel_count = int(len(created) * args.cancel_ratio)
+            timeout_count = int(len(created) * args.timeout_ratio)
+            jobs = [(purchaser.buy, random.choice(users)) for _ in range(args.requests)]
+            jobs += [(purchaser.cancel, order_id) for order_id in created[:cancel_count]]
+            jobs += [(purchaser.timeout, order_id) for order_id in created[cancel_count:cancel_count + timeout_count]]
+            random.shuffle(jobs)
+            list(executor.map(lambda job: job[0](job[1]), jobs))
+
+        missing = wait_for_orders(list(purchaser.success_orders), args.drain_timeout)
+    elapsed = time.perf_counter() - started
+
+    violations = check_invariants(products, purchaser, missing)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": timezone.now().isoformat(),
+        "params": vars(args),
+        "elapsed": round(elapsed, 3),
+        "orders": len(purchaser.success_orders),
+        "outcomes": purchaser.outcomes,
+        "throughput": {
+            "requests_per_sec": round(sum(h.total for h in purchaser.histograms.values()) / elapsed, 2),
+            "orders_per_sec": round(len(purchaser.success_orders) / elapsed, 2),
+        },
+        "latency_ms": {
+            endpoint: {
+                "count": histogram.total,
+                "p50": round(histogram.percentile(50) / 1000, 3),
+                "p95": round(histogram.percentile(95) / 1000, 3),
+                "p99": round(histogram.percentile(99) / 1000, 3),
+                "p999": round(histogram.percentile(99.9) / 1000, 3),
+            }
+            for endpoint, histogram in purchaser.histograms.items() if histogram.total
+        },
+        "violations": violations,
+        "passed": not violations,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"订单数: {report['orders']}, 耗时: {report['elapsed']}秒, 吞吐: {report['throughput']}")
+    print(f"请求结果: {report['outcomes']}")
+    if violations:
+        print(f"不变量校验失败（{len(violations)}项）:")
+        for violation in violations[:50]:
+            print(f"  - {violation}")
+    else:
+        print("不变量校验通过：无超卖、无丢单、无超限购")
+    print(f"报告已写入: {args.output}")
+    return 0 if not violations else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,7 +17,8 @@ import django
 django.setup()
 
 # 现在可以导入Django模型了
-from shop.models import SeckillProduct
+from shop.models import SeckillProduct, SeckillSession
+from utils.current_slot import get_slot_code
 
 
 def create_products():
@@ -29,6 +30,7 @@ def create_products():
     - 库存5~50随机
     - 秒杀开始时间的年月日为当前年月日，时间是8:00、10：00、12：00，14：00，16：00，18：00、20：00、22：00八个时间
     - 结束时间为开始时间往后推迟两小时
+    - 每个开始时间对应一个秒杀场次，商品关联到所属场次
     """
     # 准备秒杀开始时间列表
     today = datetime.now().date()
@@ -46,6 +48,16 @@ def create_products():
         start_date.replace(hour=22, minute=0, second=0, microsecond=0)
     ]
 
+    # 创建（或复用）每个时间点对应的场次
+    sessions = []
+    for start_time in time_points:
+        session, _ = SeckillSession.objects.get_or_create(code=get_slot_code(start_time), defaults={
+            'name': f"{start_time:%H:%M}场",
+            'start_time': start_time,
+            'end_time': start_time + timedelta(hours=2),
+        })
+        sessions.append(session)
+
     # 创建24条商品记录
     products = []
     for i in range(1, 25):
@@ -62,8 +74,10 @@ def create_products():
             seckill_price=309.00,
             # stock=random.randint(5, 50),  # 随机库存5~50
             stock=50,  # 库存
+            total_stock=50,  # 初始库存（批量插入不经过save，需要显式设置）
             seckill_start_time=start_time,
             seckill_end_time=end_time,
+            session=sessions[time_index],
             status=0  # 未开始
         )
         products.append(product)
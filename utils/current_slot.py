@@ -1,20 +1,89 @@
-def get_current_slot(current_hour):
-    time_slots = [8, 10, 12, 14, 16, 18, 20, 22]
-
-    # 1. 0:00-8:00 → 次日8点场
-    if 0 <= current_hour < 8:
-        return 8
-
-    # 2. 22:00-24:00 → 22点场
-    if 22 <= current_hour < 24:
-        return 22
-
-    # 3. 8:00-22:00 → 匹配对应的场次（8-10点→8，10-12→10...20-22→20）
-    for i in range(7):  # 只遍历前7个场次（8-20点），因为22点已单独处理
-        start = time_slots[i]
-        end = time_slots[i + 1]
-        if start <= current_hour < end:
-            return start
-
-    # 理论上不会走到这里，兜底返回8点场
-    return 8
\ No newline at end of file
+from bisect import bisect_right
+
+from django.utils import timezone
+
+# 按小时索引覆盖的小时数（今天和明天，场次表只加载今天及未来24小时内的场次）
+INDEX_HOURS = 48
+
+
+def get_slot_code(start_time):
+    """
+    场次编码：场次开始时间的本地日期和时分(yyyymmddhhmm)
+    Redis键使用该编码，不同日期的同一时段不会互相覆盖；同一小时内可以有多个场次（如10:00和10:30）
+    """
+    return timezone.localtime(start_time).strftime('%Y%m%d%H%M')
+
+
+class SlotIndex:
+    """
+    场次时间索引，场次表加载后构建一次，请求中查询默认场次为常数时间
+    - 场次的开始/结束时间预先转换为Unix秒，场次按钮（编码、标签、起止时间）预先生成
+    - 默认场次只在某个场次开始或结束时变化：按这些时间点把时间轴切成若干段，构建时算好每段的默认场次
+    - 按小时的数组记录每个小时开始时所在的段，查询时从该段向后跨过该小时内的时间点（通常为0~1个）
+    """
+
+    def __init__(self, sessions, now=None):
+        """
+        :param sessions: 按开始时间升序排列的场次列表
+        """
+        local_now = timezone.localtime(now or timezone.now())
+        self.day = local_now.date()
+        self.day_start_ts = int(local_now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+        self.codes = [session.code for session in sessions]
+        self.starts = [int(session.start_time.timestamp()) for session in sessions]
+        self.ends = [int(session.end_time.timestamp()) for session in sessions]
+
+        # 场次按钮：今天的场次只显示时分，其他日期的场次带上日期
+        self.time_slots = []
+        for session, start_ts, end_ts in zip(sessions, self.starts, self.ends):
+            local_start = timezone.localtime(session.start_time)
+            self.time_slots.append({
+                "code": session.code,
+                "label": local_start.strftime('%H:%M' if local_start.date() == self.day else '%m-%d %H:%M'),
+                "start_ts": start_ts,
+                "end_ts": end_ts,
+            })
+
+        # 第i段为[boundaries[i-1], boundaries[i])，第0段为第一个时间点之前
+        self.boundaries = sorted(set(self.starts) | set(self.ends))
+        self.segments = [self._scan(self.boundaries[0] - 1 if self.boundaries else 0)]
+        self.segments += [self._scan(boundary) for boundary in self.boundaries]
+        self.hours = [bisect_right(self.boundaries, self.day_start_ts + hour * 3600) for hour in range(INDEX_HOURS)]
+
+    def _scan(self, now_ts):
+        """
+        按场次顺序选出默认展示的场次（只在构建索引时调用）
+        1. 有进行中的场次 → 最近开始的进行中场次
+        2. 没有进行中的场次 → 下一个即将开始的场次
+        3. 都没有 → 最后一个场次
+        """
+        current = None
+        for code, start_ts, end_ts in zip(self.codes, self.starts, self.ends):
+            if start_ts <= now_ts < end_ts:
+                current = code
+            elif start_ts > now_ts:
+                # 已经找到进行中的场次时优先返回进行中的场次
+                return current or code
+        if current:
+            return current
+        return self.codes[-1] if self.codes else None
+
+    def current(self, now_ts):
+        """
+        默认展示的场次
+        :param now_ts: 当前Unix秒
+        :return: 场次编码，没有场次时返回None
+        """
+        hour = (now_ts - self.day_start_ts) // 3600
+        if 0 <= hour < INDEX_HOURS:
+            segment = self.hours[hour]
+            while segment < len(self.boundaries) and self.boundaries[segment] <= now_ts:
+                segment += 1
+        else:
+            segment = bisect_right(self.boundaries, now_ts)
+        return self.segments[segment]
+
+    def is_stale(self, now_ts):
+        """跨天后需要重建（今天的场次标签和按小时索引都以构建当天为准）"""
+        return not self.day_start_ts <= now_ts < self.day_start_ts + 86400
@@ -0,0 +1,59 @@
+import threading
+from contextlib import contextmanager
+from utils.keys import db_pin_key
+from utils.redis_client import get_redis_client
+from django.conf import settings
+
+# 线程本地状态：记录当前线程是否强制读主库（计数以支持嵌套）
+_local = threading.local()
+
+
+class PrimaryReplicaRouter:
+    """
+    数据库读写分离路由
+    写操作走主库(default)，读操作走从库(replica)；
+    处于use_primary()上下文中时读操作也走主库，用于先读后写和读己之写的场景
+    """
+
+    def db_for_read(self, model, **hints):
+        if getattr(_local, 'primary_depth', 0) > 0:
+            return 'default'
+        return 'replica'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 主从库数据相同，允许跨库关联
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 只在主库执行迁移，从库通过复制同步
+        return db == 'default'
+
+
+@contextmanager
+def use_primary():
+    """在上下文中强制所有读操作走主库"""
+    _local.primary_depth = getattr(_local, 'primary_depth', 0) + 1
+    try:
+        yield
+    finally:
+        _local.primary_depth -= 1
+
+
+def pin_user_to_primary(user_id):
+    """用户写入订单后调用，在一段时间内该用户的读请求都走主库"""
+    redis_client = get_redis_client()
+    redis_client.setex(db_pin_key(user_id), settings.DATABASE_PRIMARY_PIN_SECONDS, 1)
+
+
+@contextmanager
+def read_your_writes(user_id):
+    """如果用户近期有写入则在上下文中读主库，否则正常读从库"""
+    redis_client = get_redis_client()
+    if redis_client.exists(db_pin_key(user_id)):
+        with use_primary():
+            yield
+    else:
+        yield
@@ -0,0 +1,84 @@
+"""
+协程（eventlet/gevent）Worker支持
+协程池下一个进程内有成百上千个协程，Django的数据库连接按协程隔离，不加限制时每个协程各占一个MySQL连接：
+- db_slot()：限制同时访问数据库的协程数（settings.GREEN_DB_CONCURRENCY），离开时关闭本协程的连接
+- DatabaseTask：访问数据库的任务基类，整个任务在db_slot()内执行
+- Worker启动时检测到协程池，关闭数据库持久连接（CONN_MAX_AGE=0），避免协程结束后遗留连接
+Redis连接池使用BlockingConnectionPool，并发数超过连接数时等待空闲连接而不是报错（见settings.CACHES）。
+非协程模式下以上逻辑都不生效。
+"""
+import threading
+from contextlib import contextmanager
+
+from celery import Task
+from celery.signals import worker_init
+from django.conf import settings
+from django.db import connections
+
+_local = threading.local()
+_db_semaphore = None
+_db_semaphore_lock = threading.Lock()
+
+
+def is_green():
+    """当前进程是否已被eventlet或gevent打补丁"""
+    try:
+        from eventlet import patcher
+        if patcher.is_monkey_patched("socket"):
+            return True
+    except ImportError:
+        pass
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched("socket"):
+            return True
+    except ImportError:
+        pass
+    return False
+
+
+def _get_db_semaphore():
+    # 打补丁之后才创建，保证信号量是协程级别的
+    global _db_semaphore
+    if _db_semaphore is None:
+        with _db_semaphore_lock:
+            if _db_semaphore is None:
+                _db_semaphore = threading.BoundedSemaphore(getattr(settings, "GREEN_DB_CONCURRENCY", 20))
+    return _db_semaphore
+
+
+@contextmanager
+def db_slot():
+    """
+    协程模式下限制同时访问数据库的协程数，离开时关闭本协程的数据库连接
+    同一协程内可以嵌套使用，只在最外层占用名额
+    """
+    if getattr(_local, "depth", 0) or not is_green():
+        yield
+        return
+
+    semaphore = _get_db_semaphore()
+    semaphore.acquire()
+    _local.depth = 1
+    try:
+        yield
+    finally:
+        _local.depth = 0
+        connections.close_all()
+        semaphore.release()
+
+
+class DatabaseTask(Task):
+    """访问数据库的任务基类：协程模式下限制数据库并发"""
+
+    def __call__(self, *args, **kwargs):
+        with db_slot():
+            return super().__call__(*args, **kwargs)
+
+
+@worker_init.connect
+def _disable_persistent_connections(**kwargs):
+    """协程池Worker不使用数据库持久连接"""
+    if is_green():
+        for database in settings.DATABASES.values():
+            database["CONN_MAX_AGE"] = 0
@@ -0,0 +1,80 @@
+class HdrHistogram:
+    """
+    HDR风格的延迟直方图（对数-线性分桶，3位有效数字）
+    - 记录整数值（压测中为微秒），相对误差不超过1/1024
+    - 内存占用与记录次数无关，多个直方图可以合并（多进程压测汇总）
+    """
+
+    SUB_BUCKET_BITS = 11
+    SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS  # 2048
+    SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1  # 1024
+
+    def __init__(self):
+        self.counts = {}  # 桶下标 -> 次数
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value):
+        if value < self.SUB_BUCKET_COUNT:
+            return value
+        shift = value.bit_length() - self.SUB_BUCKET_BITS
+        return self.SUB_BUCKET_COUNT + (shift - 1) * self.SUB_BUCKET_HALF + ((value >> shift) - self.SUB_BUCKET_HALF)
+
+    def _value_at(self, index):
+        """桶的代表值（桶区间中点）"""
+        if index < self.SUB_BUCKET_COUNT:
+            return index
+        shift = (index - self.SUB_BUCKET_COUNT) // self.SUB_BUCKET_HALF + 1
+        sub_bucket = (index - self.SUB_BUCKET_COUNT) % self.SUB_BUCKET_HALF + self.SUB_BUCKET_HALF
+        return (sub_bucket << shift) + (1 << (shift - 1))
+
+    def record(self, value):
+        """记录一个非负整数值"""
+        value = max(int(value), 0)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """合并另一个直方图"""
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """计算百分位值，如percentile(99.9)"""
+        if not self.total:
+            return 0
+        target = max(1, int(round(self.total * percent / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._value_at(index), self.max)
+        return self.max
+
+    def mean(self):
+        if not self.total:
+            return 0
+        return sum(self._value_at(index) * count for index, count in self.counts.items()) / self.total
+
+    def to_dict(self):
+        """序列化（用于跨进程传递）"""
+        return {"counts": self.counts, "total": self.total, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.total = data["total"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
@@ -0,0 +1,121 @@
+"""
+签名的用户身份
+用户标识不再取自请求头 X-Forwarded-For（客户端可以任意伪造、每次请求换一个），而是由服务端生成随机ID，
+写入签名Cookie（SECRET_KEY做HMAC签名，django.core.signing），客户端无法伪造或篡改：
+- GET/HEAD请求没有有效身份时签发新身份（首页、订单页、静态场次页请求的 /seckill/session/ 都会签发），
+  可被共享缓存的公共接口（库存轮询、监控指标）用 skip_identity 标记，不签发
+- POST请求不签发身份，没有有效身份的抢购请求直接拒绝，换身份需要先多走一次页面请求
+- 限流、限购、去重都按该身份计算，而不是按代理服务器的IP
+- 丢弃Cookie的客户端每次GET都能拿到新身份：同一客户端IP每分钟签发超过 SECKILL_IDENTITY_ISSUE_LIMIT 个身份后仍然签发
+  （运营商NAT、校园网和公司网关后的大量新用户不会被拒之门外），但身份带有挑战标记，抢购时总是需要完成工作量证明挑战；
+  抢购接口在身份限流之外还按客户端IP限流（见 get_client_ip）
+"""
+import uuid
+
+from django.conf import settings
+from django.core import signing
+
+from utils import keys
+from utils.redis_client import get_redis_client
+
+# 身份Cookie名称和签名盐值
+IDENTITY_COOKIE = "seckill_uid"
+IDENTITY_SALT = "seckill.identity"
+# 身份签发计数的窗口（秒）
+IDENTITY_ISSUE_WINDOW = 60
+# 带挑战标记的身份在Cookie中的后缀（签名覆盖后缀，客户端无法去掉）
+CHALLENGE_SUFFIX = ":pow"
+
+redis_client = get_redis_client()
+
+
+def sign_identity(user_id, challenge=False):
+    """
+    签名用户身份，返回Cookie值（与 HttpResponse.set_signed_cookie 的格式相同，压测工具用它模拟已登录用户）
+    :param challenge: 身份带挑战标记，抢购时总是需要完成工作量证明挑战
+    """
+    value = user_id + CHALLENGE_SUFFIX if challenge else user_id
+    return signing.get_cookie_signer(salt=IDENTITY_COOKIE + IDENTITY_SALT).sign(value)
+
+
+def read_identity(request):
+    """读取并校验身份Cookie，返回(用户ID, 是否带挑战标记)，无效或过期时用户ID为None"""
+    value = request.get_signed_cookie(IDENTITY_COOKIE, default=None, salt=IDENTITY_SALT,
+                                      max_age=settings.SECKILL_IDENTITY_MAX_AGE)
+    if value is None:
+        return None, False
+    if value.endswith(CHALLENGE_SUFFIX):
+        return value[:-len(CHALLENGE_SUFFIX)], True
+    return value, False
+
+
+def get_client_ip(request):
+    """
+    客户端IP：直连时为REMOTE_ADDR；请求来自受信任的反向代理（SECKILL_TRUSTED_PROXIES）时，
+    从X-Forwarded-For右侧向左取第一个不是受信任代理的地址（左侧的地址客户端可以任意伪造）
+    """
+    remote_addr = request.META.get("REMOTE_ADDR", "")
+    trusted = settings.SECKILL_TRUSTED_PROXIES
+    if remote_addr not in trusted:
+        return remote_addr
+    forwarded = [ip.strip() for ip in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if ip.strip()]
+    for ip in reversed(forwarded):
+        if ip not in trusted:
+            return ip
+    return remote_addr
+
+
+def within_issue_limit(client_ip):
+    """同一客户端IP在签发窗口内签发的身份数未超过上限（Redis不可用时按未超过处理，不影响页面访问）"""
+    key = keys.identity_issue_key(client_ip)
+    try:
+        with redis_client.pipeline() as pipe:
+            pipe.set(key, 0, ex=IDENTITY_ISSUE_WINDOW, nx=True)
+            pipe.incr(key)
+            count = pipe.execute()[-1]
+    except Exception:
+        return True
+    return count <= settings.SECKILL_IDENTITY_ISSUE_LIMIT
+
+
+def get_user_id(request):
+    """当前请求的用户标识（由UserIdentityMiddleware设置），没有身份时返回None"""
+    return getattr(request, "seckill_user", None)
+
+
+def requires_challenge(request):
+    """当前身份带挑战标记（签发时所在IP签发的身份过多）"""
+    return getattr(request, "seckill_challenge", False)
+
+
+def skip_identity(view_func):
+    """视图不签发身份（可被共享缓存的公共接口，响应中不能带有用户各自的Cookie）"""
+    view_func.skip_identity = True
+    return view_func
+
+
+class UserIdentityMiddleware:
+    """签名用户身份中间件：校验身份Cookie，GET请求没有身份时签发新身份（同一IP签发过多时签发带挑战标记的身份）"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.seckill_user, request.seckill_challenge = read_identity(request)
+        request.issued_identity = None
+
+        response = self.get_response(request)
+        if request.issued_identity:
+            response.set_cookie(IDENTITY_COOKIE, sign_identity(request.issued_identity, request.seckill_challenge),
+                                max_age=settings.SECKILL_IDENTITY_MAX_AGE, httponly=True, samesite="Lax")
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # 解析到视图后再决定是否签发，标记了skip_identity的视图不签发
+        if request.seckill_user is not None or request.method not in ("GET", "HEAD"):
+            return None
+        if getattr(view_func, "skip_identity", False):
+            return None
+        request.seckill_user = request.issued_identity = uuid.uuid4().hex
+        request.seckill_challenge = not within_issue_limit(get_client_ip(request))
+        return None
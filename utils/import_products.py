@@ -0,0 +1,269 @@
+"""
+商品批量导入：从商家提供的CSV或JSONL文件流式导入秒杀商品并分配场次
+- 逐行读取、校验，每 --batch-size 行写入一次：商品按商家商品编码（sku）批量插入或更新（bulk_create update_conflicts），
+  内存占用只与批大小有关，与文件大小无关
+- 场次按商品开始时间的场次编码（yyyymmddhhmm）分配，同一分钟开始的商品属于同一场次；不存在的场次批量创建，
+  商品结束时间晚于场次结束时间时延长场次（场次覆盖其中所有商品的秒杀时间）
+- 已开始或已结束的商品不再更新（避免覆盖秒杀中的库存），计入跳过数；
+  未开始的商品库存变化时删除Redis中已预热的库存键（还没有抢购，不会丢失实时库存），由随后的预热按新库存写入
+- 同一批写入后把商品ID加入布隆过滤器，并预热 --preheat-minutes 分钟内开始的商品缓存（与预热任务相同）
+- 结束时输出读取、导入、跳过、无效的行数和每秒行数
+
+文件字段（CSV表头或JSONL的键）：
+    sku, name, base_price, seckill_price, stock, start_time, end_time, limit_per_user(可选，默认1), image(可选)
+时间为ISO格式（如 2025-11-03 10:00:00），不带时区时按 TIME_ZONE 解释。
+
+    python utils/import_products.py products.csv --batch-size 1000
+    python utils/import_products.py products.jsonl --preheat-minutes 5
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+# 设置项目根目录到系统路径（替换脚本所在的utils目录，避免utils/alipay.py遮蔽支付宝SDK）
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[0] = BASE_DIR
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seckill_shop.settings')
+
+import django
+django.setup()
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from shop.models import SeckillProduct, SeckillSession
+from shop.tasks import warm_products
+from utils import keys
+from utils.bloom import BloomFilter
+from utils.current_slot import get_slot_code
+from utils.db_router import use_primary
+from utils.redis_client import get_redis_client
+
+# 商品默认图片
+DEFAULT_PRODUCT_IMAGE = '/product_img/扫地机器人.webp'
+# 导入时更新的字段（状态不更新，新商品默认为未开始）
+UPDATE_FIELDS = ['name', 'image', 'base_price', 'seckill_price', 'stock', 'total_stock', 'limit_per_user',
+                 'seckill_start_time', 'seckill_end_time', 'session']
+# 最多打印的无效行数
+MAX_ERROR_LINES = 20
+
+
+def read_rows(path, file_format):
+    """逐行读取文件，生成(行号, 字段字典)"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if file_format == 'csv':
+            # 表头为第1行，数据从第2行开始
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield line_no, json.loads(line)
+                    except ValueError:
+                        yield line_no, None  # 无效的JSON由校验计入无效行
+
+
+def parse_time(value):
+    value = datetime.fromisoformat(str(value).strip())
+    return value if timezone.is_aware(value) else timezone.make_aware(value)
+
+
+def parse_row(row):
+    """
+    校验并转换一行商品数据，数据无效时抛出ValueError
+    :return: 字段字典（场次在写入时分配）
+    """
+    if not isinstance(row, dict):
+        raise ValueError("不是有效的JSON对象")
+    sku = str(row.get('sku') or '').strip()
+    name = str(row.get('name') or '').strip()
+    if not sku or len(sku) > 64:
+        raise ValueError("sku为空或超过64个字符")
+    if not name or len(name) > 64:
+        raise ValueError("name为空或超过64个字符")
+    try:
+        base_price = Decimal(str(row['base_price']))
+        seckill_price = Decimal(str(row['seckill_price']))
+        # NaN、Infinity可以被Decimal解析，比较时才抛出InvalidOperation（不是ValueError）
+        if not (base_price.is_finite() and seckill_price.is_finite()):
+            raise InvalidOperation
+        base_price = base_price.quantize(Decimal('0.01'))
+        seckill_price = seckill_price.quantize(Decimal('0.01'))
+        stock = int(row['stock'])
+        limit_per_user = int(row.get('limit_per_user') or 1)
+        start_time = parse_time(row['start_time'])
+        end_time = parse_time(row['end_time'])
+    except KeyError as e:
+        raise ValueError(f"缺少字段{e}")
+    except InvalidOperation:
+        raise ValueError("价格格式错误")
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"字段格式错误: {e}")
+    if not Decimal('0') < seckill_price <= base_price < Decimal('100000000'):
+        raise ValueError("价格需满足 0 < 秒杀价 <= 原价")
+    if stock < 0 or not 1 <= limit_per_user <= 32767:
+        raise ValueError("库存不能为负数，限购数量需在1~32767之间")
+    if end_time <= start_time:
+        raise ValueError("结束时间需晚于开始时间")
+    return {
+        'sku': sku,
+        'name': name,
+        'image': str(row.get('image') or DEFAULT_PRODUCT_IMAGE)[:128],
+        'base_price': base_price,
+        'seckill_price': seckill_price,
+        'stock': stock,
+        'total_stock': stock,  # 批量写入不经过save，初始库存显式设置
+        'limit_per_user': limit_per_user,
+        'seckill_start_time': start_time,
+        'seckill_end_time': end_time,
+    }
+
+
+class ProductImporter:
+    """按批写入商品、分配场次、加入布隆过滤器并预热即将开始的商品"""
+
+    def __init__(self, preheat_minutes=5):
+        self.redis_client = get_redis_client()
+        self.bloom = BloomFilter(key=keys.BLOOM_PRODUCT_KEY)
+        self.preheat_minutes = preheat_minutes
+        # 场次编码 -> 场次ID、场次结束时间（场次数量与时段数相同，不随商品数增长）
+        self.sessions = {}
+        self.session_ends = {}
+        self.imported = 0
+        self.skipped = 0
+        self.preheated = 0
+
+    def assign_sessions(self, rows):
+        """按开始时间分配场次，缺少的场次批量创建，商品结束时间晚于场次结束时间时延长场次"""
+        ends = {}
+        starts = {}
+        for row in rows:
+            code = get_slot_code(row['seckill_start_time'])
+            row['slot'] = code
+            starts.setdefault(code, row['seckill_start_time'])
+            ends[code] = max(ends.get(code, row['seckill_end_time']), row['seckill_end_time'])
+
+        missing = [code for code in ends if code not in self.sessions]
+        if missing:
+            new_sessions = []
+            for code in missing:
+                start_time = timezone.localtime(starts[code]).replace(second=0, microsecond=0)
+                new_sessions.append(SeckillSession(code=code, name=f"{start_time:%H:%M}场", start_time=start_time,
+                                                   end_time=ends[code]))
+            # 已存在的场次（之前导入或后台创建）不会被覆盖，下面按结束时间延长
+            SeckillSession.objects.bulk_create(new_sessions, ignore_conflicts=True)
+            for code, session_id, end_time in SeckillSession.objects.filter(code__in=missing).values_list(
+                    'code', 'id', 'end_time'):
+                self.sessions[code] = session_id
+                self.session_ends[code] = end_time
+
+        for code, end_time in ends.items():
+            if end_time > self.session_ends[code]:
+                SeckillSession.objects.filter(id=self.sessions[code], end_time__lt=end_time).update(end_time=end_time)
+                self.session_ends[code] = end_time
+
+    def write_batch(self, rows):
+        # 同一批内重复的sku以最后一行为准（同一条语句不能两次更新同一行）
+        rows = list({row['sku']: row for row in rows}.values())
+        skus = [row['sku'] for row in rows]
+
+        with transaction.atomic():
+            existing = SeckillProduct.objects.select_for_update().filter(sku__in=skus).values_list(
+                'sku', 'id', 'status', 'stock')
+            # 已开始或已结束的商品不再更新
+            started = {sku for sku, _, status, _ in existing if status != 0}
+            # 未开始且库存变化的商品，Redis中预热的库存键需要按新库存重写（缓存回填脚本只在库存键不存在时写入）
+            new_stocks = {row['sku']: row['stock'] for row in rows}
+            restocked = [product_id for sku, product_id, status, stock in existing
+                         if status == 0 and stock != new_stocks[sku]]
+            rows = [row for row in rows if row['sku'] not in started]
+            self.skipped += len(started)
+
+            self.assign_sessions(rows)
+            # MySQL的 ON DUPLICATE KEY UPDATE 不能指定冲突字段（按任一唯一索引冲突），PostgreSQL/SQLite需要指定
+            SeckillProduct.objects.bulk_create(
+                [SeckillProduct(session_id=self.sessions[row.pop('slot')], **row) for row in rows],
+                update_conflicts=True,
+                unique_fields=['sku'] if connection.features.supports_update_conflicts_with_target else None,
+                update_fields=UPDATE_FIELDS,
+            )
+        self.imported += len(rows)
+        if restocked:
+            self.redis_client.delete(*[keys.stock_key(product_id) for product_id in restocked])
+
+        # 不是所有数据库都会在批量插入或更新后回填主键，按sku查询商品ID
+        imported_skus = [row['sku'] for row in rows]
+        self.bloom.batch_add(SeckillProduct.objects.filter(sku__in=imported_skus).values_list('id', flat=True))
+
+        # 预热即将开始的商品（与预热任务相同的缓存和场次集合）
+        now = timezone.now()
+        imminent = [row['sku'] for row in rows
+                    if row['seckill_start_time'] <= now + timedelta(minutes=self.preheat_minutes)]
+        if imminent:
+            products = list(SeckillProduct.objects.filter(sku__in=imminent, status=0).select_related('session'))
+            warm_products(self.redis_client, products, int(now.timestamp()))
+            self.preheated += len(products)
+
+
+def import_products(path, file_format, batch_size=1000, preheat_minutes=5):
+    """流式导入商品文件，返回统计结果"""
+    importer = ProductImporter(preheat_minutes)
+    read = invalid = 0
+    batch = []
+    started = time.perf_counter()
+
+    # 写入前先查询已有商品和场次，走主库
+    with use_primary():
+        for line_no, row in read_rows(path, file_format):
+            read += 1
+            try:
+                batch.append(parse_row(row))
+            except ValueError as e:
+                invalid += 1
+                if invalid <= MAX_ERROR_LINES:
+                    print(f"第{line_no}行无效: {e}")
+            if len(batch) >= batch_size:
+                importer.write_batch(batch)
+                batch = []
+                print(f"已处理{read}行，导入{importer.imported}个商品")
+        if batch:
+            importer.write_batch(batch)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": read,
+        "imported": importer.imported,
+        "skipped": importer.skipped,
+        "invalid": invalid,
+        "preheated": importer.preheated,
+        "sessions": len(importer.sessions),
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(read / elapsed, 1) if elapsed > 0 else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="从CSV/JSONL文件批量导入秒杀商品")
+    parser.add_argument("path", help="商品文件路径（.csv 或 .jsonl）")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="文件格式，默认按扩展名判断")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批写入的行数")
+    parser.add_argument("--preheat-minutes", type=int, default=5, help="预热该时间（分钟）内开始的商品")
+    args = parser.parse_args(argv)
+
+    file_format = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+    result = import_products(args.path, file_format, args.batch_size, args.preheat_minutes)
+    print(f"导入完成: 读取{result['rows']}行，导入{result['imported']}个商品，跳过{result['skipped']}个已开始的商品，"
+          f"无效{result['invalid']}行，预热{result['preheated']}个商品，涉及{result['sessions']}个场次")
+    print(f"耗时{result['seconds']}秒，{result['rows_per_sec']}行/秒")
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Redis键名
+Redis Cluster按键的哈希标签（第一对花括号内的内容）分配槽位，同一个Lua脚本或事务访问的键必须在同一个槽：
+- 商品相关的键都以商品ID作为哈希标签，如 seckill:product:{42}、seckill:stock:{42}、seckill:user_limit:{42}、seckill:outbox:{42}，
+  扣库存脚本（STOCK_DECR_SCRIPT）和商品缓存回填脚本（PRODUCT_CACHE_SCRIPT）访问的键落在同一个节点
+- 秒杀结果、排队准入状态按商品合并为哈希，去重窗口、请求压力计数，同样以商品ID打标签，不同商品的键分散到不同节点
+- 场次相关的键以场次编码作为哈希标签，场次商品集合、新鲜标记和重建锁可以在同一个管道中读取
+- 限流、身份签发计数、读主库标记、布隆过滤器、库存审计状态只访问单个键，不需要哈希标签
+
+所有模块通过这里的函数生成键名，不要在业务代码中手写键名。
+"""
+
+# 商品布隆过滤器
+BLOOM_PRODUCT_KEY = "seckill:bloom:product"
+# 库存审计的上一次观测值（字段为商品ID）
+STOCK_AUDIT_KEY = "seckill:stock_audit"
+# 近端缓存失效通知频道（发布订阅在集群内广播，与槽位无关）
+NEAR_CACHE_CHANNEL = "seckill:near_cache:invalidate"
+
+
+def product_key(product_id):
+    """商品信息哈希"""
+    return f"seckill:product:{{{product_id}}}"
+
+
+def stock_key(product_id):
+    """商品实时库存"""
+    return f"seckill:stock:{{{product_id}}}"
+
+
+def user_limit_key(product_id):
+    """用户已购数量哈希（字段为用户哈希，见utils/codec.py）"""
+    return f"seckill:user_limit:{{{product_id}}}"
+
+
+def order_stats_key(product_id):
+    """订单处理结果统计哈希"""
+    return f"seckill:order_stats:{{{product_id}}}"
+
+
+def results_key(product_id):
+    """秒杀结果哈希（字段为用户哈希，值为订单ID，供前端轮询）"""
+    return f"seckill:results:{{{product_id}}}"
+
+
+def outbox_key(product_id):
+    """订单消息发件箱（Stream，扣库存成功时写入，发布到消息代理后删除）"""
+    return f"seckill:outbox:{{{product_id}}}"
+
+
+def admission_key(product_id):
+    """排队准入状态哈希（已发放排队号、放行进度、更新时间）"""
+    return f"seckill:admission:{{{product_id}}}"
+
+
+def tickets_key(product_id):
+    """排队号哈希（字段为用户哈希，值为排队号）"""
+    return f"seckill:tickets:{{{product_id}}}"
+
+
+def dedup_key(product_id, user_hex):
+    """抢购请求去重窗口（用户哈希的十六进制）"""
+    return f"seckill:dedup:{{{product_id}}}:{user_hex}"
+
+
+def pressure_key(product_id):
+    """商品每秒请求数"""
+    return f"seckill:pressure:{{{product_id}}}"
+
+
+def slot_products_key(slot):
+    """场次商品ID集合"""
+    return f"seckill:slot:{{{slot}}}:products"
+
+
+def slot_fresh_key(slot):
+    """场次商品缓存的新鲜标记"""
+    return f"seckill:slot:{{{slot}}}:fresh"
+
+
+def slot_rebuild_lock_key(slot):
+    """场次商品缓存的重建锁"""
+    return f"seckill:slot:{{{slot}}}:rebuild_lock"
+
+
+def rate_limit_key(identifier, path):
+    """滑动窗口限流"""
+    return f"limit:{identifier}:{path}"
+
+
+def identity_issue_key(client_ip):
+    """客户端IP在当前窗口内签发的身份数"""
+    return f"seckill:identity_issue:{client_ip}"
+
+
+def db_pin_key(user_id):
+    """用户近期写入过订单，读请求走主库"""
+    return f"seckill:db_pin:{user_id}"
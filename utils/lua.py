@@ -1,26 +1,195 @@
-# Lua脚本：原子检查并扣减库存 (返回1=成功, 0=库存不足)
+# Lua脚本：原子检查限购并扣减库存，成功时写入秒杀结果和订单消息发件箱
+# (成功返回发件箱消息ID, 0=库存不足, 2=超出限购数量)
+# 五个键使用同一个商品哈希标签，集群模式下在同一个槽
 STOCK_DECR_SCRIPT = """
 local stock_key = KEYS[1]
 local product_key = KEYS[2]
 local user_limit_key = KEYS[3]
-local user_id = ARGV[1]
+local results_key = KEYS[4]
+local outbox_key = KEYS[5]
+local user_field = ARGV[1]
+local quantity = tonumber(ARGV[2])
+local default_limit = tonumber(ARGV[3])
+local order_id = ARGV[4]
+local expire_seconds = tonumber(ARGV[5])
+local message = ARGV[6]
 
--- 检查用户是否已购买
-if redis.call('sismember', user_limit_key, user_id) == 1 then
-    return 2  -- 2表示用户已购买
+-- 单人限购数量（商品缓存中未配置时使用默认值）
+local limit = tonumber(redis.call('hget', product_key, 'limit_per_user')) or default_limit
+
+-- 检查用户已购数量加上本次购买数量是否超出限购
+local bought = tonumber(redis.call('hget', user_limit_key, user_field)) or 0
+if bought + quantity > limit then
+    return 2  -- 2表示超出限购数量
 end
 
--- 检查库存
-local stock = redis.call('get', stock_key)
-if not stock or tonumber(stock) <= 0 then
+-- 检查库存是否足够本次购买数量
+local stock = tonumber(redis.call('get', stock_key))
+if not stock or stock < quantity then
     return 0  -- 0表示库存不足
 end
 
 -- 扣减库存
-redis.call('decr', stock_key)
--- 记录用户购买记录
-redis.call('sadd', user_limit_key, user_id)
+redis.call('decrby', stock_key, quantity)
+-- 累加用户已购数量
+redis.call('hincrby', user_limit_key, user_field, quantity)
 -- 更新商品缓存中的库存
-redis.call('hset', product_key, 'stock', tonumber(stock) - 1)
-return 1  -- 1表示扣减成功
+redis.call('hset', product_key, 'stock', stock - quantity)
+-- 写入秒杀结果（供前端轮询），整个哈希在最后一次写入后过期
+redis.call('hset', results_key, user_field, order_id)
+redis.call('expire', results_key, expire_seconds)
+-- 订单消息与扣减在同一个脚本中写入发件箱，消息代理不可用时由中继任务补发，库存不会丢失
+return redis.call('xadd', outbox_key, '*', 'message', message)
+"""
+
+# Lua脚本：回填商品缓存 (返回缓存中的实时库存)
+# 库存键已存在时保留实时库存，只有库存键不存在时才用数据库库存初始化，避免秒杀中途被覆盖导致超卖
+PRODUCT_CACHE_SCRIPT = """
+local product_key = KEYS[1]
+local stock_key = KEYS[2]
+local db_stock = ARGV[1]
+local expire_seconds = tonumber(ARGV[2])
+
+-- 库存键不存在时才写入数据库库存
+redis.call('set', stock_key, db_stock, 'NX')
+local stock = redis.call('get', stock_key)
+
+-- ARGV[3]起为商品字段的键值对（含初始库存），库存字段与实时库存保持一致
+redis.call('hset', product_key, 'stock', stock, unpack(ARGV, 3))
+
+redis.call('expire', product_key, expire_seconds)
+redis.call('expire', stock_key, expire_seconds)
+return tonumber(stock)
+"""
+
+# Lua脚本：归还库存并扣减用户已购数量 (返回归还后的库存，库存键已过期时返回-1且不归还)
+# 取消订单、订单创建失败时调用；库存键、商品哈希的库存字段、限购计数在同一个原子操作中更新
+RESTORE_STOCK_SCRIPT = """
+local stock_key = KEYS[1]
+local product_key = KEYS[2]
+local user_limit_key = KEYS[3]
+local user_field = ARGV[1]
+local quantity = tonumber(ARGV[2])
+
+-- 扣减用户已购数量，归零后移除
+if redis.call('hincrby', user_limit_key, user_field, -quantity) <= 0 then
+    redis.call('hdel', user_limit_key, user_field)
+end
+
+-- 库存键已过期（秒杀结束）时不再归还，避免写入没有过期时间的键
+if redis.call('exists', stock_key) == 0 then
+    return -1
+end
+local stock = redis.call('incrby', stock_key, quantity)
+redis.call('hset', product_key, 'stock', stock)
+return stock
+"""
+
+# Lua脚本：库存审计修复，比较并设置 (返回修复后的库存，-1=库存已变化未修复，-2=库存键不存在)
+# 只有实时库存仍等于审计时读到的值才修复，审计与修复之间有抢购或归还时放弃本次修复；按差值调整，保留键的过期时间
+STOCK_REPAIR_SCRIPT = """
+local stock_key = KEYS[1]
+local product_key = KEYS[2]
+local observed = tonumber(ARGV[1])
+local expected = tonumber(ARGV[2])
+
+local stock = tonumber(redis.call('get', stock_key))
+if not stock then
+    return -2
+end
+if stock ~= observed then
+    return -1
+end
+stock = redis.call('incrby', stock_key, expected - observed)
+redis.call('hset', product_key, 'stock', stock)
+return stock
+"""
+
+# Lua脚本：按变化量调整库存 (返回调整后的库存，-2=库存键不存在)
+# 后台补货时调用，与抢购并发时不覆盖已扣减的库存；商品哈希的库存字段同步为调整后的库存
+STOCK_ADJUST_SCRIPT = """
+local stock_key = KEYS[1]
+local product_key = KEYS[2]
+
+if redis.call('exists', stock_key) == 0 then
+    return -2
+end
+local stock = redis.call('incrby', stock_key, tonumber(ARGV[1]))
+redis.call('hset', product_key, 'stock', stock)
+return stock
+"""
+
+# Lua脚本：释放分布式锁 (只有锁的持有者才能删除锁，返回1=释放成功, 0=锁已不属于当前持有者)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Lua脚本：抢购排队准入 (返回{状态, 排队号, 放行进度}，状态 1=已发放排队号, 0=库存售罄, 2=排队人数已满)
+# 放行进度按令牌桶推进：每秒放行rate个排队号，空闲时最多累积burst个立即放行的名额
+# 排队号不大于放行进度时可以直接抢购，否则进入等候室；同一用户重复进入时返回原排队号
+ADMISSION_SCRIPT = """
+local admission_key = KEYS[1]
+local tickets_key = KEYS[2]
+local stock_key = KEYS[3]
+local user_field = ARGV[1]
+local now_ms = tonumber(ARGV[2])
+local rate = tonumber(ARGV[3])
+local burst = tonumber(ARGV[4])
+local factor = tonumber(ARGV[5])
+local expire_seconds = tonumber(ARGV[6])
+
+-- 库存售罄时直接拒绝
+local stock = tonumber(redis.call('get', stock_key)) or 0
+if stock <= 0 then
+    return {0, 0, '0'}
+end
+
+-- 推进放行进度（不超过已发放排队号 + burst）
+local state = redis.call('hmget', admission_key, 'issued', 'serving', 'updated_at')
+local issued = tonumber(state[1]) or 0
+local serving = tonumber(state[2]) or burst
+local updated_at = tonumber(state[3]) or now_ms
+serving = math.min(serving + math.max(now_ms - updated_at, 0) * rate / 1000, issued + burst)
+
+local ticket = tonumber(redis.call('hget', tickets_key, user_field))
+if not ticket then
+    -- 排队人数超过剩余库存的factor倍时拒绝，不再发放排队号
+    if issued - serving >= stock * factor then
+        return {2, 0, tostring(serving)}
+    end
+    issued = issued + 1
+    ticket = issued
+    redis.call('hset', tickets_key, user_field, ticket)
+    redis.call('expire', tickets_key, expire_seconds)
+end
+
+redis.call('hset', admission_key, 'issued', issued, 'serving', tostring(serving), 'updated_at', now_ms)
+redis.call('expire', admission_key, expire_seconds)
+return {1, ticket, tostring(serving)}
+"""
+
+# Lua脚本：抢购请求去重并统计请求压力 (返回{是否放行, 本秒请求数, 剩余库存})
+# 三个键使用同一个商品哈希标签，集群模式下在同一个槽
+GUARD_SCRIPT = """
+local dedup_key = KEYS[1]
+local pressure_key = KEYS[2]
+local stock_key = KEYS[3]
+local window_ms = tonumber(ARGV[1])
+
+-- 去重窗口内已有该用户对该商品的请求
+if not redis.call('set', dedup_key, 1, 'NX', 'PX', window_ms) then
+    return {0, 0, 0}
+end
+
+-- 按秒统计商品的请求数（固定1秒窗口）
+local count = redis.call('incr', pressure_key)
+if count == 1 then
+    redis.call('pexpire', pressure_key, 1000)
+end
+
+local stock = tonumber(redis.call('get', stock_key)) or 0
+return {1, count, stock}
 """
@@ -0,0 +1,248 @@
+"""
+秒杀链路的Prometheus指标
+- 抢购接口：各阶段耗时（限流、布隆过滤器、前置过滤、状态检查、排队准入、令牌签发、Lua扣库存、消息发布、页面渲染）和各结果的总耗时
+- Redis：每次抢购请求执行的命令数，以及按命令名统计的总次数（单机和集群客户端统计口径相同）
+- Celery：队列积压长度，任务排队耗时和执行耗时
+- 库存审计：发现的库存偏差次数（按位置和处理方式）
+
+热路径上不做任何标签查找：各阶段和结果的子指标在模块加载时预先绑定好。
+多进程部署（gunicorn多worker、Celery prefork）时设置环境变量 PROMETHEUS_MULTIPROC_DIR，
+Web进程和Celery Worker指向同一个目录，/metrics 汇总所有进程的指标。
+"""
+import os
+import threading
+import time
+from functools import wraps
+
+import redis
+from redis.cluster import ClusterPipeline, RedisCluster
+from redis.exceptions import RedisClusterException
+from celery.signals import before_task_publish, task_prerun, task_postrun
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                               generate_latest, multiprocess)
+
+from utils.tracing import current_trace
+
+# 抢购接口的阶段（按执行顺序）
+BUY_STAGES = ("rate_limit", "bloom", "guard", "status", "admission", "token", "lua", "publish", "render")
+# 抢购请求的结果
+BUY_OUTCOMES = ("success", "queued", "rejected", "duplicate", "challenged", "sold_out", "over_limit", "rate_limited",
+                "not_found", "not_started", "bad_request", "error")
+
+# 秒杀接口耗时集中在毫秒级，分桶加密到亚毫秒
+LATENCY_BUCKETS = (.0005, .001, .0025, .005, .0075, .01, .025, .05, .075, .1, .25, .5, 1, 2.5, 5)
+
+BUY_STAGE_SECONDS = Histogram("seckill_buy_stage_seconds", "抢购接口各阶段耗时", ["stage"], buckets=LATENCY_BUCKETS)
+BUY_OUTCOME_SECONDS = Histogram("seckill_buy_seconds", "抢购接口总耗时（按结果）", ["outcome"],
+                                buckets=LATENCY_BUCKETS)
+BUY_REDIS_COMMANDS = Histogram("seckill_buy_redis_commands", "每次抢购请求执行的Redis命令数",
+                               buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50))
+REDIS_COMMANDS_TOTAL = Counter("seckill_redis_commands_total", "Redis命令执行次数", ["command"])
+# 抓取指标时查询队列积压长度的连接超时（秒）
+QUEUE_DEPTH_CONNECT_TIMEOUT = 1
+CELERY_QUEUE_DEPTH = Gauge("seckill_celery_queue_depth", "Celery队列积压的消息数", ["queue"],
+                           multiprocess_mode="mostrecent")
+CELERY_TASK_QUEUE_SECONDS = Histogram("seckill_celery_task_queue_seconds", "任务从发布到开始执行的耗时", ["task"],
+                                      buckets=LATENCY_BUCKETS)
+CELERY_TASK_RUN_SECONDS = Histogram("seckill_celery_task_run_seconds", "任务执行耗时", ["task", "state"],
+                                    buckets=LATENCY_BUCKETS)
+STOCK_DRIFT_TOTAL = Counter("seckill_stock_drift_total", "库存审计发现的偏差次数", ["source", "action"])
+
+# 预先绑定的子指标，热路径直接取用
+BUY_STAGE = {stage: BUY_STAGE_SECONDS.labels(stage) for stage in BUY_STAGES}
+BUY_OUTCOME = {outcome: BUY_OUTCOME_SECONDS.labels(outcome) for outcome in BUY_OUTCOMES}
+_redis_command_counters = {}
+
+_local = threading.local()
+
+
+def _count_redis_commands(command_names):
+    """累加当前请求的Redis命令数，并按命令名计数"""
+    _local.redis_commands = getattr(_local, "redis_commands", 0) + len(command_names)
+    for name in command_names:
+        counter = _redis_command_counters.get(name)
+        if counter is None:
+            counter = _redis_command_counters.setdefault(name, REDIS_COMMANDS_TOTAL.labels(name))
+        counter.inc()
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        _count_redis_commands([str(args[0]).upper() for args, _ in self.command_stack])
+        trace = current_trace()
+        if trace is None:
+            return super().execute(raise_on_error)
+        count = len(self.command_stack)
+        started = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            trace.record_pipeline(count, time.perf_counter() - started)
+
+
+class InstrumentedRedis(redis.Redis):
+    """统计命令数的Redis客户端（通过django-redis的REDIS_CLIENT_CLASS配置），请求追踪开启时同时记录耗时"""
+
+    def execute_command(self, *args, **options):
+        _count_redis_commands((str(args[0]).upper(),))
+        trace = current_trace()
+        if trace is None:
+            return super().execute_command(*args, **options)
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            trace.record_redis(args, time.perf_counter() - started)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class InstrumentedClusterPipeline(ClusterPipeline):
+    """集群管道的命令分散在各节点执行，入队时记录命令名，执行时统一计数"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._queued_commands = []
+
+    def execute_command(self, *args, **kwargs):
+        self._queued_commands.append(str(args[0]).upper())
+        return super().execute_command(*args, **kwargs)
+
+    def reset(self):
+        self._queued_commands = []
+        super().reset()
+
+    def execute(self, raise_on_error=True):
+        command_names, self._queued_commands = self._queued_commands, []
+        _count_redis_commands(command_names)
+        trace = current_trace()
+        if trace is None:
+            return super().execute(raise_on_error)
+        started = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            trace.record_pipeline(len(command_names), time.perf_counter() - started)
+
+
+class InstrumentedRedisCluster(RedisCluster):
+    """统计命令数的Redis Cluster客户端（settings.REDIS_CLUSTER），与InstrumentedRedis统计口径相同"""
+
+    def execute_command(self, *args, **kwargs):
+        _count_redis_commands((str(args[0]).upper(),))
+        trace = current_trace()
+        if trace is None:
+            return super().execute_command(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **kwargs)
+        finally:
+            trace.record_redis(args, time.perf_counter() - started)
+
+    def pipeline(self, transaction=None, shard_hint=None):
+        if shard_hint:
+            raise RedisClusterException("shard_hint is deprecated in cluster mode")
+        return InstrumentedClusterPipeline(
+            nodes_manager=self.nodes_manager,
+            commands_parser=self.commands_parser,
+            startup_nodes=self.nodes_manager.startup_nodes,
+            result_callbacks=self.result_callbacks,
+            cluster_response_callbacks=self.cluster_response_callbacks,
+            read_from_replicas=self.read_from_replicas,
+            load_balancing_strategy=self.load_balancing_strategy,
+            reinitialize_steps=self.reinitialize_steps,
+            retry=self.retry,
+            lock=self._lock,
+            transaction=transaction,
+        )
+
+
+def buy_metrics(view_func):
+    """
+    抢购接口的指标装饰器（放在限流装饰器外层）
+    视图内通过 mark_stage / mark_outcome 记录阶段耗时和结果，未标记结果时按响应状态码推断
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        started = time.perf_counter()
+        _local.stage_started = started
+        _local.outcome = None
+        _local.redis_commands = 0
+
+        response = view_func(request, *args, **kwargs)
+
+        now = time.perf_counter()
+        outcome = _local.outcome
+        if outcome is None:
+            outcome = "rate_limited" if response.status_code == 429 else "error"
+        else:
+            BUY_STAGE["render"].observe(now - _local.stage_started)
+        BUY_OUTCOME[outcome].observe(now - started)
+        BUY_REDIS_COMMANDS.observe(_local.redis_commands)
+        return response
+    return wrapper
+
+
+def mark_stage(stage):
+    """记录从上一阶段结束到现在的耗时，归入stage阶段"""
+    now = time.perf_counter()
+    BUY_STAGE[stage].observe(now - _local.stage_started)
+    _local.stage_started = now
+
+
+def mark_outcome(outcome):
+    """记录本次抢购请求的结果"""
+    _local.outcome = outcome
+
+
+def update_queue_depth():
+    """
+    查询Celery队列积压长度（抓取指标时调用）
+    只尝试连接一次且连接超时很短：消息代理不可用时抓取不会被重连阻塞（默认连接超时和重试会超过Prometheus的抓取超时）
+    """
+    from seckill_shop.celery import app
+
+    try:
+        with app.connection_for_read(connect_timeout=QUEUE_DEPTH_CONNECT_TIMEOUT) as conn:
+            conn.ensure_connection(max_retries=0)  # 只尝试一次，不按 broker_connection_max_retries 重试
+            channel = conn.channel()
+            for queue in app.conf.task_queues:
+                _, message_count, _ = channel.queue_declare(queue=queue.name, passive=True)
+                CELERY_QUEUE_DEPTH.labels(queue.name).set(message_count)
+    except Exception:
+        # 消息队列不可用时保留上一次的值，不影响其他指标的输出
+        pass
+
+
+def export_metrics():
+    """生成Prometheus文本格式的指标，返回(内容, Content-Type)"""
+    update_queue_depth()
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+@before_task_publish.connect
+def _stamp_publish_time(headers=None, **kwargs):
+    """发布任务时记录发布时间，用于统计排队耗时"""
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+
+
+@task_prerun.connect
+def _task_started(task=None, **kwargs):
+    task.request.metrics_started = time.perf_counter()
+    published_at = getattr(task.request, "published_at", None)
+    if published_at:
+        CELERY_TASK_QUEUE_SECONDS.labels(task.name).observe(max(time.time() - published_at, 0))
+
+
+@task_postrun.connect
+def _task_finished(task=None, state=None, **kwargs):
+    started = getattr(task.request, "metrics_started", None)
+    if started is not None:
+        CELERY_TASK_RUN_SECONDS.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - started)
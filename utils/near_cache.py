@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+
+
+class NearCache:
+    """
+    热点Key探测 + 进程内近端缓存
+    - 按采样率统计Key访问次数，一个统计窗口内访问次数超过阈值的Key被提升为热点Key
+    - 热点Key的哈希数据缓存在进程内存中，短TTL过期
+    - 通过Redis发布订阅接收失效通知，数据变更时立即从所有进程中剔除
+    """
+
+    def __init__(self, redis_client, channel, sample_every=10, threshold=200, window=1.0, ttl=1.0, max_keys=1024):
+        self.redis_client = redis_client
+        self.channel = channel  # 失效通知频道
+        self.sample_every = sample_every  # 每N次访问采样一次
+        self.threshold = threshold  # 统计窗口内（估算）访问次数达到该值即为热点Key
+        self.window = window  # 统计窗口（秒）
+        self.ttl = ttl  # 近端缓存过期时间（秒）
+        self.max_keys = max_keys  # 近端缓存最多保存的Key数量
+
+        self._cache = {}  # key -> (过期时间, 数据)
+        self._hot_keys = set()  # 当前热点Key
+        self._samples = {}  # 当前窗口内的采样计数
+        self._access_count = 0
+        self._window_start = time.monotonic()
+        self._stats = {}  # key -> [命中次数, 未命中次数]
+        self._lock = threading.Lock()
+        self._listener_pid = None
+
+    def hgetall(self, key):
+        """读取哈希，热点Key优先从近端缓存读取"""
+        value = self._lookup(key)
+        if value is None:
+            value = self.redis_client.hgetall(key)
+            self._store(key, value)
+        return value
+
+    def hgetall_many(self, keys):
+        """批量读取哈希，返回与keys对应的数据列表：热点Key从近端缓存读取，其余Key在一个管道中读取"""
+        values = [self._lookup(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                for i in missing:
+                    pipe.hgetall(keys[i])
+                for i, value in zip(missing, pipe.execute()):
+                    values[i] = value
+                    self._store(keys[i], value)
+        return values
+
+    def hmget(self, key, *fields):
+        """
+        读取哈希的部分字段，返回与fields对应的值列表
+        热点Key从近端缓存的完整哈希中取字段（缓存过期时回源读取完整哈希），其他Key只读取需要的字段
+        """
+        value = self._lookup(key)
+        if value is None and key in self._hot_keys:
+            value = self.redis_client.hgetall(key)
+            self._store(key, value)
+        if value is None:
+            return self.redis_client.hmget(key, *fields)
+        return [value.get(field.encode()) for field in fields]
+
+    def _lookup(self, key):
+        """近端缓存中未过期的数据，未命中时采样记录访问并返回None"""
+        self._ensure_listener()
+        now = time.monotonic()
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats.setdefault(key, [0, 0])
+
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > now:
+            stats[0] += 1
+            return entry[1]
+
+        stats[1] += 1
+        self._sample(key, now)
+        return None
+
+    def _store(self, key, value):
+        """热点Key的数据写入近端缓存"""
+        if key in self._hot_keys and value and len(self._cache) < self.max_keys:
+            self._cache[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key):
+        """从本进程近端缓存中剔除Key"""
+        self._cache.pop(key, None)
+
+    def publish_invalidation(self, *keys, client=None):
+        """通知所有进程剔除Key（client可传入管道，随管道一起发送）"""
+        client = client or self.redis_client
+        for key in keys:
+            client.publish(self.channel, key)
+
+    def stats(self):
+        """各Key的近端缓存命中情况"""
+        result = {}
+        for key, (hits, misses) in list(self._stats.items()):
+            total = hits + misses
+            result[key] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / total, 4) if total else 0,
+                "hot": key in self._hot_keys,
+            }
+        return result
+
+    def _sample(self, key, now):
+        """采样记录访问，窗口结束时重新计算热点Key"""
+        self._access_count += 1
+        if self._access_count % self.sample_every:
+            return
+        self._samples[key] = self._samples.get(key, 0) + 1
+
+        if now - self._window_start < self.window:
+            return
+        with self._lock:
+            if now - self._window_start < self.window:
+                return
+            samples, self._samples = self._samples, {}
+            self._window_start = now
+            min_samples = self.threshold / self.sample_every
+            hot_keys = {k for k, count in samples.items() if count >= min_samples}
+            # 不再是热点的Key从近端缓存中移除
+            for k in self._hot_keys - hot_keys:
+                self._cache.pop(k, None)
+            self._hot_keys = hot_keys
+
+    def _ensure_listener(self):
+        """启动失效通知监听线程（每个进程一个，fork之后的子进程会重新启动）"""
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._cache.clear()
+            threading.Thread(target=self._listen, name="near-cache-invalidation", daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    key = message["data"]
+                    self._cache.pop(key.decode() if isinstance(key, bytes) else key, None)
+            except Exception:
+                # 连接断开期间可能丢失失效通知，清空近端缓存后重连
+                self._cache.clear()
+                time.sleep(1)
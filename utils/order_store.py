@@ -0,0 +1,75 @@
+"""
+订单冷热分层存储
+- 热表 seckill_orders：新订单写入，待支付订单的支付、取消、超时检查都只访问热表；
+  热表只保留近期订单和未结算订单，写入和按用户查询的耗时不随历史订单增长
+- 归档表 seckill_orders_archive：archive_settled_orders 任务把已结算（已支付、已取消、已完成）
+  且超过 SECKILL_ORDER_ARCHIVE_DAYS 天的订单分批移入，归档后只读
+- 订单ID由雪花算法生成、按时间递增，归档按主键范围扫描，热表不需要创建时间索引；
+  按订单ID查询时根据ID中的时间判断是否可能已归档，近期订单只查热表
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from shop.models import SeckillOrder, SeckillOrderArchive, SeckillProduct
+from utils.snow_flake import Snowflake
+
+# 已结算的订单状态（已支付、已取消、已完成），待支付订单不归档
+SETTLED_ORDER_STATUSES = (1, 2, 3)
+# 每批归档的订单数（每批一个短事务）
+ORDER_ARCHIVE_BATCH_SIZE = 1000
+# 复制到归档表的字段
+ORDER_FIELDS = [field.attname for field in SeckillOrder._meta.concrete_fields]
+
+
+def archive_cutoff_id(now=None):
+    """归档分界：ID小于该值的订单创建于 SECKILL_ORDER_ARCHIVE_DAYS 天之前"""
+    cutoff = (now or timezone.now()) - timedelta(days=settings.SECKILL_ORDER_ARCHIVE_DAYS)
+    return Snowflake().min_id_at(int(cutoff.timestamp() * 1000))
+
+
+def archive_batch(cutoff_id, batch_size=ORDER_ARCHIVE_BATCH_SIZE):
+    """
+    把一批已结算的旧订单移入归档表，调用方负责读主库
+    复制和删除在同一个事务中，并锁定这批订单，归档期间订单状态不会变化；
+    进行中商品的订单暂不归档（库存审计按热表中的有效订单计算应有库存）
+    :return: 本批归档的订单数
+    """
+    with transaction.atomic():
+        rows = list(SeckillOrder.objects.select_for_update().filter(
+            id__lt=cutoff_id,
+            status__in=SETTLED_ORDER_STATUSES
+        ).exclude(
+            goods_id__in=SeckillProduct.objects.filter(status=1).values('id')
+        ).order_by('id').values(*ORDER_FIELDS)[:batch_size])
+        if not rows:
+            return 0
+        SeckillOrderArchive.objects.bulk_create([SeckillOrderArchive(**row) for row in rows])
+        SeckillOrder.objects.filter(id__in=[row['id'] for row in rows]).delete()
+    return len(rows)
+
+
+def list_user_orders(user_id):
+    """用户的全部订单（热表和归档表各一次索引查询），按创建时间倒序"""
+    orders = list(SeckillOrder.objects.filter(user_id=user_id).order_by('-create_time'))
+    orders += SeckillOrderArchive.objects.filter(user_id=user_id).order_by('-create_time')
+    orders.sort(key=lambda order: order.create_time, reverse=True)
+    return orders
+
+
+def get_order(order_id, **filters):
+    """
+    按订单ID查询订单：先查热表，ID早于归档分界时再查归档表
+    订单不存在时抛出 SeckillOrder.DoesNotExist
+    """
+    try:
+        return SeckillOrder.objects.get(id=order_id, **filters)
+    except SeckillOrder.DoesNotExist:
+        if int(order_id) >= archive_cutoff_id():
+            raise
+    try:
+        return SeckillOrderArchive.objects.get(id=order_id, **filters)
+    except SeckillOrderArchive.DoesNotExist:
+        raise SeckillOrder.DoesNotExist(f"订单不存在: {order_id}")
@@ -0,0 +1,45 @@
+"""
+订单消息发件箱
+扣库存脚本（STOCK_DECR_SCRIPT）在扣减成功时把订单消息写入该商品的发件箱Stream（seckill:outbox:{商品ID}），
+与扣减库存、记录限购在同一个原子操作中：
+- 抢购接口随后直接发布消息到RabbitMQ，发布成功后删除发件箱中的消息
+- 消息代理不可用时发布失败，消息留在发件箱中，用户仍然抢购成功；
+  中继任务（shop.tasks.relay_order_outbox）定时把超过 RELAY_MIN_AGE_MS 仍未删除的消息补发到消息代理
+- 同一条消息可能被发布两次（发布成功但删除失败、中继与抢购接口同时发布），订单创建按订单主键幂等
+"""
+import json
+import time
+
+# 发件箱消息超过该时间（毫秒）仍未删除时由中继补发，避免与抢购接口正在进行的发布重复
+RELAY_MIN_AGE_MS = 5000
+# 中继每个商品每次最多补发的消息数
+RELAY_BATCH_SIZE = 500
+
+
+def encode_message(message):
+    """订单消息编码为紧凑JSON，作为扣库存脚本的参数写入发件箱"""
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+def pending_messages(redis_client, outbox_key, min_age_ms=RELAY_MIN_AGE_MS, count=RELAY_BATCH_SIZE):
+    """
+    读取发件箱中等待补发的消息（Stream消息ID的前半部分为写入时间的毫秒数）
+    :return: [(消息ID, 订单消息)]
+    """
+    max_id = int(time.time() * 1000) - min_age_ms
+    entries = redis_client.xrange(outbox_key, "-", max_id, count=count)
+    return [(entry_id, json.loads(fields[b"message"])) for entry_id, fields in entries]
+
+
+def relay(redis_client, outbox_key, publish, min_age_ms=RELAY_MIN_AGE_MS):
+    """
+    把发件箱中等待补发的消息逐条发布并删除，发布失败时停止（消息代理仍不可用，留待下次中继）
+    :param publish: 发布函数，参数为订单消息
+    :return: 补发的消息数
+    """
+    relayed = 0
+    for entry_id, message in pending_messages(redis_client, outbox_key, min_age_ms):
+        publish(message)
+        redis_client.xdel(outbox_key, entry_id)
+        relayed += 1
+    return relayed
@@ -0,0 +1,43 @@
+"""
+商品快照
+商品名称、秒杀价等字段在秒杀期间不变，抢购接口不必每次读取完整的商品哈希：
+- 缓存回填时商品哈希写入快照版本 version（快照字段的哈希，见 codec.snapshot_version）
+- 抢购接口只读取商品哈希的 status 和 version 两个字段，按(商品ID, 版本)从进程内快照缓存取商品名称和秒杀价，
+  版本变化或未缓存时读取一次完整哈希
+- 快照随订单消息发送，订单创建直接使用，不再查询商品表
+"""
+from utils import keys
+from utils.codec import from_cents
+
+
+class ProductSnapshots:
+    """进程内商品快照缓存：商品ID -> (版本, 快照)，每个商品只保留最新读取到的版本"""
+
+    def __init__(self, redis_client, max_products=4096):
+        self.redis_client = redis_client
+        self.max_products = max_products  # 超过后清空重新加载（商品数量通常远小于该值）
+        self._snapshots = {}
+
+    def get(self, product_id, version):
+        """
+        读取商品快照，版本与缓存一致时不访问Redis
+        :param version: 商品哈希中的快照版本（HMGET的结果，缓存回填前的旧数据没有版本时为None）
+        :return: {"id", "name", "seckill_price"}，商品缓存不存在时返回None
+        """
+        entry = self._snapshots.get(product_id)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        product_data = self.redis_client.hgetall(keys.product_key(product_id))
+        if not product_data:
+            return None
+        snapshot = {
+            "id": product_id,
+            "name": product_data[b"name"].decode(),
+            "seckill_price": float(from_cents(product_data[b"price_cents"])),
+        }
+        if len(self._snapshots) >= self.max_products:
+            self._snapshots.clear()
+        # 以完整哈希中的版本为准（读取期间商品可能刚刚回填）
+        self._snapshots[product_id] = (product_data.get(b"version"), snapshot)
+        return snapshot
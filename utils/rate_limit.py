@@ -1,24 +1,31 @@
 from functools import wraps
 import time
-import django_redis
+from utils.identity import get_client_ip, get_user_id
+from utils.keys import rate_limit_key
+from utils.redis_client import get_redis_client
 from django.http import HttpResponse
 
-redis_client = django_redis.get_redis_connection("default")
+redis_client = get_redis_client()
 
 
-def sliding_window_limit(threshold):
+def sliding_window_limit(threshold, ip_threshold=None):
     """
     滑动窗口限流装饰器
     将1秒拆分为10个100ms小窗口，使用ZSet记录请求时间戳
     :param threshold: 1秒内最大允许的请求数
+    :param ip_threshold: 同一客户端IP 1秒内最大允许的请求数（None为不按IP限流），
+                         丢弃Cookie不断更换身份的客户端仍受该限制
     """
 
     def decorator(view_func):
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            # 生成限流键
-            user_identifier = request.META.get('REMOTE_ADDR')  # 使用IP地址作为标识
-            key = f"limit:{user_identifier}:{request.path}"
+            # 生成限流键：按签名的用户身份限流，没有身份时（如未经过身份中间件）使用IP地址
+            client_ip = get_client_ip(request)
+            user_identifier = get_user_id(request) or client_ip
+            limits = [(rate_limit_key(user_identifier, request.path), threshold)]
+            if ip_threshold is not None:
+                limits.append((rate_limit_key(f"ip:{client_ip}", request.path), ip_threshold))
 
             # 当前时间戳（毫秒）
             current_ts = int(time.time() * 1000)
@@ -28,21 +35,22 @@ def sliding_window_limit(threshold):
             try:
                 # 使用Redis管道确保操作原子性
                 with redis_client.pipeline() as pipe:
-                    # 添加当前请求时间戳到ZSet
-                    pipe.zadd(key, {current_ts: current_ts})
-                    # 移除窗口之外的记录（1秒前的）
-                    pipe.zremrangebyscore(key, 0, window_start_ts)
-                    # 设置键过期时间，避免内存泄漏
-                    pipe.expire(key, 3)  # 过期时间设为3秒足够覆盖窗口
-                    # 统计当前窗口内的请求数
-                    pipe.zcard(key)
+                    for key, _ in limits:
+                        # 添加当前请求时间戳到ZSet
+                        pipe.zadd(key, {current_ts: current_ts})
+                        # 移除窗口之外的记录（1秒前的）
+                        pipe.zremrangebyscore(key, 0, window_start_ts)
+                        # 设置键过期时间，避免内存泄漏
+                        pipe.expire(key, 3)  # 过期时间设为3秒足够覆盖窗口
+                        # 统计当前窗口内的请求数
+                        pipe.zcard(key)
 
                     # 执行所有命令
                     results = pipe.execute()
-                    current_count = results[-1]  # 获取zcard的结果
+                    current_counts = results[3::4]  # 每个限流键的zcard结果
 
-                # 检查是否超过阈值
-                if current_count > threshold:
+                # 检查是否超过阈值（按身份或按IP任一超限即拒绝）
+                if any(count > limit for count, (_, limit) in zip(current_counts, limits)):
                     return HttpResponse("请求过于频繁，3秒后再试", status=429)
 
             except Exception as e:
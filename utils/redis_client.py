@@ -0,0 +1,46 @@
+import threading
+
+import django_redis
+from django.conf import settings
+from redis.cluster import ClusterNode
+
+from utils.keys import NEAR_CACHE_CHANNEL
+from utils.metrics import InstrumentedRedisCluster
+from utils.near_cache import NearCache
+
+_cluster_client = None
+_cluster_client_lock = threading.Lock()
+
+
+def _get_cluster_client():
+    """Redis Cluster客户端（进程内单例，内部按节点维护连接池）"""
+    global _cluster_client
+    if _cluster_client is None:
+        with _cluster_client_lock:
+            if _cluster_client is None:
+                options = settings.REDIS_CLUSTER
+                startup_nodes = [ClusterNode(*node.rsplit(":", 1)) for node in options["NODES"]]
+                _cluster_client = InstrumentedRedisCluster(startup_nodes=startup_nodes,
+                                                           **options.get("OPTIONS", {}))
+    return _cluster_client
+
+
+def get_redis_client():
+    """
+    获取Redis客户端（views、tasks及各工具模块统一使用的入口）
+    配置了 settings.REDIS_CLUSTER 时返回集群客户端，否则返回django-redis的单机连接
+    """
+    if getattr(settings, "REDIS_CLUSTER", None):
+        return _get_cluster_client()
+    return django_redis.get_redis_connection("default")
+
+
+# 商品哈希近端缓存：热点商品的seckill:product:{id}在进程内缓存1秒，变更时通过发布订阅失效
+product_cache = NearCache(
+    get_redis_client(),
+    channel=NEAR_CACHE_CHANNEL,
+    sample_every=10,
+    threshold=200,
+    window=1.0,
+    ttl=1.0,
+)
@@ -0,0 +1,21 @@
+import uuid
+from utils.redis_client import get_redis_client
+from utils.lua import RELEASE_LOCK_SCRIPT
+
+
+class RedisLock:
+    """基于SET NX PX的分布式锁，释放时校验持有者令牌，防止误删其他进程的锁"""
+
+    def __init__(self, key, timeout_ms=5000):
+        self.key = key
+        self.timeout_ms = timeout_ms  # 锁自动过期时间（毫秒），防止持有者崩溃后死锁
+        self.token = uuid.uuid4().hex  # 持有者令牌
+        self.redis_client = get_redis_client()
+
+    def acquire(self):
+        """尝试获取锁（不阻塞），获取成功返回True"""
+        return bool(self.redis_client.set(self.key, self.token, nx=True, px=self.timeout_ms))
+
+    def release(self):
+        """释放锁"""
+        self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, self.key, self.token)
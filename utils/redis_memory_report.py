@@ -0,0 +1,169 @@
+"""
+秒杀数据的Redis内存测算：旧布局 vs 紧凑布局
+按N个抢购成功的用户、P个商品分别写入两种布局，统计Key数量和内存：
+- legacy：商品哈希存字符串价格和ISO时间；限购计数字段为完整用户ID；每个令牌、每个结果各一个带TTL的JSON键
+- compact：商品哈希存整数分和Unix秒（utils/codec.py）；限购计数字段为8字节用户哈希；
+  结果按商品合并为哈希（seckill:results:{商品ID}）；令牌为无状态签名令牌（utils/seckill_token.py），不占Redis
+
+内存统计方式同 utils/result_backend_bench.py（真实Redis用 MEMORY USAGE，fakeredis统计键值字节数）。
+    python utils/redis_memory_report.py --buyers 1000000 --products 20
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+# 设置项目根目录到系统路径（替换脚本所在的utils目录，避免utils/alipay.py遮蔽支付宝SDK）
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[0] = BASE_DIR
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seckill_shop.settings_bench')
+
+import django
+django.setup()
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+from redis.exceptions import ResponseError
+
+from shop.models import SeckillProduct
+from utils import keys
+from utils.codec import encode_product, user_field
+from utils.redis_client import get_redis_client
+from utils.result_backend_bench import measure_memory
+from utils.snow_flake import Snowflake
+
+# 每批写入的用户数
+BATCH_SIZE = 5000
+
+
+def build_products(count):
+    now = timezone.now()
+    return [SeckillProduct(id=i + 1, name=f"秒杀商品{i + 1}", base_price=Decimal("399.00"),
+                           seckill_price=Decimal("309.00"), stock=100000, limit_per_user=1, status=1,
+                           seckill_start_time=now, seckill_end_time=now + timedelta(hours=1))
+            for i in range(count)]
+
+
+def build_buyers(count, product_count):
+    """生成(用户ID, 商品ID, 订单ID, 令牌)"""
+    snowflake = Snowflake()
+    random.seed(0)
+    buyers = []
+    for i in range(count):
+        user_id = f"{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+        product_id = i % product_count + 1
+        token = hashlib.md5(f"{user_id}:{product_id}:{i}".encode()).hexdigest()
+        buyers.append((user_id, product_id, snowflake.generate_id(), token))
+    return buyers
+
+
+def write_legacy(redis_client, products, buyers):
+    for product in products:
+        redis_client.hset(f"seckill:product:{product.id}", mapping={
+            "id": product.id,
+            "name": product.name,
+            "seckill_price": str(product.seckill_price),
+            "base_price": str(product.base_price),
+            "stock": product.stock,
+            "total_stock": product.stock,
+            "status": product.status,
+            "limit_per_user": product.limit_per_user,
+            "seckill_start_time": product.seckill_start_time.isoformat(),
+            "seckill_end_time": product.seckill_end_time.isoformat(),
+        })
+        redis_client.set(f"seckill:stock:{product.id}", product.stock)
+    timestamp = int(time.time() * 1000)
+    for start in range(0, len(buyers), BATCH_SIZE):
+        with redis_client.pipeline(transaction=False) as pipe:
+            for user_id, product_id, order_id, token in buyers[start:start + BATCH_SIZE]:
+                pipe.hincrby(f"seckill:user_limit:{product_id}", user_id, 1)
+                pipe.setex(f"seckill:token:{token}", 300, json.dumps(
+                    {"user_id": user_id, "product_id": product_id, "timestamp": timestamp}))
+                pipe.setex(f"seckill:result:{user_id}:{product_id}", 300, json.dumps(
+                    {"success": True, "order_id": order_id}))
+            pipe.execute()
+
+
+def write_compact(redis_client, products, buyers):
+    for product in products:
+        redis_client.hset(keys.product_key(product.id), mapping={
+            **encode_product(product), "stock": product.stock, "total_stock": product.stock})
+        redis_client.set(keys.stock_key(product.id), product.stock)
+    for start in range(0, len(buyers), BATCH_SIZE):
+        with redis_client.pipeline(transaction=False) as pipe:
+            for user_id, product_id, order_id, _ in buyers[start:start + BATCH_SIZE]:
+                field = user_field(user_id)
+                pipe.hincrby(keys.user_limit_key(product_id), field, 1)
+                pipe.hset(keys.results_key(product_id), field, order_id)
+            pipe.execute()
+    for product in products:
+        redis_client.expire(keys.results_key(product.id), 600)
+
+
+def product_hash_encoding(redis_client, key):
+    """商品哈希的内部编码（listpack/hashtable），fakeredis不支持时返回None"""
+    try:
+        encoding = redis_client.object("encoding", key)
+    except ResponseError:
+        return None
+    return encoding.decode() if isinstance(encoding, bytes) else encoding
+
+
+def run_layout(redis_client, name, write, products, buyers):
+    redis_client.flushdb()
+    started = time.perf_counter()
+    write(redis_client, products, buyers)
+    elapsed = time.perf_counter() - started
+    memory, method = measure_memory(redis_client)
+    product_key = keys.product_key(1) if name == "compact" else "seckill:product:1"
+    return {
+        "keys": redis_client.dbsize(),
+        "memory_bytes": memory,
+        "bytes_per_buyer": round(memory / max(len(buyers), 1), 1),
+        "memory_method": method,
+        "product_hash_encoding": product_hash_encoding(redis_client, product_key),
+        "write_seconds": round(elapsed, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="秒杀数据的Redis内存测算：旧布局 vs 紧凑布局")
+    parser.add_argument("--buyers", type=int, default=100000, help="抢购成功的用户数")
+    parser.add_argument("--products", type=int, default=20, help="商品数")
+    parser.add_argument("--output", default=None, help="JSON报告输出路径")
+    args = parser.parse_args(argv)
+
+    redis_client = get_redis_client()
+    products = build_products(args.products)
+    buyers = build_buyers(args.buyers, args.products)
+
+    legacy = run_layout(redis_client, "legacy", write_legacy, products, buyers)
+    compact = run_layout(redis_client, "compact", write_compact, products, buyers)
+    redis_client.flushdb()
+
+    report = {
+        "buyers": args.buyers,
+        "products": args.products,
+        "legacy": legacy,
+        "compact": compact,
+        "saved": {
+            "keys": legacy["keys"] - compact["keys"],
+            "memory_bytes": legacy["memory_bytes"] - compact["memory_bytes"],
+            "memory_ratio": round(compact["memory_bytes"] / legacy["memory_bytes"], 3) if legacy["memory_bytes"] else None,
+        },
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
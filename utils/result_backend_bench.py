@@ -0,0 +1,116 @@
+"""
+Celery结果后端的Redis开销测算
+对比N个订单（每个订单一次 create_seckill_order 和一次 order_timeout_check）在两种方式下的Redis开销：
+- result_backend：任务结果写入Redis结果后端（每个任务一次 SETEX + PUBLISH，一个Key）
+- order_stats：任务不保存结果，订单结果按商品汇总到哈希（shop.tasks.record_order_outcome）
+
+统计命令数、Key数量和内存。连接真实Redis（BENCH_REDIS_URL）时用 MEMORY USAGE 统计内存，
+fakeredis 不支持该命令，改为统计键名和值的字节数（不含Redis内部结构开销，是实际内存的下限）。
+    python utils/result_backend_bench.py --orders 100000
+"""
+import argparse
+import json
+import os
+import sys
+import uuid
+
+# 设置项目根目录到系统路径（替换脚本所在的utils目录，避免utils/alipay.py遮蔽支付宝SDK）
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[0] = BASE_DIR
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seckill_shop.settings_bench')
+
+import django
+django.setup()
+
+from celery import states
+from celery.backends.redis import RedisBackend
+from redis.exceptions import ResponseError
+
+from seckill_shop.celery import app
+from shop.tasks import record_order_outcome
+from utils.redis_client import get_redis_client
+from utils.snow_flake import Snowflake
+from utils.tracing import trace_block
+
+
+def measure_memory(redis_client):
+    """统计当前库所有Key占用的内存，返回(字节数, 统计方式)"""
+    try:
+        total = sum(redis_client.memory_usage(key, samples=0) or 0 for key in redis_client.scan_iter(count=1000))
+        return total, "memory_usage"
+    except ResponseError:
+        pass
+
+    total = 0
+    for key in redis_client.scan_iter(count=1000):
+        total += len(key)
+        if redis_client.type(key) == b"hash":
+            total += sum(len(field) + len(value) for field, value in redis_client.hgetall(key).items())
+        else:
+            total += redis_client.strlen(key)
+    return total, "payload_bytes"
+
+
+def run_scenario(redis_client, name, record):
+    redis_client.flushdb()
+    with trace_block(name) as trace:
+        record()
+    memory, method = measure_memory(redis_client)
+    return {
+        "redis_commands": trace.redis_count,
+        "keys": redis_client.dbsize(),
+        "memory_bytes": memory,
+        "memory_method": method,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Celery结果后端的Redis开销测算")
+    parser.add_argument("--orders", type=int, default=100000, help="订单数")
+    parser.add_argument("--products", type=int, default=50, help="商品数")
+    parser.add_argument("--output", default=None, help="JSON报告输出路径")
+    args = parser.parse_args(argv)
+
+    redis_client = get_redis_client()
+    snowflake = Snowflake()
+    orders = [(snowflake.generate_id(), i % args.products + 1) for i in range(args.orders)]
+
+    # 与线上相同的结果后端配置，连接替换为当前Redis客户端
+    backend = RedisBackend(app=app, url=app.conf.result_backend or "redis://")
+    backend.client = redis_client
+
+    def store_results():
+        for order_id, _ in orders:
+            backend.store_result(str(uuid.uuid4()), f"订单创建成功: {order_id}", states.SUCCESS)
+            backend.store_result(str(uuid.uuid4()), f"订单超时自动取消成功: {order_id}", states.SUCCESS)
+
+    def record_outcomes():
+        for _, product_id in orders:
+            record_order_outcome(redis_client, product_id, "created")
+            record_order_outcome(redis_client, product_id, "timeout_cancelled")
+
+    before = run_scenario(redis_client, "result_backend", store_results)
+    after = run_scenario(redis_client, "order_stats", record_outcomes)
+    redis_client.flushdb()
+
+    report = {
+        "orders": args.orders,
+        "products": args.products,
+        "result_backend": before,
+        "order_stats": after,
+        "saved": {
+            "redis_commands": before["redis_commands"] - after["redis_commands"],
+            "keys": before["keys"] - after["keys"],
+            "memory_bytes": before["memory_bytes"] - after["memory_bytes"],
+        },
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
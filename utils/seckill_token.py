@@ -0,0 +1,32 @@
+"""
+无状态秒杀令牌
+令牌内容为[订单ID, 用户ID, 商品ID, 购买数量]和签发时间，使用SECRET_KEY做HMAC-SHA256签名（django.core.signing），
+订单创建时只需验签和检查有效期，不需要在Redis中存储和删除令牌。
+令牌绑定订单ID，同一个令牌只能创建一个订单：订单ID是主键，重复消费时插入失败（见shop.tasks.create_seckill_order）。
+"""
+from django.core import signing
+
+# 令牌有效期（秒）
+TOKEN_MAX_AGE = 300
+# 签名盐值，与其他使用SECRET_KEY签名的数据隔离
+TOKEN_SALT = "seckill.token"
+
+
+def issue_token(order_id, user_id, product_id, quantity):
+    """签发秒杀令牌"""
+    return signing.dumps([order_id, user_id, product_id, quantity], salt=TOKEN_SALT)
+
+
+def verify_token(token, order_id, user_id, product_id, quantity):
+    """
+    校验秒杀令牌：签名有效、未过期，且令牌中的订单、用户、商品、数量与消息一致
+    校验失败时抛出ValueError
+    """
+    try:
+        claims = signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    except signing.SignatureExpired:
+        raise ValueError(f"秒杀令牌已过期: {order_id}")
+    except signing.BadSignature:
+        raise ValueError(f"无效的秒杀令牌: {order_id}")
+    if claims != [order_id, user_id, product_id, quantity]:
+        raise ValueError(f"秒杀令牌验证失败: 订单、用户或商品不匹配")
@@ -0,0 +1,92 @@
+"""
+场次静态页
+同一场次的商品列表页对所有用户都相同（只有库存在变化），预热和商品状态变化时将场次页渲染为静态HTML，
+写入 SLOT_PAGE_ROOT/<场次编码>.html，由Nginx等前端服务器直接返回，不占用Django进程：
+- 实时库存由页面每隔几秒请求 /seckill/stock/?ids=... 刷新（只读Redis的一个管道）
+- 静态页中没有CSRF令牌，页面打开时请求 /seckill/session/ 获取csrftoken和身份Cookie，抢购表单提交前从Cookie中读取
+"""
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from shop.models import SeckillSession
+from utils import keys
+from utils.codec import decode_product
+from utils.current_slot import SlotIndex
+from utils.near_cache import NearCache
+from utils.redis_client import get_redis_client, product_cache
+
+# 商品缓存中未配置限购数量时的默认值
+DEFAULT_LIMIT_PER_USER = 1
+# 商品默认图片
+DEFAULT_PRODUCT_IMAGE = '/product_img/扫地机器人.webp'
+
+
+def load_schedule(now=None):
+    """今天及未来24小时内的场次（按开始时间升序），通过场次表的时间索引按时间范围查询"""
+    now = now or timezone.now()
+    day_start = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    return list(SeckillSession.objects.filter(
+        end_time__gt=day_start,  # 今天还没结束的场次（包括今天已结束的场次以便查看）
+        start_time__lt=now + timedelta(days=1)  # 未来24小时内开始的场次
+    ).order_by('start_time'))
+
+
+def build_slot_products(product_ids, client=product_cache):
+    """
+    从Redis读取场次商品详情，缓存中不存在的商品跳过
+    :param client: 默认通过近端缓存读取（热点商品从进程内缓存返回，其余商品在一个管道中读取），
+                   渲染静态页时传入Redis客户端，所有商品在一个管道中读取
+    """
+    product_keys = [keys.product_key(product_id) for product_id in product_ids]
+    if isinstance(client, NearCache):
+        rows = client.hgetall_many(product_keys)
+    else:
+        with client.pipeline(transaction=False) as pipe:
+            for product_key in product_keys:
+                pipe.hgetall(product_key)
+            rows = pipe.execute()
+
+    products = []
+    for product_id, product_data in zip(product_ids, rows):
+        if product_data:
+            # 解码紧凑编码的商品哈希（价格为分、时间为Unix秒），计算已售百分比
+            product_info = decode_product(product_id, product_data, DEFAULT_LIMIT_PER_USER)
+            product_info['image'] = DEFAULT_PRODUCT_IMAGE
+            products.append(product_info)
+    return products
+
+
+def slot_page_path(slot):
+    return os.path.join(settings.SLOT_PAGE_ROOT, f"{slot}.html")
+
+
+def render_slot_page(slot, product_ids, slot_index=None):
+    """
+    渲染场次静态页并原子替换旧文件（先写临时文件再重命名，前端服务器不会读到写了一半的页面）
+    :param slot_index: 场次时间索引（SlotIndex），批量渲染时复用同一个索引
+    :return: 静态页路径
+    """
+    html = render_to_string("index.html", {
+        "seckill_products": build_slot_products(product_ids, client=get_redis_client()),
+        "time_slots": (slot_index or SlotIndex(load_schedule())).time_slots,
+        "selected_slot": slot,
+        "static_page": True,
+        "slot_page_url": settings.SLOT_PAGE_URL,
+    })
+    os.makedirs(settings.SLOT_PAGE_ROOT, exist_ok=True)
+    path = slot_page_path(slot)
+    fd, tmp_path = tempfile.mkstemp(dir=settings.SLOT_PAGE_ROOT, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(html)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
@@ -82,6 +82,7 @@ class Snowflake:
                 if self.sequence > self.max_sequence:
                     # 循环等待下一毫秒
                     while current_timestamp <= self.last_timestamp:
+                        time.sleep(0)  # 让出CPU（协程模式下让出给其他协程，避免空转阻塞整个进程）
                         current_timestamp = self._get_current_timestamp()
                     self.sequence = 0  # 重置序列号
             else:
@@ -99,6 +100,14 @@ class Snowflake:
 
             return timestamp_part | data_center_part | worker_part | sequence_part
 
+    def min_id_at(self, timestamp_ms: int) -> int:
+        """指定时间（毫秒）生成的最小ID，ID按时间递增，可以用主键范围代替创建时间查询"""
+        return (timestamp_ms - self.epoch) << self.timestamp_shift
+
+    def timestamp_of(self, snowflake_id: int) -> int:
+        """ID的生成时间（毫秒）"""
+        return (snowflake_id >> self.timestamp_shift) + self.epoch
+
     @classmethod
     def generate_id_static(cls) -> int:
         """静态方法，用于模型默认值"""
@@ -0,0 +1,132 @@
+"""
+库存一致性审计
+Redis实时库存、商品哈希的库存字段、数据库 seckill_products.stock 和订单表之间可能出现偏差
+（订单创建失败时重复回滚、取消与超时检查重复归还、非原子的归还操作等），审计任务每隔几秒检查进行中的商品：
+- 应有库存 = 初始库存 - 有效订单（待支付、已支付、已完成）的购买数量，一次聚合查询算出所有商品
+- Redis侧在一个管道中读取实时库存和商品哈希的库存字段
+- 数据库库存与应有库存不一致：两者来自同一条SQL，直接按比较并设置修复
+- Redis库存高于应有库存（会超卖）：已扣减但还未创建订单的消息只会让Redis库存偏低，偏高只能是重复归还；
+  连续两次审计观测值相同（期间该商品没有抢购和订单变化）时按比较并设置修复
+- Redis库存低于应有库存（少卖）：只告警不修复。已发布到RabbitMQ还未消费、或在Celery重试中的订单消息都会让Redis库存偏低，
+  Worker或MySQL停止时观测值可以长时间不变，发件箱长度也无法排除这些消息；此时调高Redis库存会把这部分库存再卖一次，
+  积压消费后多出的订单被条件更新拒绝，而这些用户已经收到抢购成功。观测值保持 SECKILL_AUDIT_DEFICIT_GRACE 秒不变时告警，由人工确认
+- 后台补货由 adjust_redis_stock 按变化量同步到Redis，不依赖审计
+- 商品哈希的库存字段与实时库存不一致时同步为实时库存
+每个商品上一次的观测值保存在 seckill:stock_audit 哈希中，不同Worker执行审计时判断一致。
+"""
+import time
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from shop.models import SeckillOrder, SeckillProduct
+from utils import keys
+from utils.lua import STOCK_ADJUST_SCRIPT, STOCK_REPAIR_SCRIPT
+from utils.metrics import STOCK_DRIFT_TOTAL
+
+# 有效订单状态（待支付、已支付、已完成），已取消的订单已归还库存
+ACTIVE_ORDER_STATUSES = (0, 1, 3)
+# 审计状态过期时间（秒），审计任务停止后自动清理
+STOCK_AUDIT_EXPIRE = 3600
+
+
+def load_expected_stocks(product_ids=None):
+    """
+    一次聚合查询读取商品的数据库库存和应有库存
+    :param product_ids: 商品ID列表，默认为进行中的商品
+    :return: {商品ID: (数据库库存, 应有库存)}
+    """
+    sold = SeckillOrder.objects.filter(
+        goods_id=OuterRef('id'),
+        status__in=ACTIVE_ORDER_STATUSES
+    ).values('goods_id').annotate(total=Sum('quantity')).values('total')
+    if product_ids is None:
+        products = SeckillProduct.objects.filter(status=1)  # 进行中
+    else:
+        products = SeckillProduct.objects.filter(id__in=product_ids)
+    rows = products.annotate(sold=Coalesce(Subquery(sold), 0)).values_list('id', 'stock', 'total_stock', 'sold')
+    return {product_id: (stock, total_stock - sold) for product_id, stock, total_stock, sold in rows}
+
+
+def repair_redis_stock(redis_client, product_id, observed, expected):
+    """比较并设置Redis库存，返回是否修复成功（实时库存已变化或键不存在时不修复）"""
+    return redis_client.eval(STOCK_REPAIR_SCRIPT, 2, keys.stock_key(product_id), keys.product_key(product_id),
+                             observed, expected) >= 0
+
+
+def adjust_redis_stock(redis_client, product_id, delta):
+    """按变化量调整Redis库存和商品哈希的库存字段（后台补货），返回调整后的库存，库存键不存在（未预热）时返回None"""
+    stock = redis_client.eval(STOCK_ADJUST_SCRIPT, 2, keys.stock_key(product_id), keys.product_key(product_id), delta)
+    return stock if stock >= 0 else None
+
+
+def audit_stock(redis_client, product_ids=None, now=None):
+    """
+    审计并修复库存，调用方负责读主库
+    :return: 偏差列表 [(商品ID, 位置(db/redis/hash), 当前值, 应有值, 处理方式(repaired/changed/alerted))]
+    """
+    now = int(now or time.time())
+    expected_stocks = load_expected_stocks(product_ids)
+    if not expected_stocks:
+        return []
+
+    product_ids = list(expected_stocks)
+    with redis_client.pipeline(transaction=False) as pipe:
+        for product_id in product_ids:
+            pipe.get(keys.stock_key(product_id))
+            pipe.hget(keys.product_key(product_id), "stock")
+        pipe.hmget(keys.STOCK_AUDIT_KEY, product_ids)
+        *rows, previous = pipe.execute()
+
+    drifts = []
+    state = {}
+    for i, product_id in enumerate(product_ids):
+        db_stock, expected = expected_stocks[product_id]
+        stock, hash_stock = rows[i * 2:i * 2 + 2]
+
+        # 数据库库存与订单表来自同一条SQL，不一致即为偏差
+        if db_stock != expected:
+            repaired = SeckillProduct.objects.filter(id=product_id, stock=db_stock).update(stock=expected)
+            drifts.append((product_id, "db", db_stock, expected, "repaired" if repaired else "changed"))
+
+        # 商品未预热或缓存已过期
+        if stock is None:
+            continue
+        stock = int(stock)
+
+        # 观测值与上一次相同时沿用首次观测的时间，得到该商品保持不变的时长
+        observation = f"{stock}:{expected}"
+        since = now
+        if previous[i]:
+            last_observation, last_since = previous[i].decode().rsplit(":", 1)
+            if last_observation == observation:
+                since = int(last_since)
+        state[product_id] = f"{observation}:{since}"
+        stable_seconds = now - since
+
+        if stock > expected:
+            # 超卖风险，连续两次观测到相同偏差时修复
+            if stable_seconds > 0:
+                repaired = repair_redis_stock(redis_client, product_id, stock, expected)
+                drifts.append((product_id, "redis", stock, expected, "repaired" if repaired else "changed"))
+        elif stock < expected:
+            # 少卖：无法区分丢失的库存和还在队列、重试中的订单消息，只告警不修复
+            if stable_seconds >= settings.SECKILL_AUDIT_DEFICIT_GRACE:
+                drifts.append((product_id, "redis", stock, expected, "alerted"))
+        elif hash_stock is not None and int(hash_stock) != stock:
+            # 商品哈希的库存字段同步为实时库存
+            repaired = repair_redis_stock(redis_client, product_id, stock, stock)
+            drifts.append((product_id, "hash", int(hash_stock), stock, "repaired" if repaired else "changed"))
+
+    # 只保留本次审计的商品，已结束商品的观测值随之清除
+    with redis_client.pipeline(transaction=True) as pipe:
+        pipe.delete(keys.STOCK_AUDIT_KEY)
+        if state:
+            pipe.hset(keys.STOCK_AUDIT_KEY, mapping=state)
+            pipe.expire(keys.STOCK_AUDIT_KEY, STOCK_AUDIT_EXPIRE)
+        pipe.execute()
+
+    for _, source, _, _, action in drifts:
+        STOCK_DRIFT_TOTAL.labels(source, action).inc()
+    return drifts
@@ -1,136 +1,306 @@
-import requests
+"""
+秒杀接口压测工具（asyncio + HTTP长连接）
+
+- 闭环模式(closed)：固定数量的虚拟用户，每个用户收到响应后再发下一个请求
+- 开环模式(open)：按到达率发请求，不等待响应；延迟从计划发送时间开始计算，避免协调遗漏
+- 流量曲线：constant 恒定、ramp 线性爬升、spike 模拟场次开场瞬间的流量尖峰
+- 每个接口单独统计 p50/p95/p99/p999（HDR直方图），多进程压测时合并统计
+- 压测商品ID从数据库或Redis中的场次商品集合读取，不再硬编码ID范围
+- 虚拟用户与浏览器一样先请求会话接口获取签名身份Cookie和CSRF令牌，服务端按身份限流、限购
+- 所有虚拟用户来自同一台压测机，压测环境需按虚拟用户数调大 SECKILL_IDENTITY_ISSUE_LIMIT 和 SECKILL_IP_RATE_LIMIT
+
+示例：
+    # 开环模式，开场尖峰：平时200RPS，第5秒起10秒内峰值20000RPS，4个进程
+    python utils/stress_test.py --mode open --profile spike --rate 200 --peak-rate 20000 \
+        --spike-at 5 --spike-duration 10 --duration 30 --processes 4 --products-from redis --slot 202511031000
+    # 闭环模式，500个虚拟用户
+    python utils/stress_test.py --mode closed --concurrency 500 --duration 30 --products-from db
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
 import random
+import sys
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
 
+import aiohttp
 
-def generate_random_ip():
-    """生成随机IP地址"""
-    return f"{random.randint(1, 255)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+# 设置项目根目录到系统路径
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
 
+from utils.histogram import HdrHistogram
+from utils.keys import slot_products_key
 
-def create_ip_pool(count=100):
-    """创建指定数量的随机IP池"""
-    return [generate_random_ip() for _ in range(count)]
 
+async def fetch_identity(session, base_url):
+    """请求会话接口，获取服务端签发的身份Cookie和CSRF令牌（与浏览器打开静态场次页相同）"""
+    async with session.get(f"{base_url}/seckill/session/") as response:
+        await response.read()
+        cookies = {name: morsel.value for name, morsel in response.cookies.items()}
+    return {
+        "Cookie": "; ".join(f"{name}={value}" for name, value in cookies.items()),
+        "X-CSRFToken": cookies.get("csrftoken", ""),
+    }
 
-def generate_random_id():
-    """生成244到267之间的随机id"""
-    return random.randint(268, 315)
 
+async def create_user_pool(session, base_url, count=100):
+    """创建指定数量的虚拟用户（每个用户的请求头带上各自的身份Cookie）"""
+    return await asyncio.gather(*(fetch_identity(session, base_url) for _ in range(count)))
 
-def send_request(base_url, ip, data=None):
-    """发送POST请求（包含随机id的接口地址）"""
-    # 生成随机id并拼接完整URL
-    target_id = generate_random_id()
-    url = f"{base_url}/{target_id}/"
 
-    headers = {
-        'X-Forwarded-For': ip,
-        'Content-Type': 'application/json',  # 根据接口实际需求调整
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+def load_products_from_redis(redis_url, slot):
+    """从Redis的场次商品集合中读取商品ID"""
+    import redis
+    client = redis.Redis.from_url(redis_url)
+    return sorted(int(product_id) for product_id in client.smembers(slot_products_key(slot)))
 
-    try:
 
-        start_time = time.time()
-        response = requests.post(url, headers=headers, json=data, timeout=10)
-        end_time = time.time()
+def load_products_from_db(slot=None):
+    """从数据库读取商品ID（指定场次时读取该场次商品，否则读取进行中的商品）"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seckill_shop.settings')
+    import django
+    django.setup()
+    from shop.models import SeckillProduct
+    products = SeckillProduct.objects.all()
+    products = products.filter(session__code=slot) if slot else products.filter(status=1)
+    return list(products.values_list('id', flat=True))
 
+
+def rate_at(args, elapsed):
+    """流量曲线：返回第elapsed秒的目标到达率（请求/秒）"""
+    if args.profile == "ramp":
+        if elapsed >= args.ramp:
+            return args.peak_rate
+        return args.rate + (args.peak_rate - args.rate) * elapsed / args.ramp
+    if args.profile == "spike":
+        if args.spike_at <= elapsed < args.spike_at + args.spike_duration:
+            return args.peak_rate
+        return args.rate
+    return args.rate
+
+
+class Stats:
+    """单进程的压测统计"""
+
+    def __init__(self):
+        self.histograms = {}  # 接口 -> HdrHistogram（微秒）
+        self.status_codes = {}  # 接口 -> {状态码: 次数}
+        self.errors = {}  # 接口 -> 异常次数
+
+    def record(self, endpoint, status, latency_us):
+        histogram = self.histograms.get(endpoint)
+        if histogram is None:
+            histogram = self.histograms[endpoint] = HdrHistogram()
+        histogram.record(latency_us)
+        codes = self.status_codes.setdefault(endpoint, {})
+        codes[status] = codes.get(status, 0) + 1
+        if status == "error":
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def to_dict(self):
         return {
-            'status': 'success',
-            'ip': ip,
-            'id': target_id,  # 记录当前请求的id
-            'status_code': response.status_code,
-            'response_time': end_time - start_time,
-            'thread_id': threading.current_thread().ident
-        }
-    except Exception as e:
-        end_time = time.time()
-        return {
-            'status': 'error',
-            'ip': ip,
-            'id': target_id,  # 记录当前请求的id
-            'error': str(e),
-            'response_time': end_time - start_time,
-            'thread_id': threading.current_thread().ident
+            "histograms": {endpoint: histogram.to_dict() for endpoint, histogram in self.histograms.items()},
+            "status_codes": self.status_codes,
+            "errors": self.errors,
         }
 
 
-def run_concurrent_tests(base_url, ip_pool, total_requests=1000, max_workers=50, data=None):
-    """运行并发测试"""
-    print(f"开始并发测试 - 总请求数: {total_requests}, 最大并发数: {max_workers}")
-    print(f"接口地址格式: {base_url}/id")
-    start_time = time.time()
-
-    success_count = 0
-    failure_count = 0
-    total_response_time = 0
-    id_request_count = {}  # 统计每个id的请求次数
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # 提交所有任务
-        futures = [
-            executor.submit(send_request, base_url, random.choice(ip_pool), data)
-            for _ in range(total_requests)
-        ]
-
-        # 处理结果
-        for future in as_completed(futures):
-            result = future.result()
-            total_response_time += result['response_time']
-
-            # 统计每个id的请求次数
-            target_id = result['id']
-            id_request_count[target_id] = id_request_count.get(target_id, 0) + 1
-
-            if result['status'] == 'success':
-                success_count += 1
-                if success_count % 100 == 0:  # 每100个成功请求打印一次进度
-                    print(f"已完成 {success_count} 个请求...")
+class LoadGenerator:
+    """单进程的异步压测执行器"""
+
+    def __init__(self, args, product_ids):
+        self.args = args
+        self.product_ids = product_ids
+        self.user_pool = []
+        self.stats = Stats()
+
+    def next_request(self):
+        """按接口权重选择下一个请求"""
+        headers = random.choice(self.user_pool)
+        if random.random() < self.args.index_ratio:
+            return "index", "GET", f"{self.args.base_url}/", headers
+        product_id = random.choice(self.product_ids)
+        return "buy", "POST", f"{self.args.base_url}/buy/{product_id}/", headers
+
+    async def send(self, session, scheduled_at):
+        """发送请求，延迟从计划发送时间开始计算"""
+        endpoint, method, url, headers = self.next_request()
+        try:
+            async with session.request(method, url, headers=headers) as response:
+                await response.read()
+                status = response.status
+        except Exception:
+            status = "error"
+        self.stats.record(endpoint, status, (time.perf_counter() - scheduled_at) * 1_000_000)
+
+    async def run_closed(self, session, deadline):
+        """闭环模式：每个虚拟用户串行发请求"""
+        async def user():
+            while time.perf_counter() < deadline:
+                await self.send(session, time.perf_counter())
+                if self.args.think_time:
+                    await asyncio.sleep(random.expovariate(1 / self.args.think_time))
+
+        await asyncio.gather(*(user() for _ in range(self.args.concurrency)))
+
+    async def run_open(self, session, start, deadline):
+        """开环模式：按流量曲线调度请求到达，不等待响应"""
+        in_flight = set()
+        next_at = start
+        while next_at < deadline:
+            now = time.perf_counter()
+            if next_at > now:
+                await asyncio.sleep(next_at - now)
+            # 控制在途请求上限，超出时仍按计划时间计算延迟，排队时间计入延迟
+            if len(in_flight) >= self.args.max_in_flight:
+                await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            task = asyncio.ensure_future(self.send(session, next_at))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            # 泊松到达：按当前到达率生成下一个请求的间隔
+            rate = max(rate_at(self.args, next_at - start), 0.001)
+            next_at += random.expovariate(rate)
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+    async def run(self):
+        connector = aiohttp.TCPConnector(limit=self.args.connections, keepalive_timeout=60, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.args.timeout)
+        # 不使用会话级Cookie，每个虚拟用户在请求头中携带自己的Cookie
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         cookie_jar=aiohttp.DummyCookieJar()) as session:
+            self.user_pool = await create_user_pool(session, self.args.base_url, self.args.user_count)
+            start = time.perf_counter()
+            deadline = start + self.args.duration
+            if self.args.mode == "closed":
+                await self.run_closed(session, deadline)
             else:
-                failure_count += 1
-                # 打印错误信息（包含id方便排查）
-                print(f"请求失败 - IP: {result['ip']}, ID: {result['id']}, 错误: {result['error']}")
+                await self.run_open(session, start, deadline)
+        return self.stats.to_dict()
 
-    end_time = time.time()
-    total_time = end_time - start_time
 
-    # 打印统计信息
+def run_worker(payload):
+    """压测子进程入口：每个进程承担1/N的到达率或虚拟用户"""
+    args, product_ids = payload
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    return asyncio.run(LoadGenerator(args, product_ids).run())
+
+
+def report(results, args, elapsed):
+    """合并各进程统计并输出报告"""
+    histograms, status_codes, errors = {}, {}, {}
+    for result in results:
+        for endpoint, data in result["histograms"].items():
+            histograms.setdefault(endpoint, HdrHistogram()).merge(HdrHistogram.from_dict(data))
+        for endpoint, codes in result["status_codes"].items():
+            merged = status_codes.setdefault(endpoint, {})
+            for code, count in codes.items():
+                merged[str(code)] = merged.get(str(code), 0) + count
+        for endpoint, count in result["errors"].items():
+            errors[endpoint] = errors.get(endpoint, 0) + count
+
+    summary = {"mode": args.mode, "profile": args.profile, "duration": round(elapsed, 2), "endpoints": {}}
+    total = 0
     print("\n测试完成!")
-    print(f"总耗时: {total_time:.2f} 秒")
-    print(f"总请求数: {total_requests}")
-    print(f"成功请求数: {success_count} ({success_count / total_requests * 100:.2f}%)")
-    print(f"失败请求数: {failure_count} ({failure_count / total_requests * 100:.2f}%)")
-    print(f"平均响应时间: {total_response_time / success_count:.4f} 秒" if success_count > 0 else "无成功请求")
-    print(f"每秒请求数: {total_requests / total_time:.2f}")
-
-    # 打印id请求分布（前10个，方便查看分布均匀性）
-    print("\n部分ID请求次数分布（共24个ID）:")
-    sorted_ids = sorted(id_request_count.items(), key=lambda x: x[0])
-    for idx, (id_val, count) in enumerate(sorted_ids[:10]):
-        print(f"ID {id_val}: {count}次", end=" | " if (idx + 1) % 5 != 0 else "\n")
-    if len(sorted_ids) > 10:
-        print(f"... 剩余{len(sorted_ids) - 10}个ID")
+    print(f"模式: {args.mode}, 流量曲线: {args.profile}, 进程数: {args.processes}, 总耗时: {elapsed:.2f} 秒")
+    for endpoint, histogram in sorted(histograms.items()):
+        total += histogram.total
+        item = {
+            "requests": histogram.total,
+            "rps": round(histogram.total / elapsed, 2),
+            "errors": errors.get(endpoint, 0),
+            "status_codes": status_codes.get(endpoint, {}),
+            "latency_ms": {
+                "mean": round(histogram.mean() / 1000, 3),
+                "p50": round(histogram.percentile(50) / 1000, 3),
+                "p95": round(histogram.percentile(95) / 1000, 3),
+                "p99": round(histogram.percentile(99) / 1000, 3),
+                "p999": round(histogram.percentile(99.9) / 1000, 3),
+                "max": round(histogram.max / 1000, 3),
+            },
+        }
+        summary["endpoints"][endpoint] = item
+        latency = item["latency_ms"]
+        print(f"\n[{endpoint}] 请求数: {item['requests']}, RPS: {item['rps']}, 异常: {item['errors']}")
+        print(f"  状态码分布: {item['status_codes']}")
+        print(f"  延迟(ms) mean={latency['mean']} p50={latency['p50']} p95={latency['p95']} "
+              f"p99={latency['p99']} p999={latency['p999']} max={latency['max']}")
+    summary["total_requests"] = total
+    summary["total_rps"] = round(total / elapsed, 2) if elapsed else 0
+    print(f"\n总请求数: {total}, 总RPS: {summary['total_rps']}")
 
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"压测报告已写入: {args.output}")
+    return summary
 
-if __name__ == "__main__":
-    # 配置参数
-    BASE_API_URL = "http://localhost:8000/buy"  # 基础URL，后续会拼接/id
-    IP_COUNT = 100  # 生成100个随机IP
-    TOTAL_REQUESTS = 3000  # 总请求数（可调整）
-    MAX_WORKERS = 100  # 最大并发数（可调整）
-
-    # 根据接口需求设置POST数据（如不需要可留空）
-    POST_DATA = {
-        # "参数1": "值1",
-        # "参数2": "值2"
-    }
 
-    # 创建IP池
-    ip_pool = create_ip_pool(IP_COUNT)
-    print(f"已生成 {IP_COUNT} 个随机IP地址")
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="秒杀接口异步压测工具")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="服务地址")
+    parser.add_argument("--mode", choices=["open", "closed"], default="open", help="开环（按到达率）或闭环（按并发用户）")
+    parser.add_argument("--duration", type=float, default=30, help="压测时长（秒）")
+    parser.add_argument("--processes", type=int, default=1, help="压测进程数，单进程压不满时增加")
+    # 开环模式参数
+    parser.add_argument("--profile", choices=["constant", "ramp", "spike"], default="constant", help="流量曲线")
+    parser.add_argument("--rate", type=float, default=1000, help="基础到达率（请求/秒，所有进程合计）")
+    parser.add_argument("--peak-rate", type=float, default=10000, help="ramp/spike的峰值到达率")
+    parser.add_argument("--ramp", type=float, default=10, help="ramp爬升时长（秒）")
+    parser.add_argument("--spike-at", type=float, default=5, help="spike开始时间（秒），模拟场次开场")
+    parser.add_argument("--spike-duration", type=float, default=10, help="spike持续时长（秒）")
+    parser.add_argument("--max-in-flight", type=int, default=10000, help="单进程最大在途请求数")
+    # 闭环模式参数
+    parser.add_argument("--concurrency", type=int, default=100, help="虚拟用户数（所有进程合计）")
+    parser.add_argument("--think-time", type=float, default=0, help="虚拟用户两次请求之间的平均间隔（秒）")
+    # 请求参数
+    parser.add_argument("--index-ratio", type=float, default=0.0, help="首页请求占比，其余为抢购请求")
+    parser.add_argument("--connections", type=int, default=1000, help="单进程HTTP长连接数上限")
+    parser.add_argument("--timeout", type=float, default=10, help="单个请求超时（秒）")
+    parser.add_argument("--user-count", type=int, default=100, help="单进程虚拟用户身份数")
+    # 压测商品
+    parser.add_argument("--products-from", choices=["db", "redis"], default="redis", help="商品ID来源")
+    parser.add_argument("--slot", help="场次编码(yyyymmddhhmm)，从redis读取时必填")
+    parser.add_argument("--redis-url", default="redis://127.0.0.1:6379/1", help="Redis地址")
+    parser.add_argument("--output", help="JSON报告输出路径")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # 读取压测商品
+    if args.products_from == "redis":
+        if not args.slot:
+            sys.exit("从Redis读取商品时需要指定 --slot")
+        product_ids = load_products_from_redis(args.redis_url, args.slot)
+    else:
+        product_ids = load_products_from_db(args.slot)
+    if not product_ids:
+        sys.exit("没有找到可压测的商品")
+    print(f"压测商品数: {len(product_ids)}, 接口地址: {args.base_url}")
 
-    # 运行并发测试
-    run_concurrent_tests(BASE_API_URL, ip_pool, TOTAL_REQUESTS, MAX_WORKERS, POST_DATA)
\ No newline at end of file
+    # 到达率和虚拟用户数按进程平分
+    worker_args = argparse.Namespace(**vars(args))
+    worker_args.rate = args.rate / args.processes
+    worker_args.peak_rate = args.peak_rate / args.processes
+    worker_args.concurrency = max(1, args.concurrency // args.processes)
+
+    start = time.perf_counter()
+    if args.processes == 1:
+        results = [run_worker((worker_args, product_ids))]
+    else:
+        with multiprocessing.Pool(args.processes) as pool:
+            results = pool.map(run_worker, [(worker_args, product_ids)] * args.processes)
+    return report(results, args, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
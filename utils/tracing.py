@@ -0,0 +1,185 @@
+"""
+请求/任务级别的Redis和SQL命令追踪
+- 统计每个请求（或Celery任务）执行的Redis命令、SQL语句的次数和耗时
+- 按归一化后的命令（数字替换为{n}）分组，同一命令重复次数达到阈值时判定为N+1
+- 请求结束时输出一行日志，并在响应头 X-Trace 中附带统计结果，便于压测时采集
+
+通过 settings.REQUEST_TRACING 开关（默认跟随DEBUG），N+1阈值为 settings.TRACE_N_PLUS_ONE_THRESHOLD
+"""
+import logging
+import re
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from celery.signals import task_prerun, task_postrun
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger("seckill.trace")
+
+_local = threading.local()
+
+_NUMBER_PATTERN = re.compile(r"\{\d+\}|\d+")
+_SQL_IN_PATTERN = re.compile(r"\((?:%s, )+%s\)")
+
+
+def _normalize_redis(args):
+    """Redis命令归一化：命令名 + 键（数字及数字哈希标签替换为{n}），EVAL/EVALSHA取第一个键"""
+    name = str(args[0]).upper()
+    if name in ("EVAL", "EVALSHA"):
+        key = args[3] if len(args) > 3 else ""
+    else:
+        key = args[1] if len(args) > 1 else ""
+    if isinstance(key, bytes):
+        key = key.decode(errors="replace")
+    return f"{name} {_NUMBER_PATTERN.sub('{n}', str(key))}".rstrip()
+
+
+def _normalize_sql(sql):
+    """SQL归一化：参数已是占位符，只需合并IN列表"""
+    return _SQL_IN_PATTERN.sub("(...)", sql)
+
+
+class Trace:
+    """一次请求或任务内的命令统计"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.redis_count = 0
+        self.redis_seconds = 0.0
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.signatures = {}  # 归一化命令 -> 次数
+
+    def record_redis(self, args, seconds):
+        self.redis_count += 1
+        self.redis_seconds += seconds
+        signature = _normalize_redis(args)
+        self.signatures[signature] = self.signatures.get(signature, 0) + 1
+
+    def record_pipeline(self, count, seconds):
+        # 管道只有一次往返，不参与N+1判定
+        self.redis_count += count
+        self.redis_seconds += seconds
+
+    def record_sql(self, sql, seconds):
+        self.sql_count += 1
+        self.sql_seconds += seconds
+        signature = _normalize_sql(sql)
+        self.signatures[signature] = self.signatures.get(signature, 0) + 1
+
+    def n_plus_one(self, threshold):
+        """重复次数达到阈值的命令，按次数降序"""
+        return sorted(((signature, count) for signature, count in self.signatures.items() if count >= threshold),
+                      key=lambda item: -item[1])
+
+    def summary(self, threshold):
+        return {
+            "name": self.name,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "redis": self.redis_count,
+            "redis_ms": round(self.redis_seconds * 1000, 2),
+            "sql": self.sql_count,
+            "sql_ms": round(self.sql_seconds * 1000, 2),
+            "n_plus_one": self.n_plus_one(threshold),
+        }
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def trace_block(name):
+    """在代码块内追踪Redis命令（用于脚本和基准测试），返回Trace对象"""
+    previous = current_trace()
+    trace = _local.trace = Trace(name)
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    trace = current_trace()
+    if trace is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.record_sql(sql, time.perf_counter() - started)
+
+
+def _log_summary(summary):
+    message = (f"{summary['name']} 耗时{summary['total_ms']}ms "
+               f"redis={summary['redis']}({summary['redis_ms']}ms) sql={summary['sql']}({summary['sql_ms']}ms)")
+    if summary["n_plus_one"]:
+        details = ", ".join(f"{signature} x{count}" for signature, count in summary["n_plus_one"])
+        logger.warning(f"{message} 疑似N+1: {details}")
+    else:
+        logger.info(message)
+
+
+def _threshold():
+    return getattr(settings, "TRACE_N_PLUS_ONE_THRESHOLD", 5)
+
+
+class RequestTraceMiddleware:
+    """请求级别的Redis、SQL命令追踪中间件"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_TRACING", settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        previous = current_trace()
+        trace = _local.trace = Trace(f"{request.method} {request.path}")
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all(initialized_only=False):
+                    stack.enter_context(connection.execute_wrapper(_sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            _local.trace = previous
+
+        summary = trace.summary(_threshold())
+        _log_summary(summary)
+        header = (f"redis={summary['redis']};redis_ms={summary['redis_ms']};"
+                  f"sql={summary['sql']};sql_ms={summary['sql_ms']};total_ms={summary['total_ms']}")
+        if summary["n_plus_one"]:
+            header += ";n+1=" + ",".join(f"{signature} x{count}" for signature, count in summary["n_plus_one"])
+        # 响应头只能包含latin-1字符
+        response["X-Trace"] = header.encode("latin-1", "replace").decode("latin-1")
+        return response
+
+
+@task_prerun.connect
+def _start_task_trace(task=None, **kwargs):
+    if not getattr(settings, "REQUEST_TRACING", settings.DEBUG):
+        return
+    previous = current_trace()
+    stack = ExitStack()
+    # 任务可能在请求中以eager模式执行，外层已安装SQL钩子时直接复用，结束后恢复外层追踪
+    if previous is None:
+        for connection in connections.all(initialized_only=False):
+            stack.enter_context(connection.execute_wrapper(_sql_wrapper))
+    task.request.trace_context = (previous, stack)
+    _local.trace = Trace(f"task {task.name}")
+
+
+@task_postrun.connect
+def _finish_task_trace(task=None, **kwargs):
+    context = getattr(task.request, "trace_context", None)
+    if context is None:
+        return
+    previous, stack = context
+    stack.close()
+    trace = current_trace()
+    _local.trace = previous
+    if trace is not None:
+        _log_summary(trace.summary(_threshold()))
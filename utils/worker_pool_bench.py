@@ -0,0 +1,140 @@
+"""
+订单Worker并发池对比测试：prefork（多进程） vs eventlet/gevent（协程）
+每种并发池的测试流程：
+1. 创建一个压测商品，按抢购接口的方式写入库存、签发秒杀令牌，并把N条 create_seckill_order 消息发布到独立的压测队列
+2. 启动只消费压测队列的Worker子进程（-P 指定并发池），等待所有订单落库
+3. 按订单创建时间计算吞吐（订单/秒），清理压测数据
+
+Worker子进程与本进程需要共享MySQL、Redis和RabbitMQ，因此使用项目的正式配置，请在独立的测试环境中运行：
+    python utils/worker_pool_bench.py --orders 5000 --pools prefork:8 eventlet:200
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+# 设置项目根目录到系统路径（替换脚本所在的utils目录，避免utils/alipay.py遮蔽支付宝SDK）
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[0] = BASE_DIR
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seckill_shop.settings')
+
+import django
+django.setup()
+
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from shop.models import SeckillProduct, SeckillOrder
+from shop.tasks import cache_seckill_product, create_seckill_order
+from utils import keys
+from utils.redis_client import get_redis_client
+from utils.seckill_token import issue_token
+from utils.snow_flake import Snowflake
+
+BENCH_QUEUE = "bench.orders"
+BENCH_PRODUCT_NAME = "Worker并发池压测商品"
+
+
+def prepare(orders):
+    """创建压测商品并发布订单消息，返回商品ID"""
+    redis_client = get_redis_client()
+    now = timezone.now()
+    product = SeckillProduct.objects.create(
+        name=BENCH_PRODUCT_NAME, base_price=100, seckill_price=1, stock=orders, limit_per_user=1,
+        seckill_start_time=now, seckill_end_time=now + timedelta(hours=1), status=1,
+    )
+    cache_seckill_product(redis_client, product, 3600)
+
+    snowflake = Snowflake()
+    messages = []
+    for i in range(orders):
+        user_id = f"bench-{i}"
+        order_id = snowflake.generate_id()
+        messages.append({
+            "order_id": order_id,
+            "user_id": user_id,
+            "product_id": product.id,
+            "quantity": 1,
+            "seckill_token": issue_token(order_id, user_id, product.id, 1),
+            "product_info": {"id": product.id, "name": product.name, "seckill_price": float(product.seckill_price)},
+        })
+    # Redis中的库存已在抢购阶段扣减
+    redis_client.set(keys.stock_key(product.id), 0)
+
+    for message in messages:
+        create_seckill_order.apply_async(kwargs={"message": message}, queue=BENCH_QUEUE, routing_key=BENCH_QUEUE)
+    return product.id
+
+
+def cleanup(product_id):
+    redis_client = get_redis_client()
+    SeckillOrder.objects.filter(goods_id=product_id).delete()
+    SeckillProduct.objects.filter(id=product_id).delete()
+    redis_client.delete(keys.product_key(product_id), keys.stock_key(product_id), keys.order_stats_key(product_id))
+
+
+def run_pool(pool, concurrency, orders, timeout):
+    product_id = prepare(orders)
+    command = [
+        sys.executable, "-m", "celery", "-A", "seckill_shop", "worker",
+        "-P", pool, "-c", str(concurrency), "-Q", BENCH_QUEUE, "-n", f"bench-{pool}@%h",
+        "--prefetch-multiplier=1", "--without-gossip", "--without-mingle", "--without-heartbeat", "-l", "warning",
+    ]
+    started = time.perf_counter()
+    worker = subprocess.Popen(command, cwd=BASE_DIR, stdout=subprocess.DEVNULL)
+    try:
+        created = 0
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            created = SeckillOrder.objects.filter(goods_id=product_id).count()
+            if created >= orders:
+                break
+            time.sleep(0.5)
+        wall = time.perf_counter() - started
+    finally:
+        worker.terminate()
+        worker.wait(timeout=60)
+
+    bounds = SeckillOrder.objects.filter(goods_id=product_id).aggregate(first=Min("create_time"),
+                                                                          last=Max("create_time"))
+    span = (bounds["last"] - bounds["first"]).total_seconds() if created > 1 else 0
+    cleanup(product_id)
+    return {
+        "pool": pool,
+        "concurrency": concurrency,
+        "orders": orders,
+        "created": created,
+        "wall_seconds": round(wall, 3),  # 含Worker启动时间
+        "orders_per_sec": round((created - 1) / span, 2) if span else None,  # 第一单到最后一单之间的吞吐
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="订单Worker并发池对比测试")
+    parser.add_argument("--orders", type=int, default=2000, help="每种并发池处理的订单数")
+    parser.add_argument("--pools", nargs="+", default=["prefork:8", "eventlet:200"],
+                        help="并发池及并发数，如 prefork:8 eventlet:200 gevent:200")
+    parser.add_argument("--timeout", type=float, default=600, help="每种并发池的最长等待时间（秒）")
+    parser.add_argument("--output", default=None, help="JSON报告输出路径")
+    args = parser.parse_args(argv)
+
+    results = []
+    for spec in args.pools:
+        pool, _, concurrency = spec.partition(":")
+        result = run_pool(pool, int(concurrency or 8), args.orders, args.timeout)
+        results.append(result)
+        print(f"{pool:<10} 并发{result['concurrency']:<5} 完成{result['created']}/{result['orders']}  "
+              f"吞吐 {result['orders_per_sec']} 订单/秒  总耗时 {result['wall_seconds']}秒")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0 if all(result["created"] == result["orders"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())